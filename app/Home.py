@@ -176,6 +176,16 @@ with st.container():
             show=(base_choice == "Carto Claro (Positron)"),
         ).add_to(m)
 
+        # Sobreposições NDVI servidas pelo servidor local de tiles (após Séries Temporais)
+        for layer_name, tile_url in (st.session_state.get("saag_tile_layers") or {}).items():
+            folium.TileLayer(
+                tiles=tile_url,
+                attr="SMART SAAG NDVI",
+                name=layer_name,
+                overlay=True, control=True,
+                opacity=0.8, max_zoom=19,
+            ).add_to(m)
+
         Fullscreen().add_to(m)
         MousePosition(position="bottomleft", separator=" , ", prefix="Lat,Lon").add_to(m)
         if _has_measure:
@@ -223,6 +233,8 @@ with st.container():
                 minx, miny, maxx, maxy = bbox
                 bbox_val = f"{minx:.5f},{miny:.5f},{maxx:.5f},{maxy:.5f}"
                 st.session_state["bbox_wgs84"] = bbox_val
+                # Geometria exata (a BBOX serve só para busca/leitura)
+                st.session_state["aoi_geojson"] = {"type": "FeatureCollection", "features": drawings}
 
         if bbox_val:
             st.caption(f"BBOX selecionado (EPSG:4326): {bbox_val}")
@@ -243,6 +255,7 @@ with st.container():
                 "start_date": str(start_date) if isinstance(start_date, date) else str(start_date),
                 "end_date": str(end_date) if isinstance(end_date, date) else str(end_date),
                 "bbox_wgs84": st.session_state.get("bbox_wgs84"),
+                "aoi_geojson": st.session_state.get("aoi_geojson"),
             }
             st.session_state['saag_ready'] = True
             st.info("Rodando stub do protótipo...")
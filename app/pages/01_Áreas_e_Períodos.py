@@ -9,4 +9,34 @@ with st.form("area"):
     submitted = st.form_submit_button("Salvar parâmetros")
 if submitted:
     st.session_state["bbox"] = bbox
+    if uploaded is not None:
+        # Talhões validados/reparados, simplificados na zona UTM (tolerância ligada
+        # ao pixel) e indexados (STRtree); o resultado fica em cache pelo hash do arquivo
+        try:
+            from saag_soy_monitor.geomprep import prepare_upload
+
+            res_m = int(
+                (st.session_state.get("saag_inputs") or {}).get("resolution_m", 10)
+            )
+            prepared = prepare_upload(
+                uploaded.name, uploaded.getvalue(), resolution_m=res_m
+            )
+        except Exception as e:
+            st.error("Não foi possível ler o arquivo de talhões.")
+            st.code(str(e))
+        else:
+            registry = prepared.registry
+            rep = prepared.report
+            st.session_state["saag_fields"] = registry
+            minx, miny, maxx, maxy = registry.bounds
+            st.info(
+                f"{len(registry)} talhão(ões) registrados. "
+                f"Extensão: {minx:.5f},{miny:.5f},{maxx:.5f},{maxy:.5f}"
+            )
+            st.caption(
+                f"{rep['n_repaired']} geometria(s) reparada(s), {rep['n_dropped']} descartada(s); "
+                f"vértices {rep['vertices_before']} → {rep['vertices_after']} "
+                f"(tolerância {rep['tolerance_m']:.1f} m, zonas UTM {rep['utm_zones']})"
+                + (" — cache" if rep.get("cached") else "")
+            )
     st.success("Parâmetros salvos.")
@@ -3,9 +3,15 @@ import streamlit as st
 import pandas as pd
 import altair as alt
 from datetime import datetime
+from pathlib import Path
 from typing import Tuple
 import numpy as np
 
+from saag_soy_monitor.anomaly import zscores
+from saag_soy_monitor.export import aoi_key, iter_frames, write_csv
+from saag_soy_monitor.render import legend_png, ndvi_thumbnail
+from saag_soy_monitor.smoothing import smooth_series
+
 st.markdown("# Séries Temporais (NDVI)")
 st.caption("Visualize evolução por talhão / BBOX")
 
@@ -42,9 +48,12 @@ def _install_hint():
 
 # ---------- Consulta Planetary Computer ----------
 try:
-    import planetary_computer as pc
-    from pystac_client import Client
-    from odc.stac import stac_load
+    import planetary_computer  # noqa: F401
+    import pystac_client  # noqa: F401
+    import odc.stac  # noqa: F401
+    from saag_soy_monitor.compute import compute, streamlit_session_id
+    from saag_soy_monitor.masking import aoi_geometry
+    from saag_soy_monitor.ndvi import aoi_ndvi, search_scenes
 except Exception:
     st.error("Dependências para leitura do Sentinel-2 não encontradas.")
     _install_hint()
@@ -59,66 +68,32 @@ except Exception as e:
     st.error(f"Parâmetros inválidos: {e}")
     st.stop()
 
+# Chave da AOI (BBOX, polígono desenhado, resolução e período) para caches e camadas
+_aoi_key = aoi_key(inputs)
+
 with st.status("Consultando Sentinel-2 no Planetary Computer...", expanded=False) as s:
     try:
-        catalog = Client.open("https://planetarycomputer.microsoft.com/api/stac/v1")
-        search = catalog.search(
-            collections=["sentinel-2-l2a"],
-            bbox=[minx, miny, maxx, maxy],
-            datetime=f"{start}/{end}",
-            query={"eo:cloud_cover": {"lt": 60}},
-            max_items=100,
-        )
-        items = list(search.items())
+        # Cenas em disco (SAAG_LOCAL_DATA) ou busca paginada no Planetary Computer
+        items = search_scenes([minx, miny, maxx, maxy], start, end)
         if len(items) == 0:
             s.update(label="Sem cenas no período/BBOX.", state="error")
             st.warning("Nenhuma cena Sentinel-2 L2A encontrada no período e área selecionados.")
             st.stop()
 
-        # Assinar URLs e detectar bandas
-        items = [pc.sign(item) for item in items]
-        asset_keys = set(items[0].assets.keys())
-        candidates = [("B04","B08"), ("B04_10m","B08_10m"), ("red","nir")]
-        chosen = None
-        for a1, a2 in candidates:
-            if a1 in asset_keys and a2 in asset_keys:
-                chosen = (a1, a2)
-                break
-        if chosen is None:
-            raise RuntimeError(f"Não encontrei bandas RED/NIR nos assets: {sorted(asset_keys)}")
-
-        # Carrega em UTM nativo, resolução em metros
-        ds = stac_load(
-            items,
-            assets=list(chosen),
-            bbox=(minx, miny, maxx, maxy),
-            crs=None,
-            resolution=res_m,
-            chunks={"time": 1, "x": 1024, "y": 1024},
+        # Zonas UTM, seleção de cenas, máscara do polígono, cubo compartilhado e série
+        _res = aoi_ndvi(
+            items, (minx, miny, maxx, maxy), start, end, res_m,
+            aoi=aoi_geometry(inputs.get("aoi_geojson")), session=streamlit_session_id(),
         )
-
-        red = ds[chosen[0]].astype("float32")
-        nir = ds[chosen[1]].astype("float32")
-        # Escala 0..1, se necessário
-        try:
-            mx = max(float(red.max().compute()), float(nir.max().compute()))
-        except Exception:
-            mx = 1.0
-        if mx > 1.5:
-            red = red / 10000.0
-            nir = nir / 10000.0
-
-        ndvi = (nir - red) / (nir + red + 1e-6)
-        ndvi_t = ndvi.median(dim=("y","x")).compute()
-        df = ndvi_t.to_series().reset_index()
-        df.columns = ["date", "NDVI"]
-        df = df.sort_values("date")
+        ndvi, df = _res.ndvi, _res.df
 
         if df.empty:
             s.update(label="Sem dados NDVI após processamento.", state="error")
             st.warning("Nenhum dado NDVI disponível após aplicar filtros.")
             st.stop()
 
+        # Série disponível para Exportações sem recalcular
+        st.session_state.setdefault("saag_ndvi_df", {})[_aoi_key] = df.copy()
         s.update(label="Cenas carregadas e NDVI calculado.", state="complete")
     except Exception as e:
         s.update(label="Erro ao consultar/calcular NDVI.", state="error")
@@ -127,17 +102,95 @@ with st.status("Consultando Sentinel-2 no Planetary Computer...", expanded=False
         _install_hint()
         st.stop()
 
+# ---------- Anomalias (z-score temporal) ----------
+_anom = zscores(df["NDVI"].to_numpy(dtype="float64")[None, :])
+df["zscore"] = _anom.zscore[0]
+df["anomalia"] = _anom.breaks[0]
+
 # ---------- Gráfico (série temporal) ----------
-chart = alt.Chart(df).mark_line(point=True).encode(
+line = alt.Chart(df).mark_line(point=True).encode(
     x=alt.X("date:T", title="date"),
     y=alt.Y("NDVI:Q", scale=alt.Scale(domain=[0,1])),
-    tooltip=[alt.Tooltip("date:T", title="Data"), alt.Tooltip("NDVI:Q", format=".3f")]
-).properties(width="container", height=420)
+    tooltip=[alt.Tooltip("date:T", title="Data"), alt.Tooltip("NDVI:Q", format=".3f"),
+             alt.Tooltip("zscore:Q", title="z-score", format=".2f")]
+)
+breaks = alt.Chart(df[df["anomalia"]]).mark_point(color="red", size=90, filled=True).encode(
+    x="date:T", y="NDVI:Q"
+)
+# Curva suavizada (Whittaker, grade regular de 5 dias, pesos = fração válida)
+layers = [line, breaks]
+df_smooth = None
+if df["NDVI"].notna().sum() >= 3:
+    _grid, _smooth = smooth_series(
+        df["date"], df["NDVI"].to_numpy()[None, :], df["valid_frac"].to_numpy()[None, :]
+    )
+    df_smooth = pd.DataFrame({"date": _grid, "NDVI": _smooth[0]})
+    layers.insert(0, alt.Chart(df_smooth).mark_line(strokeDash=[6, 3], color="#7fbf7b").encode(
+        x="date:T", y="NDVI:Q"
+    ))
+chart = alt.layer(*layers).properties(width="container", height=420)
 
 with st.expander("Cenas carregadas e NDVI calculado.", expanded=True):
     st.altair_chart(chart, use_container_width=True)
-    csv = df.to_csv(index=False).encode("utf-8")
-    st.download_button("Baixar CSV", csv, "serie_temporal_ndvi.csv", "text/csv")
+    if df_smooth is not None:
+        # Fenologia da curva suavizada (SOS, pico, EOS)
+        from saag_soy_monitor.phenology import extract as _phenology
+        from saag_soy_monitor.phenology import AOI_PHENOLOGY_FILE, season_of, to_frame
+        from saag_soy_monitor.phenology import save as _save_phenology
+
+        _ph = _phenology(df_smooth["date"], df_smooth["NDVI"].to_numpy()[None, :])
+        # Grava uma vez por AOI/período na tabela de AOIs (fora do calendário dos talhões)
+        _ph_saved = st.session_state.setdefault("saag_phenology", set())
+        if _aoi_key not in _ph_saved:
+            try:
+                _save_phenology(
+                    to_frame([_aoi_key], _ph, season_of(start)), Path.cwd() / "outputs", AOI_PHENOLOGY_FILE
+                )
+                _ph_saved.add(_aoi_key)
+            except Exception as e:
+                st.caption(f"Fenologia não gravada: {e}")
+        if pd.notna(_ph["peak_date"][0]):
+            p1, p2, p3, p4 = st.columns(4)
+            p1.metric("Início (SOS)", str(_ph["sos_date"][0]))
+            p2.metric("Pico", str(_ph["peak_date"][0]), f"NDVI {_ph['peak_value'][0]:.2f}", delta_color="off")
+            p3.metric("Fim (EOS)", str(_ph["eos_date"][0]))
+            p4.metric("NDVI integrado", f"{_ph['integrated_ndvi'][0]:.1f}")
+    # CSV gerado só sob demanda (gravado em blocos no disco, não a cada rerun),
+    # um arquivo por AOI/período
+    _csvs = st.session_state.setdefault("saag_ts_csv", {})
+    if st.button("Gerar CSV"):
+        _out = Path.cwd() / "outputs"
+        _out.mkdir(parents=True, exist_ok=True)
+        _csvs[_aoi_key] = str(
+            write_csv(iter_frames(df), _out / f"serie_temporal_ndvi_{_aoi_key}.csv")
+        )
+    _csv_file = _csvs.get(_aoi_key)
+    if _csv_file and Path(_csv_file).exists():
+        with open(_csv_file, "rb") as fh:
+            st.download_button("Baixar CSV", fh, "serie_temporal_ndvi.csv", "text/csv")
+
+# ---------- Exportação do cubo NDVI (por pixel) ----------
+with st.expander("Exportar cubo NDVI (Zarr / COG)", expanded=False):
+    st.caption("Grava o NDVI por pixel chunk a chunk (dask), sem carregar o cubo inteiro em memória.")
+    cube_fmt = st.radio("Formato", ["Zarr (time, y, x)", "COG por data"], horizontal=True)
+    if st.button("Exportar cubo"):
+        # Um diretório por AOI/período: sessões e AOIs diferentes não se sobrescrevem
+        _cube_dir = Path.cwd() / "outputs" / "cubes" / f"{start}_{end}_{_aoi_key}"
+        _cube_dir.mkdir(parents=True, exist_ok=True)
+        try:
+            from saag_soy_monitor.cube_export import write_cogs, write_zarr
+
+            with st.spinner("Gravando cubo NDVI..."):
+                if cube_fmt.startswith("Zarr"):
+                    _dest = write_zarr(ndvi, _cube_dir / "ndvi_cube.zarr", session=streamlit_session_id())
+                    st.success(f"Zarr salvo em: {_dest}")
+                else:
+                    _cogs = write_cogs(ndvi, _cube_dir / "ndvi_cog", session=streamlit_session_id())
+                    st.success(f"{len(_cogs)} COG(s) salvos em: {_cube_dir / 'ndvi_cog'}")
+                    st.session_state.setdefault("saag_ndvi_cogs", {})[_aoi_key] = [str(c) for c in _cogs]
+        except Exception as e:
+            st.error("Erro ao exportar o cubo NDVI (requer zarr ou rioxarray/rasterio).")
+            st.code(str(e))
 
 # ---------- Box de imagens NDVI (pré-visualizações) ----------
 st.markdown("### Mapas NDVI da área (pré-visualizações)")
@@ -151,39 +204,51 @@ with cmax:
 with nshots:
     n_imgs = st.slider("Qtde de imagens", 1, 6, 4)
 
+# Camada NDVI (cena mais recente) no servidor local de tiles -> overlay no mapa da Home
+if ndvi.time.size > 0:
+    try:
+        from saag_soy_monitor.tiles import ArraySource, CogSource, get_tile_server
+
+        _layer = "ndvi-" + _aoi_key
+        _last = ndvi.isel(time=-1)
+        # Só os COGs exportados desta AOI/período (outra AOI teria outras datas)
+        _cogs = st.session_state.get("saag_ndvi_cogs", {}).get(_aoi_key) or []
+        if _cogs and Path(_cogs[-1]).exists():
+            # Cubo já exportado como COG: tiles lidos por janela/overview, sem recálculo
+            _src = CogSource(_cogs[-1], vmin=float(vmin), vmax=float(vmax), version=_cogs[-1])
+        else:
+            _src = ArraySource.from_dataarray(
+                _last, vmin=float(vmin), vmax=float(vmax), version=str(_last.time.values)
+            )
+        st.session_state["saag_tile_layers"] = {
+            "NDVI (cena mais recente)": get_tile_server().register(_layer, _src)
+        }
+    except Exception as e:
+        st.caption(f"Camada NDVI no mapa indisponível: {e}")
+
 # Seleção de datas distribuídas
 time_len = ndvi.time.size
 idxs = np.linspace(0, time_len - 1, n_imgs, dtype=int) if time_len > 0 else np.array([], dtype=int)
 sel_times = [ndvi.time.values[i] for i in idxs]
 
-from io import BytesIO
-import matplotlib.pyplot as plt
-
-def ndvi_slice_png(arr, vmin=0.3, vmax=0.9):
-    """Gera PNG do NDVI com legenda (colormap RdYlGn)."""
-    fig, ax = plt.subplots(figsize=(3.5, 3.5), dpi=160)
-    im = ax.imshow(arr, vmin=vmin, vmax=vmax, cmap="RdYlGn")
-    ax.axis("off")
-    cbar = fig.colorbar(im, ax=ax, fraction=0.046, pad=0.04)
-    cbar.set_label("NDVI", rotation=270, labelpad=8)
-    buf = BytesIO()
-    fig.tight_layout(pad=0.1)
-    fig.savefig(buf, format="png", bbox_inches="tight", pad_inches=0.02)
-    plt.close(fig)
-    buf.seek(0)
-    return buf
+@st.cache_data(show_spinner=False, max_entries=256)
+def _ndvi_thumb(date_key: str, vmin: float, vmax: float, aoi_key: str, _t) -> bytes:
+    """Miniatura NDVI em cache por (data, vmin, vmax) dentro da AOI atual."""
+    arr = compute(ndvi.sel(time=_t), session=streamlit_session_id())[0].values
+    return ndvi_thumbnail(arr, vmin=vmin, vmax=vmax)
 
 if len(sel_times) == 0:
     st.info("Nenhuma cena disponível para gerar os mapas NDVI.")
 else:
+    # Legenda única (renderizada uma vez e reutilizada)
+    st.image(legend_png(float(vmin), float(vmax)))
     per_row = 4
     rows = (len(sel_times) + per_row - 1) // per_row
     for r in range(rows):
         cols = st.columns(min(per_row, len(sel_times) - r*per_row))
         for j, col in enumerate(cols, start=0):
             t = sel_times[r*per_row + j]
-            arr = ndvi.sel(time=t).clip(vmin, vmax).compute().values
-            arr = np.where(np.isfinite(arr), arr, vmin)
-            png = ndvi_slice_png(arr, vmin=vmin, vmax=vmax)
+            date_str = pd.to_datetime(str(t)).strftime("%Y-%m-%d")
+            png = _ndvi_thumb(str(t), float(vmin), float(vmax), _aoi_key, t)
             with col:
-                st.image(png, use_container_width=True, caption=pd.to_datetime(str(t)).strftime("%Y-%m-%d"))
+                st.image(png, use_container_width=True, caption=date_str)
@@ -1,13 +1,19 @@
 # pages/03_Exportacoes.py
-# Exportações: CSV / Parquet (séries NDVI) e GeoPackage (AOI do BBOX).
+# Exportações: CSV / Parquet (séries NDVI) e GeoPackage (talhões + estatísticas).
+# CSV/Parquet são gravados em blocos (sem montar o arquivo inteiro em memória).
+# Downloads acima de SAAG_DOWNLOAD_INLINE_MB saem pelo servidor local de tiles
+# (em fluxo), em vez de passar o arquivo inteiro pela memória do Streamlit.
 # Se não houver série em memória, recalcula a partir dos parâmetros salvos (Home).
 
 from __future__ import annotations
+import os
 import streamlit as st
 import pandas as pd
 from pathlib import Path
 from typing import Tuple
 
+from saag_soy_monitor.export import aoi_key, iter_frames, write_csv, write_parquet
+
 st.markdown("# Exportações")
 st.caption("Gere GeoPackage / CSV / Parquet para dashboards")
 
@@ -30,6 +36,18 @@ def _install_hint():
         "Se aparecer aviso do PROJ/GDAL, execute `setx PROJ_NETWORK ON` e reabra o terminal."
     )
 
+def _download(label: str, path: Path, mime: str) -> None:
+    # Arquivos pequenos: botão do Streamlit; grandes: link servido em fluxo
+    limit = float(os.getenv("SAAG_DOWNLOAD_INLINE_MB", "50")) * 2**20
+    if path.stat().st_size <= limit:
+        st.download_button(label, data=path.read_bytes(), file_name=path.name, mime=mime)
+        return
+    try:
+        from saag_soy_monitor.tiles import get_tile_server
+        st.link_button(label, get_tile_server().publish_file(path))
+    except Exception as e:
+        st.caption(f"Arquivo grande demais para download pelo app ({e}); use o caminho acima.")
+
 # ---------------------------------------------------------------------
 # Entrada (parâmetros salvos na sessão pela Home)
 
@@ -48,24 +66,25 @@ st.code(f"BBOX (EPSG:4326): {inputs.get('bbox_wgs84','-')}", language="text")
 out_dir = Path.cwd() / "outputs"
 out_dir.mkdir(parents=True, exist_ok=True)
 
-csv_path = out_dir / "ts_ndvi.csv"
-parquet_path = out_dir / "ts_ndvi.parquet"
-gpkg_path = out_dir / "aoi.gpkg"
+# Um conjunto de arquivos por AOI/período (não sobrescreve outras sessões)
+_aoi_key = aoi_key(inputs)
+csv_path = out_dir / f"ts_ndvi_{_aoi_key}.csv"
+parquet_path = out_dir / f"ts_ndvi_{_aoi_key}.parquet"
+gpkg_path = out_dir / f"aoi_{_aoi_key}.gpkg"
 
 # ---------------------------------------------------------------------
 # Obtém/gera a série NDVI (reusa se já existir na sessão)
 
-def get_timeseries_df() -> pd.DataFrame | None:
-    # Se outra página já deixou em memória, aproveita:
-    df = st.session_state.get("saag_ndvi_df")
-    if isinstance(df, pd.DataFrame) and not df.empty:
-        return df.copy()
-
-    # Caso contrário, tenta calcular aqui para exportar
+def _load_ndvi():
+    # Cubo + série NDVI da AOI (mesma cadeia da página de séries; o cubo vem do
+    # cache compartilhado quando outra sessão já o calculou)
     try:
-        import planetary_computer as pc
-        from pystac_client import Client
-        from odc.stac import stac_load
+        import planetary_computer  # noqa: F401
+        import pystac_client  # noqa: F401
+        import odc.stac  # noqa: F401
+        from saag_soy_monitor.compute import streamlit_session_id
+        from saag_soy_monitor.masking import aoi_geometry
+        from saag_soy_monitor.ndvi import aoi_ndvi, search_scenes
     except Exception:
         st.error("Dependências para leitura do Sentinel-2 não encontradas.")
         _install_hint()
@@ -82,64 +101,23 @@ def get_timeseries_df() -> pd.DataFrame | None:
 
     with st.status("Consultando Sentinel-2 e calculando NDVI para exportação...", expanded=False) as s:
         try:
-            catalog = Client.open("https://planetarycomputer.microsoft.com/api/stac/v1")
-            search = catalog.search(
-                collections=["sentinel-2-l2a"],
-                bbox=[minx, miny, maxx, maxy],
-                datetime=f"{start}/{end}",
-                query={"eo:cloud_cover": {"lt": 60}},
-                max_items=100,
-            )
-            items = list(search.items())
+            items = search_scenes([minx, miny, maxx, maxy], start, end)
             if len(items) == 0:
                 s.update(label="Sem cenas no período/BBOX.", state="error")
                 return None
 
-            items = [pc.sign(item) for item in items]
-            asset_keys = set(items[0].assets.keys())
-            candidates = [("B04", "B08"), ("B04_10m", "B08_10m"), ("red", "nir")]
-            chosen = None
-            for a1, a2 in candidates:
-                if a1 in asset_keys and a2 in asset_keys:
-                    chosen = (a1, a2)
-                    break
-            if chosen is None:
-                s.update(label="Bandas RED/NIR não encontradas na coleção.", state="error")
-                return None
-
-            ds = stac_load(
-                items,
-                assets=list(chosen),
-                bbox=(minx, miny, maxx, maxy),
-                crs=None,
-                resolution=res_m,
-                chunks={"time": 1, "x": 1024, "y": 1024},
+            res = aoi_ndvi(
+                items, (minx, miny, maxx, maxy), start, end, res_m,
+                aoi=aoi_geometry(inputs.get("aoi_geojson")), session=streamlit_session_id(),
             )
-            red = ds[chosen[0]].astype("float32")
-            nir = ds[chosen[1]].astype("float32")
-
-            # Escala para 0..1, se necessário
-            try:
-                mx = max(float(red.max().compute()), float(nir.max().compute()))
-            except Exception:
-                mx = 1.0
-            if mx > 1.5:
-                red = red / 10000.0
-                nir = nir / 10000.0
-
-            ndvi = (nir - red) / (nir + red + 1e-6)
-            ndvi_t = ndvi.median(dim=("y", "x")).compute()
-            df = ndvi_t.to_series().reset_index()
-            df.columns = ["date", "NDVI"]
-            df = df.sort_values("date")
-            if df.empty:
+            if res.df.empty:
                 s.update(label="Sem dados NDVI após processamento.", state="error")
                 return None
 
             # Guarda em sessão p/ outras abas
-            st.session_state["saag_ndvi_df"] = df.copy()
+            st.session_state.setdefault("saag_ndvi_df", {})[_aoi_key] = res.df.copy()
             s.update(label="Série NDVI pronta para exportação.", state="complete")
-            return df
+            return res
         except Exception as e:
             s.update(label="Erro ao calcular série NDVI.", state="error")
             st.error("Falha ao obter/calcular NDVI.")
@@ -147,6 +125,28 @@ def get_timeseries_df() -> pd.DataFrame | None:
             _install_hint()
             return None
 
+def get_timeseries_df() -> pd.DataFrame | None:
+    # Se já foi calculada para esta AOI/período nesta sessão, aproveita:
+    df = st.session_state.get("saag_ndvi_df", {}).get(_aoi_key)
+    if isinstance(df, pd.DataFrame) and not df.empty:
+        return df.copy()
+    # Caso contrário, tenta calcular aqui para exportar
+    res = _load_ndvi()
+    return res.df.copy() if res is not None else None
+
+def get_field_stats(field_ids, geometries) -> pd.DataFrame | None:
+    # Série por talhão (mediana dentro de cada polígono), em cache por AOI/talhões
+    _key = (_aoi_key, tuple(field_ids))
+    cache = st.session_state.setdefault("saag_field_stats", {})
+    if _key not in cache:
+        res = _load_ndvi()
+        if res is None:
+            return None
+        from saag_soy_monitor.compute import streamlit_session_id
+        from saag_soy_monitor.ndvi import field_stats
+        cache[_key] = field_stats(res, field_ids, geometries, session=streamlit_session_id())
+    return cache[_key]
+
 # ---------------------------------------------------------------------
 # Botões
 
@@ -158,10 +158,9 @@ with c1:
         if df is None:
             st.warning("Não foi possível gerar a série NDVI para exportar.")
         else:
-            df.to_csv(csv_path, index=False, encoding="utf-8")
+            write_csv(iter_frames(df), csv_path)
             st.success(f"CSV salvo em: {csv_path}")
-            st.download_button("Baixar CSV gerado", data=csv_path.read_bytes(),
-                               file_name=csv_path.name, mime="text/csv")
+            _download("Baixar CSV gerado", csv_path, "text/csv")
 
 with c2:
     if st.button("Exportar Parquet"):
@@ -170,41 +169,52 @@ with c2:
             st.warning("Não foi possível gerar a série NDVI para exportar.")
         else:
             try:
-                df.to_parquet(parquet_path, index=False)
+                write_parquet(iter_frames(df), parquet_path)
                 st.success(f"Parquet salvo em: {parquet_path}")
-                st.download_button("Baixar Parquet gerado", data=parquet_path.read_bytes(),
-                                   file_name=parquet_path.name, mime="application/octet-stream")
+                _download("Baixar Parquet gerado", parquet_path, "application/octet-stream")
             except Exception as e:
                 st.error("Erro ao salvar Parquet.")
                 st.code(str(e))
 
 with c3:
     if st.button("Exportar GeoPackage"):
-        # Exporta o AOI (BBOX) em EPSG:4326 num GeoPackage.
+        # Talhões (camada 'talhoes', com índice R-tree) + estatísticas por data
+        # numa tabela separada ('ndvi_stats'), ligada por field_id.
         try:
-            import geopandas as gpd
             from shapely.geometry import box
+            from saag_soy_monitor.gpkg import write_fields_gpkg
+            from saag_soy_monitor.masking import aoi_geometry
         except Exception:
-            st.error("geopandas/shapely não instalados.")
+            st.error("shapely não instalado.")
             _install_hint()
         else:
             try:
                 minx, miny, maxx, maxy = _parse_bbox(inputs["bbox_wgs84"])
-                gdf = gpd.GeoDataFrame(
-                    {
-                        "name": ["AOI"],
-                        "start": [inputs.get("start_date")],
-                        "end": [inputs.get("end_date")],
-                        "resolution_m": [int(inputs.get("resolution_m", 10))],
+                registry = st.session_state.get("saag_fields")
+                in_aoi = registry.query_bbox(minx, miny, maxx, maxy) if registry is not None else []
+                if len(in_aoi):
+                    # Talhões registrados (Áreas e Períodos) que cruzam a AOI
+                    field_ids = list(in_aoi)
+                    geometries = [registry.geometry(f) for f in field_ids]
+                    stats = get_field_stats(field_ids, geometries)
+                else:
+                    field_ids = ["AOI"]
+                    geometries = [aoi_geometry(inputs.get("aoi_geojson")) or box(minx, miny, maxx, maxy)]
+                    stats = None
+                    df = get_timeseries_df()
+                    if df is not None:
+                        stats = df.assign(field_id="AOI")
+                n = len(field_ids)
+                write_fields_gpkg(
+                    gpkg_path, field_ids, geometries, stats=stats,
+                    attrs={
+                        "start": [inputs.get("start_date")] * n,
+                        "end": [inputs.get("end_date")] * n,
+                        "resolution_m": [int(inputs.get("resolution_m", 10))] * n,
                     },
-                    geometry=[box(minx, miny, maxx, maxy)],
-                    crs="EPSG:4326",
                 )
-                # Se já existir, sobrescreve a camada 'aoi'
-                gdf.to_file(gpkg_path, layer="aoi", driver="GPKG")
-                st.success(f"GeoPackage salvo em: {gpkg_path} (camada 'aoi').")
-                st.download_button("Baixar GeoPackage gerado", data=gpkg_path.read_bytes(),
-                                   file_name=gpkg_path.name, mime="application/geopackage+sqlite3")
+                st.success(f"GeoPackage salvo em: {gpkg_path} (camadas 'talhoes' e 'ndvi_stats').")
+                _download("Baixar GeoPackage gerado", gpkg_path, "application/geopackage+sqlite3")
             except Exception as e:
                 st.error("Erro ao salvar GeoPackage.")
                 st.code(str(e))
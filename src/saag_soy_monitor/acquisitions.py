@@ -0,0 +1,103 @@
+"""Calendário de aquisições guiado pelo catálogo.
+
+Em vez de uma grade fixa de 7 dias (que pede datas sem passagem e pula
+aquisições reais), o calendário consulta primeiro o catálogo para a AOI e
+devolve só os dias com cena, opcionalmente filtrados por cobertura de nuvens.
+"""
+
+from __future__ import annotations
+
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+REVISIT_DAYS = 5  # Sentinel-2A + 2B
+_REVISIT_ANCHOR = pd.Timestamp("2017-07-06")
+
+
+def _calendar(rows: list[dict], max_cloud: float | None) -> pd.DataFrame:
+    """Uma linha por dia (UTC): menor cobertura de nuvens e nº de cenas."""
+    df = pd.DataFrame(rows, columns=["date", "cloud_cover"])
+    if max_cloud is not None:
+        df = df[df["cloud_cover"].fillna(100.0) <= max_cloud]
+    if df.empty:
+        return pd.DataFrame(
+            {
+                "date": pd.DatetimeIndex([]),
+                "cloud_cover": pd.Series(dtype="float64"),
+                "n_scenes": pd.Series(dtype="int64"),
+            }
+        )
+    out = (
+        df.groupby("date")
+        .agg(cloud_cover=("cloud_cover", "min"), n_scenes=("cloud_cover", "size"))
+        .reset_index()
+    )
+    return out.sort_values("date").reset_index(drop=True)
+
+
+def sentinelhub_calendar(
+    bbox_xyxy: tuple[float, float, float, float],
+    start: date,
+    end: date,
+    config=None,
+    collection: str = "SENTINEL2_L2A",
+    max_cloud: float | None = None,
+) -> pd.DataFrame:
+    """Dias com aquisição na AOI segundo o Catalog API do Sentinel Hub."""
+    from sentinelhub import CRS, BBox, DataCollection, SentinelHubCatalog
+
+    catalog = SentinelHubCatalog(config=config)
+    search = catalog.search(
+        getattr(DataCollection, collection),
+        bbox=BBox(list(bbox_xyxy), crs=CRS.WGS84),
+        # Fim inclusivo: até 23:59:59 do último dia
+        time=(
+            pd.Timestamp(start).normalize().isoformat(),
+            (
+                pd.Timestamp(end).normalize()
+                + pd.Timedelta(days=1)
+                - pd.Timedelta(seconds=1)
+            ).isoformat(),
+        ),
+        fields={
+            "include": ["id", "properties.datetime", "properties.eo:cloud_cover"],
+            "exclude": [],
+        },
+    )
+    rows = []
+    for feat in search:
+        props = feat.get("properties", {})
+        rows.append(
+            {
+                "date": pd.to_datetime(props["datetime"], utc=True)
+                .tz_localize(None)
+                .normalize(),
+                "cloud_cover": props.get("eo:cloud_cover"),
+            }
+        )
+    return _calendar(rows, max_cloud)
+
+
+def synthetic_calendar(
+    start: date,
+    end: date,
+    max_cloud: float | None = None,
+    seed: int = 0,
+) -> pd.DataFrame:
+    """Calendário fictício plausível para o modo demo.
+
+    Passagens a cada `REVISIT_DAYS` dias em fase fixa, com nuvens mais
+    frequentes no período chuvoso (out–abr), como no cerrado/Amazônia.
+    """
+    first = pd.Timestamp(start)
+    phase = (first - _REVISIT_ANCHOR).days % REVISIT_DAYS
+    if phase:
+        first += pd.Timedelta(days=REVISIT_DAYS - phase)
+    days = pd.date_range(first, pd.Timestamp(end), freq=f"{REVISIT_DAYS}D")
+    rng = np.random.default_rng(seed)
+    wet = np.isin(days.month, [10, 11, 12, 1, 2, 3, 4])
+    cloud = np.clip(rng.beta(np.where(wet, 2.0, 0.6), 2.0) * 100.0, 0.0, 100.0)
+    rows = [{"date": d, "cloud_cover": float(c)} for d, c in zip(days, cloud)]
+    return _calendar(rows, max_cloud)
@@ -0,0 +1,170 @@
+"""Anomalias temporais (z-score) vetorizadas sobre todos os talhões de uma vez.
+
+Entrada: matriz NDVI (talhões x datas), com NaN onde não há observação. A linha
+de base de cada data é a média/desvio das `window` datas anteriores do próprio
+talhão (somas acumuladas, sem laço por talhão). Quebras são z-scores abaixo do
+limiar por `persistence` datas seguidas.
+
+As somas acumuladas deixam um resíduo de arredondamento na variância de
+janelas constantes; variâncias abaixo de `VAR_RTOL` x a média dos quadrados
+do histórico contam como zero (z-score NaN, sem quebra).
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Sequence
+
+import numpy as np
+import pandas as pd
+
+VAR_RTOL = 1e-12  # variância relativa tratada como zero (erro das somas)
+
+
+@dataclass
+class AnomalyResult:
+    baseline: np.ndarray  # (F, T) média das datas anteriores
+    spread: np.ndarray  # (F, T) desvio padrão das datas anteriores
+    zscore: np.ndarray  # (F, T)
+    breaks: np.ndarray  # (F, T) bool
+
+
+@dataclass
+class AnomalyState:
+    """Cauda da série por talhão, suficiente para pontuar as próximas datas."""
+
+    field_ids: np.ndarray
+    tail: np.ndarray  # (F, window + persistence - 1)
+    window: int
+    min_periods: int
+    threshold: float
+    persistence: int
+
+
+def _window_sums(x: np.ndarray, window: int):
+    """Soma, soma dos quadrados e contagem das `window` colunas anteriores a t,
+    e a média dos quadrados de todo o histórico até t (escala do erro)."""
+    valid = np.isfinite(x)
+    xv = np.where(valid, x, 0.0)
+    pad = np.zeros((x.shape[0], 1))
+    c1 = np.concatenate([pad, np.cumsum(xv, axis=1)], axis=1)
+    c2 = np.concatenate([pad, np.cumsum(xv * xv, axis=1)], axis=1)
+    cn = np.concatenate([pad, np.cumsum(valid, axis=1)], axis=1)
+    t = np.arange(x.shape[1])
+    lo = np.maximum(t - window, 0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        scale = np.where(cn[:, t] > 0, c2[:, t] / cn[:, t], 0.0)
+    return c1[:, t] - c1[:, lo], c2[:, t] - c2[:, lo], cn[:, t] - cn[:, lo], scale
+
+
+def zscores(
+    values: np.ndarray,
+    window: int = 6,
+    min_periods: int = 3,
+    threshold: float = -2.0,
+    persistence: int = 1,
+) -> AnomalyResult:
+    """Linha de base móvel, z-scores e flags de quebra para a matriz (F, T)."""
+    x = np.asarray(values, dtype=np.float64)
+    s1, s2, n, scale = _window_sums(x, window)
+    enough = n >= max(min_periods, 2)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.where(n > 0, s1 / n, np.nan)
+        var = np.where(enough, (s2 - s1 * mean) / (n - 1), np.nan)
+        var[var <= VAR_RTOL * scale] = 0.0  # resíduo (ou negativo): zero
+        std = np.sqrt(var)
+        z = np.where(enough & (std > 0), (x - mean) / std, np.nan)
+    mean[~enough] = np.nan
+
+    below = z <= threshold
+    breaks = below.copy()
+    for k in range(1, persistence):
+        breaks[:, k:] &= below[:, :-k]
+        breaks[:, :k] = False
+    return AnomalyResult(mean, std, z, breaks)
+
+
+def init_state(
+    field_ids: Sequence,
+    values: np.ndarray,
+    window: int = 6,
+    min_periods: int = 3,
+    threshold: float = -2.0,
+    persistence: int = 1,
+) -> tuple[AnomalyResult, AnomalyState]:
+    """Pontua o histórico completo e guarda a cauda para atualizações."""
+    x = np.asarray(values, dtype=np.float64)
+    res = zscores(x, window, min_periods, threshold, persistence)
+    keep = window + persistence - 1
+    tail = np.full((x.shape[0], keep), np.nan)
+    k = min(keep, x.shape[1])
+    if k:
+        tail[:, keep - k :] = x[:, x.shape[1] - k :]
+    state = AnomalyState(
+        np.asarray(field_ids), tail, window, min_periods, threshold, persistence
+    )
+    return res, state
+
+
+def update(
+    state: AnomalyState, new_values: np.ndarray
+) -> tuple[AnomalyResult, AnomalyState]:
+    """Pontua só as novas datas (F, k), reaproveitando a cauda guardada."""
+    new = np.asarray(new_values, dtype=np.float64)
+    if new.ndim == 1:
+        new = new[:, None]
+    x = np.concatenate([state.tail, new], axis=1)
+    res = zscores(
+        x, state.window, state.min_periods, state.threshold, state.persistence
+    )
+    k = new.shape[1]
+    sl = slice(x.shape[1] - k, None)
+    out = AnomalyResult(
+        res.baseline[:, sl], res.spread[:, sl], res.zscore[:, sl], res.breaks[:, sl]
+    )
+    keep = state.tail.shape[1]
+    tail = x[:, x.shape[1] - keep :]
+    return out, AnomalyState(
+        state.field_ids,
+        tail,
+        state.window,
+        state.min_periods,
+        state.threshold,
+        state.persistence,
+    )
+
+
+def to_matrix(
+    df: pd.DataFrame,
+    field_col: str = "field_id",
+    date_col: str = "date",
+    value_col: str = "NDVI",
+) -> tuple[np.ndarray, pd.DatetimeIndex, np.ndarray]:
+    """Série longa (talhão, data, valor) -> (ids, datas, matriz F x T)."""
+    wide = df.pivot_table(
+        index=field_col, columns=date_col, values=value_col, aggfunc="mean"
+    ).sort_index(axis=1)
+    return (
+        wide.index.to_numpy(),
+        pd.DatetimeIndex(wide.columns),
+        wide.to_numpy(dtype=np.float64),
+    )
+
+
+def to_frame(
+    field_ids: Sequence,
+    dates: Sequence,
+    result: AnomalyResult,
+    field_col: str = "field_id",
+) -> pd.DataFrame:
+    """Resultado (F, T) -> tabela longa com baseline, z-score e quebra."""
+    f, t = result.zscore.shape
+    return pd.DataFrame(
+        {
+            field_col: np.repeat(np.asarray(field_ids), t),
+            "date": np.tile(np.asarray(dates), f),
+            "baseline": result.baseline.ravel(),
+            "zscore": result.zscore.ravel(),
+            "anomaly": result.breaks.ravel(),
+        }
+    )
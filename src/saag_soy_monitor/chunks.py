@@ -0,0 +1,87 @@
+"""Escolha automática de chunks para o `stac_load`.
+
+`{"time": 1, "x": 1024, "y": 1024}` gera milhares de tarefas minúsculas para
+talhões pequenos e chunks grandes demais para AOIs grandes com muitas datas.
+O planejador parte das dimensões da AOI em pixels, do número de datas, do
+dtype e de um orçamento de memória (SAAG_MEMORY_BUDGET_MB) dividido entre as
+threads do dask:
+
+- se uma data inteira cabe no chunk-alvo, o chunk cobre a AOI toda e agrupa
+  várias datas (poucas tarefas, e a mediana espacial não precisa de rechunk);
+- senão, usa quadrados múltiplos do bloco interno do COG, uma data por chunk.
+
+Com máscara de polígono (`masked=True`) a AOI nunca vira um chunk só: ela é
+dividida ao menos em quadrados de `COG_BLOCK`, para que `mask_array` possa
+descartar os chunks totalmente fora do polígono sem lê-los.
+"""
+
+from __future__ import annotations
+
+import math
+import os
+
+import numpy as np
+
+DEFAULT_BUDGET_MB = 1024
+COG_BLOCK = 512
+# Cópias vivas por pixel na cadeia uint16 -> float32 (red, nir) -> NDVI
+WORKING_COPIES = 4
+
+
+def memory_budget_mb() -> int:
+    return int(os.getenv("SAAG_MEMORY_BUDGET_MB", DEFAULT_BUDGET_MB))
+
+
+def aoi_pixels(
+    bbox_wgs84: tuple[float, float, float, float], resolution_m: float
+) -> tuple[int, int]:
+    """Largura e altura aproximadas (pixels) de uma BBOX em graus."""
+    minx, miny, maxx, maxy = bbox_wgs84
+    lat = math.radians((miny + maxy) / 2)
+    width = (maxx - minx) * 111_320 * math.cos(lat) / resolution_m
+    height = (maxy - miny) * 110_574 / resolution_m
+    return max(1, math.ceil(width)), max(1, math.ceil(height))
+
+
+def plan_chunks(
+    width: int,
+    height: int,
+    n_times: int,
+    dtype="uint16",
+    n_bands: int = 2,
+    budget_mb: int | None = None,
+    workers: int | None = None,
+    masked: bool = False,
+) -> dict[str, int]:
+    """Chunks {"time", "y", "x"} para um cubo (n_times, height, width)."""
+    budget = (budget_mb or memory_budget_mb()) * 2**20
+    workers = workers or os.cpu_count() or 1
+    itemsize = max(np.dtype(dtype).itemsize, np.dtype("float32").itemsize)
+    # bytes por pixel de cada chunk em processamento, somando as bandas
+    per_pixel = itemsize * n_bands * WORKING_COPIES
+    target_pixels = max(COG_BLOCK * COG_BLOCK, budget // (workers * per_pixel))
+
+    per_date = width * height
+    if per_date <= target_pixels and not (masked and max(width, height) > COG_BLOCK):
+        t = int(min(max(n_times, 1), target_pixels // per_date))
+        return {"time": t, "y": height, "x": width}
+    if per_date <= target_pixels:
+        # Máscara: divisão mínima em blocos do COG; as datas se agrupam no tempo
+        tile = COG_BLOCK * COG_BLOCK
+        t = int(min(max(n_times, 1), target_pixels // tile))
+        return {"time": t, "y": min(COG_BLOCK, height), "x": min(COG_BLOCK, width)}
+
+    side = int(math.sqrt(target_pixels)) // COG_BLOCK * COG_BLOCK
+    side = max(COG_BLOCK, side)
+    return {"time": 1, "y": min(side, height), "x": min(side, width)}
+
+
+def chunks_for_aoi(
+    bbox_wgs84: tuple[float, float, float, float],
+    resolution_m: float,
+    n_times: int,
+    **kwargs,
+) -> dict[str, int]:
+    """Atalho para as páginas: BBOX em graus + resolução + nº de datas."""
+    width, height = aoi_pixels(bbox_wgs84, resolution_m)
+    return plan_chunks(width, height, n_times, **kwargs)
@@ -0,0 +1,319 @@
+"""Índice persistente de climatologia NDVI por talhão e dia do ano.
+
+Em vez de guardar percentis (que não se atualizam), o índice guarda histogramas
+de NDVI por (talhão, janela de dias do ano) em uint32. Uma nova safra só soma
+contagens; percentis e ranks saem do histograma acumulado. O arquivo de
+contagens é lido por mmap, então consultar um talhão lê só a sua linha
+(~5 KB com a configuração padrão), sem reprocessar anos de imagens.
+
+Os valores de cada safra ficam também em `seasons/<safra>.npz`: com
+`replace=True` uma safra já indexada (lote reexecutado ou completado) tem
+as contagens antigas subtraídas antes de somar as novas. Por isso as
+contagens nunca são truncadas: uma soma que não caiba no tipo levanta erro
+em vez de saturar (subtrair de uma contagem saturada corromperia o
+histograma). Índices antigos em uint16 são promovidos na próxima gravação.
+"""
+
+from __future__ import annotations
+
+import json
+import re
+import uuid
+from pathlib import Path
+from typing import Sequence
+
+import numpy as np
+import pandas as pd
+
+from .shared import file_lock
+
+COUNTS_FILE = "counts.npy"
+META_FILE = "meta.json"
+LOCK_FILE = ".lock"
+SEASONS_DIR = "seasons"
+COUNTS_DTYPE = np.uint32
+ROW_CHUNK = 4096  # talhões copiados por vez ao regravar as contagens
+
+
+def _tmp(path: Path) -> Path:
+    """Temporário exclusivo deste escritor (uuid), no mesmo diretório."""
+    return path.with_name(f".{path.name}.{uuid.uuid4().hex}.part")
+
+
+class ClimatologyIndex:
+    def __init__(
+        self,
+        root: Path = Path("outputs") / "climatology",
+        doy_step: int = 8,
+        ndvi_min: float = -0.2,
+        ndvi_max: float = 1.0,
+        ndvi_step: float = 0.02,
+    ):
+        self.root = Path(root)
+        self.doy_step = doy_step
+        self.ndvi_min = ndvi_min
+        self.ndvi_max = ndvi_max
+        self.ndvi_step = ndvi_step
+        self.field_ids: list[str] = []
+        self.seasons: list[str] = []
+        self._counts: np.ndarray | None = None
+
+    @property
+    def n_doy(self) -> int:
+        return int(np.ceil(366 / self.doy_step))
+
+    @property
+    def n_bins(self) -> int:
+        return int(round((self.ndvi_max - self.ndvi_min) / self.ndvi_step))
+
+    @classmethod
+    def open(cls, root: Path = Path("outputs") / "climatology") -> "ClimatologyIndex":
+        """Abre um índice existente (contagens em mmap, somente leitura)."""
+        idx = cls(root)
+        if not idx._reload():
+            raise FileNotFoundError(Path(root) / META_FILE)
+        return idx
+
+    def _reload(self) -> bool:
+        """Relê meta.json e as contagens do disco (False se não existem)."""
+        try:
+            meta = json.loads((self.root / META_FILE).read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return False
+        self.doy_step = meta["doy_step"]
+        self.ndvi_min = meta["ndvi_min"]
+        self.ndvi_max = meta["ndvi_max"]
+        self.ndvi_step = meta["ndvi_step"]
+        self.field_ids = meta["field_ids"]
+        self.seasons = meta["seasons"]
+        self._counts = np.load(self.root / COUNTS_FILE, mmap_mode="r")
+        return True
+
+    @classmethod
+    def open_or_create(cls, root: Path = Path("outputs") / "climatology", **kwargs):
+        root = Path(root)
+        if (root / META_FILE).exists():
+            return cls.open(root)
+        return cls(root, **kwargs)
+
+    def _counts_or_empty(self) -> np.ndarray:
+        if self._counts is None:
+            return np.zeros((0, self.n_doy, self.n_bins), dtype=COUNTS_DTYPE)
+        return self._counts
+
+    def _doy_bin(self, dates: Sequence) -> np.ndarray:
+        doy = pd.DatetimeIndex(dates).dayofyear.to_numpy()
+        return np.clip((doy - 1) // self.doy_step, 0, self.n_doy - 1)
+
+    def _row_index(self, field_ids: Sequence) -> np.ndarray:
+        pos = {f: i for i, f in enumerate(self.field_ids)}
+        try:
+            return np.array([pos[str(f)] for f in field_ids], dtype=np.int64)
+        except KeyError as exc:
+            raise KeyError(f"Talhão sem climatologia: {exc.args[0]}") from None
+
+    def _season_path(self, season: str) -> Path:
+        return self.root / SEASONS_DIR / (re.sub(r"[^\w.-]", "_", season) + ".npz")
+
+    def _accumulate(
+        self,
+        counts: np.ndarray,
+        ids: Sequence[str],
+        dates: Sequence,
+        values: np.ndarray,
+        sign: int = 1,
+    ) -> None:
+        """Soma (ou subtrai, `sign=-1`) os valores às contagens, no lugar.
+
+        Só as células tocadas são lidas e gravadas, no dtype do arquivo; uma
+        contagem que ficaria negativa ou acima do limite levanta erro.
+        """
+        v = np.atleast_2d(np.asarray(values, dtype=np.float64))
+        rows = np.broadcast_to(self._row_index(ids)[:, None], v.shape)
+        cols = np.broadcast_to(self._doy_bin(dates)[None, :], v.shape)
+        ok = np.isfinite(v)
+        # Só valores finitos viram bin (NaN -> int64 dá lixo e RuntimeWarning)
+        bins = np.clip(
+            ((v[ok] - self.ndvi_min) / self.ndvi_step).astype(np.int64),
+            0,
+            self.n_bins - 1,
+        )
+        cells, n = np.unique(
+            np.ravel_multi_index((rows[ok], cols[ok], bins), counts.shape),
+            return_counts=True,
+        )
+        flat = counts.reshape(-1)
+        new = flat[cells].astype(np.int64) + sign * n
+        if (new < 0).any():
+            raise ValueError(
+                "Contagens da safra não batem com o índice; recrie o índice."
+            )
+        if (new > np.iinfo(COUNTS_DTYPE).max).any():
+            raise ValueError("Contagem acima do limite do índice (uint32).")
+        flat[cells] = new
+
+    def add_season(
+        self,
+        season: str,
+        field_ids: Sequence,
+        dates: Sequence,
+        values: np.ndarray,
+        replace: bool = False,
+    ) -> None:
+        """Soma uma safra (matriz talhões x datas) ao índice e grava em disco.
+
+        Talhões novos ganham linhas novas. Uma safra já indexada só é aceita
+        com `replace=True`, que troca as contagens dela pelas novas. As
+        contagens são copiadas em blocos de talhões para um .npy temporário
+        (memmap, uint32) e atualizadas no lugar; nada do tamanho do índice
+        inteiro vai para a memória.
+
+        A atualização inteira roda sob um lock de arquivo (`root/.lock`,
+        threads e processos) e parte do estado atual em disco, então lotes
+        concorrentes não perdem as safras uns dos outros.
+        """
+        with file_lock(self.root / LOCK_FILE):
+            self._reload()
+            self._add_season(season, field_ids, dates, values, replace)
+
+    def _add_season(
+        self,
+        season: str,
+        field_ids: Sequence,
+        dates: Sequence,
+        values: np.ndarray,
+        replace: bool,
+    ) -> None:
+        if season in self.seasons and not replace:
+            raise ValueError(
+                f"Safra '{season}' já está no índice (use replace=True para atualizar)."
+            )
+        ids = [str(f) for f in field_ids]
+        known = set(self.field_ids)
+        new_ids = [f for f in dict.fromkeys(ids) if f not in known]
+
+        old = self._counts_or_empty()
+        path = self._season_path(season)
+        if season in self.seasons:
+            if not path.exists():
+                raise ValueError(
+                    f"Safra '{season}' sem os valores originais ({path.name}); "
+                    "recrie o índice para substituí-la."
+                )
+            if old.dtype == np.uint16 and (old == np.iinfo(np.uint16).max).any():
+                raise ValueError(
+                    "Índice uint16 com contagens saturadas: não dá para subtrair "
+                    f"a safra '{season}' com exatidão; recrie o índice."
+                )
+
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp = _tmp(self.root / COUNTS_FILE)
+        field_ids_before = self.field_ids
+        try:
+            counts = np.lib.format.open_memmap(
+                tmp,
+                mode="w+",
+                dtype=COUNTS_DTYPE,
+                shape=(old.shape[0] + len(new_ids), self.n_doy, self.n_bins),
+            )
+            for a in range(0, old.shape[0], ROW_CHUNK):
+                b = min(a + ROW_CHUNK, old.shape[0])
+                counts[a:b] = old[a:b]
+            self.field_ids = self.field_ids + new_ids
+            if season in self.seasons:
+                with np.load(path, allow_pickle=False) as prev:
+                    self._accumulate(
+                        counts,
+                        list(prev["field_ids"]),
+                        pd.DatetimeIndex(prev["dates"]),
+                        prev["values"],
+                        sign=-1,
+                    )
+            self._accumulate(counts, ids, dates, values)
+            counts.flush()
+            del counts
+        except BaseException:
+            self.field_ids = field_ids_before
+            tmp.unlink(missing_ok=True)
+            raise
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        season_tmp = _tmp(path)
+        with open(season_tmp, "wb") as fh:
+            np.savez(
+                fh,
+                field_ids=np.asarray(ids, dtype=str),
+                dates=pd.DatetimeIndex(dates).strftime("%Y-%m-%d").to_numpy(dtype=str),
+                values=np.atleast_2d(np.asarray(values, dtype=np.float32)),
+            )
+        season_tmp.replace(path)
+
+        if season not in self.seasons:
+            self.seasons = self.seasons + [season]
+        self._save(tmp)
+
+    def _save(self, counts_tmp: Path) -> None:
+        """Publica o .npy temporário das contagens e o meta.json (com o lock)."""
+        counts_tmp.replace(self.root / COUNTS_FILE)
+        meta = {
+            "doy_step": self.doy_step,
+            "ndvi_min": self.ndvi_min,
+            "ndvi_max": self.ndvi_max,
+            "ndvi_step": self.ndvi_step,
+            "field_ids": self.field_ids,
+            "seasons": self.seasons,
+        }
+        meta_tmp = _tmp(self.root / META_FILE)
+        meta_tmp.write_text(json.dumps(meta), encoding="utf-8")
+        meta_tmp.replace(self.root / META_FILE)
+        self._counts = np.load(self.root / COUNTS_FILE, mmap_mode="r")
+
+    def _histograms(self, field_ids: Sequence, dates: Sequence) -> np.ndarray:
+        """Histogramas (F, D, bins) — lê só as linhas dos talhões pedidos."""
+        rows = self._row_index(field_ids)
+        cols = self._doy_bin(dates)
+        counts = self._counts_or_empty()
+        return np.asarray(counts[rows][:, cols], dtype=np.float64)
+
+    def percentiles(
+        self,
+        field_ids: Sequence,
+        dates: Sequence,
+        q: Sequence[float] = (10, 50, 90),
+    ) -> np.ndarray:
+        """Percentis climatológicos (F, D, len(q)); NaN onde não há histórico."""
+        hist = self._histograms(field_ids, dates)
+        cum = np.cumsum(hist, axis=-1)
+        total = cum[..., -1:]
+        edges = self.ndvi_min + self.ndvi_step * np.arange(self.n_bins + 1)
+        out = np.empty(hist.shape[:2] + (len(q),))
+        for k, qq in enumerate(q):
+            target = total * (qq / 100.0)
+            b = np.minimum((cum < target).sum(axis=-1), self.n_bins - 1)
+            prev = np.take_along_axis(cum, np.maximum(b - 1, 0)[..., None], -1)[..., 0]
+            prev = np.where(b > 0, prev, 0.0)
+            inbin = np.take_along_axis(hist, b[..., None], -1)[..., 0]
+            with np.errstate(invalid="ignore", divide="ignore"):
+                frac = np.clip((target[..., 0] - prev) / inbin, 0.0, 1.0)
+            out[..., k] = edges[b] + np.nan_to_num(frac) * self.ndvi_step
+        out[total[..., 0] == 0] = np.nan
+        return out
+
+    def rank(
+        self, field_ids: Sequence, dates: Sequence, values: np.ndarray
+    ) -> np.ndarray:
+        """Posição percentual (0–100) dos valores atuais (F, D) na climatologia."""
+        hist = self._histograms(field_ids, dates)
+        v = np.atleast_2d(np.asarray(values, dtype=np.float64))
+        bins = np.clip(
+            ((np.nan_to_num(v) - self.ndvi_min) / self.ndvi_step).astype(np.int64),
+            0,
+            self.n_bins - 1,
+        )
+        cum = np.cumsum(hist, axis=-1)
+        total = cum[..., -1]
+        below = np.take_along_axis(cum, bins[..., None], -1)[..., 0]
+        half = np.take_along_axis(hist, bins[..., None], -1)[..., 0] / 2
+        with np.errstate(invalid="ignore", divide="ignore"):
+            r = 100.0 * (below - half) / total
+        return np.where(np.isfinite(v) & (total > 0), r, np.nan)
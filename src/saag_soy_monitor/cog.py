@@ -0,0 +1,318 @@
+"""Leitura de COGs por HTTP range com cache local de blocos.
+
+As URLs assinadas do Planetary Computer mudam a cada assinatura (token SAS na
+query string), então o cache usa a URL sem token. Os pedidos são alinhados a
+blocos fixos; blocos ausentes e adjacentes são agrupados num único GET com
+Range, e os GETs rodam num pool limitado de threads. Funciona contra qualquer
+servidor com suporte a Range (inclusive `python -m http.server` local).
+
+Para o rasterio, use `open_cog`: o arquivo é servido ao GDAL por um `opener=`
+(VSI em Python), então só as faixas que o GDAL pede (cabeçalho, IFDs e os
+tiles da janela) passam pelo cache. Passar o objeto de arquivo direto a
+`rasterio.open(f)` faz o rasterio copiar o arquivo inteiro para um
+`MemoryFile`.
+
+O cache em disco tem teto (SAAG_COG_CACHE_MB, padrão 2048): ao passar dele,
+os blocos usados há mais tempo (mtime, renovado a cada leitura) são apagados
+até sobrar `EVICT_TO` do teto.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import io
+import os
+import re
+import threading
+import urllib.request
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import urlsplit, urlunsplit
+
+DEFAULT_BLOCK = 256 * 1024
+DEFAULT_DISK_MB = 2048
+EVICT_TO = 0.8  # fração do teto que sobra após a limpeza
+_CONTENT_RANGE = re.compile(r"bytes (\d+)-(\d+)/(\d+|\*)")
+
+
+def strip_token(href: str) -> str:
+    """URL sem query string/fragmento (remove o token SAS)."""
+    p = urlsplit(href)
+    return urlunsplit((p.scheme, p.netloc, p.path, "", ""))
+
+
+class BlockCache:
+    """Cache de blocos em disco + LRU em memória, chave (href sem token, faixa)."""
+
+    def __init__(
+        self,
+        root: Path | None = None,
+        memory_bytes: int = 64 * 2**20,
+        disk_bytes: int | None = None,
+    ):
+        root = root or Path(
+            os.getenv("SAAG_COG_CACHE", Path("outputs") / "cache" / "cog")
+        )
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes or int(
+            float(os.getenv("SAAG_COG_CACHE_MB", DEFAULT_DISK_MB)) * 2**20
+        )
+        self._mem: OrderedDict[str, bytes] = OrderedDict()
+        self._mem_size = 0
+        self._disk_size: int | None = None  # medido na primeira gravação
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(href: str, start: int, end: int) -> str:
+        raw = f"{strip_token(href)}|{start}-{end}"
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / key
+
+    def _blocks(self) -> list[tuple[float, int, Path]]:
+        out = []
+        for p in self.root.glob("??/*"):
+            if p.name.startswith("."):  # .part de gravações em andamento
+                continue
+            try:
+                st = p.stat()
+            except FileNotFoundError:  # apagado por outro processo
+                continue
+            out.append((st.st_mtime, st.st_size, p))
+        return out
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            data = self._mem.get(key)
+            if data is not None:
+                self._mem.move_to_end(key)
+                return data
+        p = self._path(key)
+        try:
+            data = p.read_bytes()
+            os.utime(p)  # recência para a limpeza LRU do disco
+        except FileNotFoundError:
+            return None
+        self._remember(key, data)
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        p = self._path(key)
+        p.parent.mkdir(parents=True, exist_ok=True)
+        tmp = p.with_name(f".{key}.{uuid.uuid4().hex}.part")
+        tmp.write_bytes(data)
+        tmp.replace(p)
+        self._remember(key, data)
+        with self._lock:
+            if self._disk_size is None:
+                self._disk_size = sum(n for _, n, _ in self._blocks())
+            else:
+                self._disk_size += len(data)
+            if self._disk_size > self.disk_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        """Apaga os blocos menos usados até `EVICT_TO` do teto (com o lock)."""
+        blocks = sorted(self._blocks())
+        total = sum(n for _, n, _ in blocks)
+        target = self.disk_bytes * EVICT_TO
+        for _, n, p in blocks:
+            if total <= target:
+                break
+            try:
+                p.unlink()
+            except FileNotFoundError:
+                pass
+            total -= n
+        self._disk_size = total
+
+    def _remember(self, key: str, data: bytes) -> None:
+        with self._lock:
+            if key in self._mem:
+                return
+            self._mem[key] = data
+            self._mem_size += len(data)
+            while self._mem_size > self.memory_bytes and self._mem:
+                _, old = self._mem.popitem(last=False)
+                self._mem_size -= len(old)
+
+
+class RangeReader:
+    """Lê faixas de bytes de URLs HTTP(S) usando o `BlockCache`.
+
+    - faixas são alinhadas a `block_size`;
+    - blocos ausentes consecutivos viram um único GET (coalescência);
+    - no máximo `max_workers` GETs simultâneos.
+    """
+
+    def __init__(
+        self,
+        cache: BlockCache | None = None,
+        block_size: int = DEFAULT_BLOCK,
+        max_workers: int = 8,
+        timeout: float = 30.0,
+    ):
+        self.cache = cache or BlockCache()
+        self.block_size = block_size
+        self.timeout = timeout
+        self._pool = ThreadPoolExecutor(max_workers=max_workers)
+        self._sizes: dict[str, int] = {}
+
+    def size(self, href: str) -> int:
+        """Tamanho do arquivo (via Content-Range de um GET de 1 byte)."""
+        key = strip_token(href)
+        if key not in self._sizes:
+            self._fetch(href, 0, 0)
+        return self._sizes[key]
+
+    def _fetch(self, href: str, start: int, end: int) -> bytes:
+        req = urllib.request.Request(href, headers={"Range": f"bytes={start}-{end}"})
+        with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+            body = resp.read()
+            m = _CONTENT_RANGE.match(resp.headers.get("Content-Range", ""))
+            if resp.status == 206 and m:
+                if m.group(3) != "*":
+                    self._sizes[strip_token(href)] = int(m.group(3))
+                return body
+        # Servidor ignorou o Range (200): recorta localmente
+        self._sizes[strip_token(href)] = len(body)
+        return body[start : end + 1]
+
+    def _fetch_run(self, href: str, first: int, last: int) -> None:
+        """Busca os blocos [first, last] num único GET e grava cada um no cache."""
+        bs = self.block_size
+        data = self._fetch(href, first * bs, (last + 1) * bs - 1)
+        for b in range(first, last + 1):
+            chunk = data[(b - first) * bs : (b - first + 1) * bs]
+            self.cache.put(self.cache.key(href, b * bs, (b + 1) * bs - 1), chunk)
+
+    def read_many(self, href: str, ranges: list[tuple[int, int]]) -> list[bytes]:
+        """Lê várias faixas (início, tamanho) do mesmo arquivo."""
+        bs = self.block_size
+        needed = sorted(
+            {
+                b
+                for s, n in ranges
+                if n > 0
+                for b in range(s // bs, (s + n - 1) // bs + 1)
+            }
+        )
+        blocks: dict[int, bytes] = {}
+        missing = []
+        for b in needed:
+            data = self.cache.get(self.cache.key(href, b * bs, (b + 1) * bs - 1))
+            if data is None:
+                missing.append(b)
+            else:
+                blocks[b] = data
+
+        runs: list[tuple[int, int]] = []
+        for b in missing:
+            if runs and runs[-1][1] == b - 1:
+                runs[-1] = (runs[-1][0], b)
+            else:
+                runs.append((b, b))
+        for fut in [self._pool.submit(self._fetch_run, href, a, z) for a, z in runs]:
+            fut.result()
+        for b in missing:
+            blocks[b] = (
+                self.cache.get(self.cache.key(href, b * bs, (b + 1) * bs - 1)) or b""
+            )
+
+        out = []
+        for s, n in ranges:
+            first, last = s // bs, (s + n - 1) // bs
+            buf = b"".join(blocks[b] for b in range(first, last + 1)) if n > 0 else b""
+            off = s - first * bs
+            out.append(buf[off : off + n])
+        return out
+
+    def read(self, href: str, start: int, length: int) -> bytes:
+        return self.read_many(href, [(start, length)])[0]
+
+
+class CachedHttpFile(io.RawIOBase):
+    """Arquivo somente leitura sobre `RangeReader` (servido ao GDAL por `open_cog`)."""
+
+    def __init__(self, href: str, reader: RangeReader | None = None):
+        self.href = href
+        self.reader = reader or RangeReader()
+        self._size = self.reader.size(href)
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._pos, io.SEEK_END: self._size}[whence]
+        self._pos = max(0, base + offset)
+        return self._pos
+
+    def readinto(self, b) -> int:
+        n = max(0, min(len(b), self._size - self._pos))
+        if n == 0:
+            return 0
+        data = self.reader.read(self.href, self._pos, n)
+        b[: len(data)] = data
+        self._pos += len(data)
+        return len(data)
+
+
+def _opener(href: str, reader: RangeReader):
+    """`FileContainer` do rasterio que só conhece `href` (sem arquivos irmãos).
+
+    O GDAL sonda .aux.xml/.msk/.ovr ao abrir; qualquer outro caminho é
+    "inexistente", senão cada sonda baixaria o COG de novo.
+    """
+    from rasterio.abc import FileContainer
+
+    class _HttpOpener(FileContainer):
+        def open(self, path, mode="rb", **kwds):
+            if path != href or "w" in mode:
+                raise FileNotFoundError(path)
+            return CachedHttpFile(href, reader)
+
+        def size(self, path):
+            if path != href:
+                raise FileNotFoundError(path)
+            return reader.size(href)
+
+        def isfile(self, path):
+            return path == href
+
+        def isdir(self, path):
+            return False
+
+        def ls(self, path):
+            return []
+
+        def mtime(self, path):
+            return 0
+
+        def rm(self, path):
+            raise PermissionError(path)
+
+    return _HttpOpener()
+
+
+def open_cog(href: str, reader: RangeReader | None = None):
+    """`rasterio.open` de um COG por HTTP(S) com leituras em faixa pelo cache.
+
+    Só cabeçalho e tiles das janelas lidas são buscados (e guardados no
+    `BlockCache`); o dataset pode ser reaproveitado para várias janelas.
+    """
+    import rasterio
+
+    reader = reader or RangeReader()
+    return rasterio.open(href, opener=_opener(href, reader))
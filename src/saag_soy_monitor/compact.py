@@ -0,0 +1,96 @@
+"""Representação compacta (int16 escalado / float16) para cubos de índice.
+
+Promover tudo a float32 dobra a memória em relação às reflectâncias uint16,
+e o NDVI só precisa de ~3 dígitos significativos. No modo compacto
+(SAAG_COMPACT_MODE):
+
+- as bandas continuam uint16; o NDVI é calculado bloco a bloco num único
+  kernel (float32 só dentro do bloco) e já sai compacto;
+- "int16": NDVI x 10000 em int16, nodata = -32768 (erro máx. 5e-5);
+- "float16": NaN como nodata (erro relativo máx. ~4.9e-4);
+- `decode` devolve float32 com NaN de forma preguiçosa, então medianas e
+  médias acumulam em float32 enquanto o cubo guardado segue compacto.
+
+Como o NDVI é uma razão, a escala das reflectâncias (0–1 ou 0–10000) não
+importa e a verificação de escala das páginas é dispensada.
+"""
+
+from __future__ import annotations
+
+import os
+
+import numpy as np
+
+MODES = ("off", "int16", "float16")
+NDVI_SCALE = 10000.0
+NODATA_I16 = np.iinfo(np.int16).min
+
+
+def compact_mode() -> str:
+    mode = os.getenv("SAAG_COMPACT_MODE", "off").strip().lower()
+    if mode not in MODES:
+        raise ValueError(f"SAAG_COMPACT_MODE deve ser um de {MODES}.")
+    return mode
+
+
+def _ndvi_kernel(red: np.ndarray, nir: np.ndarray, mode: str) -> np.ndarray:
+    r = red.astype(np.float32)
+    n = nir.astype(np.float32)
+    valid = (red > 0) & (nir > 0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        v = (n - r) / (n + r)
+    if mode == "int16":
+        v = np.where(valid, np.clip(v, -1.0, 1.0), 0.0)
+        out = np.rint(v * NDVI_SCALE).astype(np.int16)
+        out[~valid] = NODATA_I16
+        return out
+    out = v.astype(np.float16)
+    out[~valid] = np.nan
+    return out
+
+
+def ndvi_compact(red, nir, mode: str = "int16"):
+    """NDVI compacto a partir das bandas (DataArray ou ndarray, uint16)."""
+    if mode not in ("int16", "float16"):
+        raise ValueError("mode deve ser 'int16' ou 'float16'.")
+    dtype = np.int16 if mode == "int16" else np.float16
+    if not hasattr(red, "dims"):
+        return _ndvi_kernel(np.asarray(red), np.asarray(nir), mode)
+    import xarray as xr
+
+    out = xr.apply_ufunc(
+        _ndvi_kernel,
+        red,
+        nir,
+        kwargs={"mode": mode},
+        dask="parallelized",
+        output_dtypes=[dtype],
+    )
+    out.attrs["compact"] = mode
+    return out.rename("ndvi")
+
+
+def _decode_block(block: np.ndarray) -> np.ndarray:
+    if block.dtype == np.int16:
+        out = block.astype(np.float32) / np.float32(NDVI_SCALE)
+        out[block == NODATA_I16] = np.nan
+        return out
+    return block.astype(np.float32)
+
+
+def decode(arr):
+    """float32 com NaN (preguiçoso para DataArray/dask); float32 passa direto."""
+    dtype = np.dtype(arr.dtype)
+    if dtype not in (np.int16, np.float16):
+        return arr
+    if not hasattr(arr, "dims"):
+        if hasattr(arr, "map_blocks"):
+            return arr.map_blocks(_decode_block, dtype=np.float32)
+        return _decode_block(np.asarray(arr))
+    import xarray as xr
+
+    out = xr.apply_ufunc(
+        _decode_block, arr, dask="parallelized", output_dtypes=[np.float32]
+    )
+    out.attrs = {k: v for k, v in arr.attrs.items() if k != "compact"}
+    return out
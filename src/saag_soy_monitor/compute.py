@@ -0,0 +1,127 @@
+"""Contexto gerenciado para as reduções dask (NDVI) dentro do Streamlit.
+
+O scheduler é escolhido por SAAG_DASK_SCHEDULER:
+
+- "threads" (padrão) ou "processes": schedulers locais do dask, com no
+  máximo SAAG_DASK_CONCURRENCY reduções simultâneas no processo;
+- "distributed": um LocalCluster compartilhado por todas as sessões, com
+  SAAG_DASK_WORKERS workers, SAAG_DASK_THREADS threads cada e limite de
+  memória SAAG_DASK_MEMORY_LIMIT por worker. Grafos menores recebem
+  prioridade maior (uma AOI pesada não trava as leves) e cada sessão pode
+  cancelar o que deixou rodando ao sair da página ou reexecutar o script.
+"""
+
+from __future__ import annotations
+
+import math
+import os
+import threading
+from collections import defaultdict
+
+DEFAULT_SCHEDULER = "threads"
+
+_lock = threading.Lock()
+_client = None
+_slots: threading.BoundedSemaphore | None = None
+_session_futures: dict[str, list] = defaultdict(list)
+
+
+def scheduler() -> str:
+    name = os.getenv("SAAG_DASK_SCHEDULER", DEFAULT_SCHEDULER).strip().lower()
+    if name not in ("threads", "processes", "distributed"):
+        raise ValueError(
+            "SAAG_DASK_SCHEDULER deve ser 'threads', 'processes' ou 'distributed'."
+        )
+    return name
+
+
+def get_client():
+    """Cliente do LocalCluster compartilhado (criado na primeira chamada)."""
+    global _client
+    with _lock:
+        if _client is None:
+            from dask.distributed import Client, LocalCluster
+
+            cluster = LocalCluster(
+                n_workers=int(os.getenv("SAAG_DASK_WORKERS", 2)),
+                threads_per_worker=int(os.getenv("SAAG_DASK_THREADS", 2)),
+                memory_limit=os.getenv("SAAG_DASK_MEMORY_LIMIT", "2GB"),
+                processes=True,
+                dashboard_address=None,
+            )
+            _client = Client(cluster, set_as_default=False)
+        return _client
+
+
+def _local_slots() -> threading.BoundedSemaphore:
+    global _slots
+    with _lock:
+        if _slots is None:
+            _slots = threading.BoundedSemaphore(
+                int(os.getenv("SAAG_DASK_CONCURRENCY", 2))
+            )
+        return _slots
+
+
+def _n_tasks(objs) -> int:
+    return sum(len(o.__dask_graph__()) for o in objs if hasattr(o, "__dask_graph__"))
+
+
+def auto_priority(objs) -> int:
+    """Prioridade pelo tamanho do grafo: 10 tarefas -> -1, 10 mil -> -4."""
+    return -int(math.log10(max(_n_tasks(objs), 1)))
+
+
+def streamlit_session_id() -> str | None:
+    """ID da sessão Streamlit atual (None fora do Streamlit)."""
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+        ctx = get_script_run_ctx()
+    except Exception:
+        return None
+    return ctx.session_id if ctx is not None else None
+
+
+def cancel_session(session: str) -> None:
+    """Cancela as tarefas da sessão ainda em execução no cluster."""
+    with _lock:
+        futures = _session_futures.pop(session, [])
+    if futures and _client is not None:
+        _client.cancel(futures)
+
+
+def compute(*objs, session: str | None = None, priority: int | None = None):
+    """Equivalente a `dask.compute(*objs)` no scheduler configurado.
+
+    Com "distributed", uma nova chamada da mesma sessão cancela a anterior
+    (o usuário mudou de página ou reexecutou); a chamada cancelada levanta
+    `CancelledError`.
+    """
+    name = scheduler()
+    if name != "distributed":
+        import dask
+
+        with _local_slots():
+            return dask.compute(*objs, scheduler=name)
+
+    client = get_client()
+    if session is not None:
+        cancel_session(session)
+    if priority is None:
+        priority = auto_priority(objs)
+    futures = client.compute(list(objs), priority=priority)
+    if session is not None:
+        with _lock:
+            _session_futures[session].extend(futures)
+    try:
+        return tuple(client.gather(futures))
+    finally:
+        if session is not None:
+            keys = {f.key for f in futures}
+            with _lock:
+                left = [
+                    f for f in _session_futures.pop(session, []) if f.key not in keys
+                ]
+                if left:
+                    _session_futures[session] = left
@@ -0,0 +1,162 @@
+"""Exportação do cubo NDVI por pixel (time, y, x) como Zarr ou COGs.
+
+A escrita é feita chunk a chunk a partir do grafo dask, sem materializar o cubo
+inteiro: Zarr com o tempo como dimensão líder dos chunks, ou um COG por data
+(tiled, comprimido e com overviews) para leitura por janela em GIS e no
+servidor de tiles. Tudo é gravado em temporários com uuid e trocado no fim,
+então dois escritores do mesmo destino não se atropelam nem deixam um
+arquivo pela metade.
+
+As gravações são montadas como `dask.delayed` e rodam por `compute.compute`,
+no mesmo scheduler (e limite de concorrência/cluster) das reduções NDVI.
+"""
+
+from __future__ import annotations
+
+import shutil
+import threading
+import uuid
+from pathlib import Path
+
+import pandas as pd
+
+
+def write_zarr(
+    cube,
+    path: Path,
+    name: str = "ndvi",
+    time_chunk: int = 1,
+    xy_chunk: int = 512,
+    session: str | None = None,
+) -> Path:
+    """Grava o DataArray (time, y, x) num store Zarr consolidado.
+
+    Chunks: (`time_chunk`, `xy_chunk`, `xy_chunk`) — séries por pixel e janelas
+    espaciais são lidas sem tocar no restante do cubo.
+    """
+    from .compute import compute
+
+    path = Path(path)
+    cube = cube.transpose("time", "y", "x").chunk(
+        {"time": time_chunk, "y": xy_chunk, "x": xy_chunk}
+    )
+    ds = cube.astype("float32").to_dataset(name=name)
+    for var in ds.variables.values():
+        var.encoding.pop("chunks", None)
+    tmp = _tmp(path)
+    try:
+        compute(
+            ds.to_zarr(tmp, mode="w", consolidated=True, compute=False),
+            session=session,
+        )
+        old = _tmp(path, ".old")
+        if path.exists():
+            path.rename(old)
+        tmp.rename(path)
+        shutil.rmtree(old, ignore_errors=True)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return path
+
+
+def write_cogs(
+    cube,
+    out_dir: Path,
+    prefix: str = "ndvi",
+    blocksize: int = 512,
+    compress: str = "DEFLATE",
+    crs: str | None = None,
+    session: str | None = None,
+) -> list[Path]:
+    """Grava um COG por data (`<prefix>_YYYY-MM-DD.tif`) em `out_dir`.
+
+    Cada fatia é escrita janela a janela (dask + lock por arquivo) num GeoTIFF
+    tiled — todas as datas num só compute — e depois convertida pelo driver
+    COG do GDAL, que gera as overviews em disco.
+    """
+    import rasterio.shutil
+    import rioxarray  # noqa: F401  (registra o acessor .rio)
+
+    from .compute import compute
+
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    if crs is None:
+        odc = getattr(cube, "odc", None)
+        crs = str(odc.crs) if odc is not None and odc.crs is not None else None
+
+    writes, pending = [], []
+    for t in cube["time"].values:
+        band = cube.sel(time=t).astype("float32")
+        if band.rio.crs is None and crs:
+            band = band.rio.write_crs(crs)
+        band = band.rio.write_nodata(float("nan"), encoded=False)
+
+        day = pd.Timestamp(t).strftime("%Y-%m-%d")
+        final = out_dir / f"{prefix}_{day}.tif"
+        tmp = _tmp(final, ".part.tif")
+        writes.append(
+            band.rio.to_raster(
+                tmp,
+                tiled=True,
+                blockxsize=blocksize,
+                blockysize=blocksize,
+                compress=compress,
+                lock=_write_lock(tmp.name),
+                windowed=True,
+                compute=False,
+            )
+        )
+        pending.append((tmp, final))
+
+    paths = []
+    try:
+        compute(*writes, session=session)
+        for tmp, final in pending:
+            cog = _tmp(final, ".cog.tif")
+            try:
+                rasterio.shutil.copy(
+                    tmp,
+                    cog,
+                    driver="COG",
+                    COMPRESS=compress,
+                    PREDICTOR="YES",
+                    BLOCKSIZE=blocksize,
+                    OVERVIEW_RESAMPLING="AVERAGE",
+                    NUM_THREADS="ALL_CPUS",
+                )
+                cog.replace(final)
+            finally:
+                cog.unlink(missing_ok=True)
+            paths.append(final)
+    finally:
+        for tmp, _ in pending:
+            tmp.unlink(missing_ok=True)
+    return paths
+
+
+def _tmp(path: Path, suffix: str = ".part") -> Path:
+    """Temporário exclusivo deste escritor (uuid), no mesmo diretório."""
+    return path.with_name(f".{path.name}.{uuid.uuid4().hex}{suffix}")
+
+
+_manager = None  # multiprocessing.Manager dos locks no scheduler "processes"
+
+
+def _write_lock(name: str):
+    """Lock da escrita por janelas de um arquivo, válido no scheduler atual."""
+    from .compute import get_client, scheduler
+
+    sched = scheduler()
+    if sched == "distributed":
+        from dask.distributed import Lock
+
+        return Lock(f"saag-write-{name}", client=get_client())
+    if sched == "processes":
+        global _manager
+        if _manager is None:
+            import multiprocessing
+
+            _manager = multiprocessing.Manager()
+        return _manager.Lock()
+    return threading.Lock()
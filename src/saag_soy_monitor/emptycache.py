@@ -0,0 +1,107 @@
+"""Cache negativo de datas sem dado (footprint da AOI, data, coleção).
+
+Uma resposta sem nenhum pixel válido (dataMask todo zero) prova que não há
+cena naquela data para aquela AOI; pedir de novo a cada execução só custa
+requisições. Essas entradas ficam em SQLite (SAAG_EMPTY_CACHE, padrão
+outputs/cache/empty.sqlite) com validade:
+
+- SAAG_EMPTY_TTL_DAYS (padrão 30) para datas antigas — reprocessamentos do
+  arquivo podem, raramente, preencher buracos;
+- `RECENT_TTL_S` (6 h) para datas dos últimos `RECENT_DAYS` dias, ainda
+  sujeitas ao atraso de ingestão.
+
+Falhas de rede / servidor não entram aqui: são retentáveis e não provam nada.
+"""
+
+from __future__ import annotations
+
+import os
+import sqlite3
+import time
+from pathlib import Path
+from typing import Sequence
+
+import pandas as pd
+
+RECENT_DAYS = 10
+RECENT_TTL_S = 6 * 3600.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS empty (
+    footprint TEXT NOT NULL,
+    date TEXT NOT NULL,
+    collection TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    PRIMARY KEY (footprint, date, collection)
+)
+"""
+
+
+def footprint_key(bbox_xyxy: Sequence[float]) -> str:
+    """BBOX arredondada (1e-6° ~ 0,1 m) como chave estável."""
+    return ",".join(f"{float(v):.6f}" for v in bbox_xyxy)
+
+
+def _cache_path() -> Path:
+    return Path(
+        os.getenv("SAAG_EMPTY_CACHE", Path("outputs") / "cache" / "empty.sqlite")
+    )
+
+
+class EmptyCache:
+    def __init__(self, path: Path | str | None = None, ttl_days: float | None = None):
+        self.path = Path(path) if path else _cache_path()
+        self.ttl_s = 86400.0 * float(
+            ttl_days if ttl_days is not None else os.getenv("SAAG_EMPTY_TTL_DAYS", "30")
+        )
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._con = sqlite3.connect(self.path, timeout=30.0)
+        self._con.execute("PRAGMA journal_mode=WAL")
+        with self._con:
+            self._con.execute(_SCHEMA)
+
+    def close(self) -> None:
+        self._con.close()
+
+    def __enter__(self) -> "EmptyCache":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def ttl_for(self, day, now: float | None = None) -> float:
+        now = time.time() if now is None else now
+        age_days = (now - pd.Timestamp(day).timestamp()) / 86400.0
+        return RECENT_TTL_S if age_days < RECENT_DAYS else self.ttl_s
+
+    def is_empty(self, bbox_xyxy: Sequence[float], day, collection: str) -> bool:
+        row = self._con.execute(
+            "SELECT expires_at FROM empty WHERE footprint = ? AND date = ? "
+            "AND collection = ?",
+            (
+                footprint_key(bbox_xyxy),
+                pd.Timestamp(day).strftime("%Y-%m-%d"),
+                collection,
+            ),
+        ).fetchone()
+        return row is not None and row[0] > time.time()
+
+    def add(self, bbox_xyxy: Sequence[float], day, collection: str) -> None:
+        now = time.time()
+        with self._con:
+            self._con.execute(
+                "INSERT OR REPLACE INTO empty VALUES (?, ?, ?, ?)",
+                (
+                    footprint_key(bbox_xyxy),
+                    pd.Timestamp(day).strftime("%Y-%m-%d"),
+                    collection,
+                    now + self.ttl_for(day, now),
+                ),
+            )
+
+    def purge(self) -> int:
+        """Remove entradas vencidas."""
+        with self._con:
+            return self._con.execute(
+                "DELETE FROM empty WHERE expires_at <= ?", (time.time(),)
+            ).rowcount
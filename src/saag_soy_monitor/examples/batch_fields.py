@@ -0,0 +1,58 @@
+"""Lote noturno: série NDVI por talhão, retomável após queda ou reinício.
+
+O progresso fica no ledger SQLite (SAAG_LEDGER); rodar de novo continua de
+onde parou e retenta só as unidades com falha. Com --season, a série entra
+na climatologia por talhão (SAAG_CLIMATOLOGY) e na fenologia
+(outputs/phenology.parquet), substituindo a mesma safra, e o calendário
+agrícola da safra é impresso no fim.
+
+    python -m saag_soy_monitor.examples.batch_fields --fields talhoes.gpkg \
+        --start 2024-09-15 --end 2025-03-15 --max-attempts 3 --season 2024/25
+"""
+
+import argparse
+from pathlib import Path
+
+from saag_soy_monitor.fields import FieldRegistry
+from saag_soy_monitor.ledger import RetryPolicy
+from saag_soy_monitor.phenology import crop_calendar, load
+from saag_soy_monitor.pipeline import run_fields_ndvi
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--fields", required=True, help="GeoJSON/GPKG/SHP (zip)")
+    parser.add_argument("--id-field", default=None)
+    parser.add_argument("--start", required=True)
+    parser.add_argument("--end", required=True)
+    parser.add_argument("--res", type=int, default=10)
+    parser.add_argument("--max-cloud", type=float, default=None)
+    parser.add_argument("--local-dir", default=None)
+    parser.add_argument("--ledger", default=None)
+    parser.add_argument("--max-attempts", type=int, default=3)
+    parser.add_argument("--season", default=None, help="p.ex. 2024/25")
+    args = parser.parse_args()
+
+    path = Path(args.fields)
+    registry = FieldRegistry.from_upload(path.name, path.read_bytes(), args.id_field)
+    out = run_fields_ndvi(
+        registry,
+        args.start,
+        args.end,
+        resolution=args.res,
+        max_cloud=args.max_cloud,
+        local_dir=args.local_dir,
+        ledger_path=args.ledger,
+        policy=RetryPolicy(max_attempts=args.max_attempts),
+        season=args.season,
+    )
+    print(f"OK -> {out}")
+    if args.season:
+        # Calendário agrícola da safra: uma leitura das métricas já gravadas
+        metrics = load(out.parent, args.season)
+        if len(metrics):
+            print(crop_calendar(metrics).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
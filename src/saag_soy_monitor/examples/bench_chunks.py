@@ -0,0 +1,67 @@
+"""Compara chunks fixos (1 x 1024 x 1024) com os de `chunks.plan_chunks`.
+
+Monta um cubo sintético uint16 (red, nir) em dask, calcula a mediana espacial
+do NDVI como nas páginas e mede nº de tarefas, tempo e pico de memória
+(tracemalloc, que acompanha as alocações do NumPy).
+
+    python -m saag_soy_monitor.examples.bench_chunks --width 300 --height 300 \
+        --times 70
+"""
+
+import argparse
+import time
+import tracemalloc
+
+import dask.array as da
+import xarray as xr
+
+from saag_soy_monitor.chunks import plan_chunks
+
+FIXED = {"time": 1, "y": 1024, "x": 1024}
+
+
+def _cube(shape, chunks) -> xr.Dataset:
+    c = (chunks["time"], chunks["y"], chunks["x"])
+    dims = ("time", "y", "x")
+    red = da.random.randint(200, 3000, size=shape, chunks=c, dtype="uint16")
+    nir = da.random.randint(2000, 6000, size=shape, chunks=c, dtype="uint16")
+    return xr.Dataset({"red": (dims, red), "nir": (dims, nir)})
+
+
+def _run(shape, chunks) -> dict:
+    ds = _cube(shape, chunks)
+    red = ds["red"].astype("float32") / 10000.0
+    nir = ds["nir"].astype("float32") / 10000.0
+    ndvi = (nir - red) / (nir + red + 1e-6)
+    result = ndvi.median(dim=("y", "x"))
+    tasks = len(result.data.__dask_graph__())
+
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    result.compute()
+    elapsed = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"chunks": chunks, "tasks": tasks, "s": elapsed, "peak_mb": peak / 2**20}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--width", type=int, default=300)
+    parser.add_argument("--height", type=int, default=300)
+    parser.add_argument("--times", type=int, default=70)
+    parser.add_argument("--budget-mb", type=int, default=None)
+    args = parser.parse_args()
+
+    shape = (args.times, args.height, args.width)
+    planned = plan_chunks(args.width, args.height, args.times, budget_mb=args.budget_mb)
+    for label, chunks in (("fixo", FIXED), ("planejado", planned)):
+        r = _run(shape, chunks)
+        print(
+            f"{label:>10}: chunks={r['chunks']} tarefas={r['tasks']} "
+            f"tempo={r['s']:.2f}s pico={r['peak_mb']:.0f} MB"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""Gera um conjunto offline de cenas Sentinel-2 sintéticas e roda o pipeline.
+
+Escreve COGs B04/B08 + `items.json` em `--out` e, em seguida, calcula a série
+NDVI pelo `LocalBackend`, medindo o tempo — útil em CI sem acesso à rede.
+
+    python -m saag_soy_monitor.examples.make_fixtures --out outputs/fixtures
+    SAAG_LOCAL_DATA=outputs/fixtures streamlit run app/Home.py
+"""
+
+import argparse
+import time
+
+from saag_soy_monitor.local import LocalBackend, make_fixtures
+from saag_soy_monitor.pipeline import RunParams, _parse_bbox
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--out", default="outputs/fixtures")
+    parser.add_argument("--bbox", default="-63.95,-8.85,-63.80,-8.75")
+    parser.add_argument("--start", default="2024-09-15")
+    parser.add_argument("--end", default="2025-03-15")
+    parser.add_argument("--res", type=int, default=10)
+    parser.add_argument("--fields", type=int, default=12)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    bbox = _parse_bbox(args.bbox)
+    t0 = time.perf_counter()
+    root = make_fixtures(
+        args.out, bbox, args.start, args.end, args.res, args.fields, args.seed
+    )
+    print(f"fixtures em {root} ({time.perf_counter() - t0:.1f}s)")
+
+    backend = LocalBackend(root)
+    params = RunParams(bbox, args.start, args.end, args.res)
+    t0 = time.perf_counter()
+    df = backend.timeseries(params)
+    print(
+        f"{len(backend.items)} itens, {len(df)} datas ({time.perf_counter() - t0:.2f}s)"
+    )
+    print(df.to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Escritores de exportação em fluxo (CSV / Parquet).
+
+As séries chegam como um iterável de DataFrames (blocos por talhão, ano ou
+faixa de linhas) e são gravadas bloco a bloco, de modo que a memória usada não
+cresce com o tamanho da exportação.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import uuid
+from pathlib import Path
+from typing import Any, Iterable, Iterator, Mapping
+
+import pandas as pd
+
+DEFAULT_CHUNKSIZE = 50_000
+
+
+def aoi_key(inputs: Mapping[str, Any]) -> str:
+    """Hash curto da AOI (BBOX, polígono, resolução e período) da sessão.
+
+    Nomeia arquivos exportados e entradas de cache, para que sessões e AOIs
+    diferentes não compartilhem nem reaproveitem resultados umas das outras.
+    """
+    parts = [
+        str(inputs.get("bbox_wgs84")),
+        int(inputs.get("resolution_m", 10)),
+        str(inputs.get("start_date")),
+        str(inputs.get("end_date")),
+        inputs.get("aoi_geojson"),
+    ]
+    raw = json.dumps(parts, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha1(raw).hexdigest()[:12]
+
+
+def iter_frames(
+    df: pd.DataFrame, chunksize: int = DEFAULT_CHUNKSIZE
+) -> Iterator[pd.DataFrame]:
+    """Fatia um DataFrame já em memória em blocos de `chunksize` linhas."""
+    for start in range(0, len(df), chunksize):
+        yield df.iloc[start : start + chunksize]
+
+
+def iter_csv_bytes(
+    frames: Iterable[pd.DataFrame], encoding: str = "utf-8"
+) -> Iterator[bytes]:
+    """Gera o CSV em blocos de bytes (cabeçalho apenas no primeiro bloco)."""
+    header = True
+    for frame in frames:
+        if frame.empty:
+            continue
+        yield frame.to_csv(index=False, header=header).encode(encoding)
+        header = False
+
+
+def _tmp_path(path: Path) -> Path:
+    """Temporário único por escritor, no mesmo diretório (replace atômico)."""
+    return path.with_name(f".{path.name}.{uuid.uuid4().hex}.part")
+
+
+def write_csv(frames: Iterable[pd.DataFrame], path: Path) -> Path:
+    """Grava o CSV bloco a bloco em `path` (via arquivo temporário)."""
+    path = Path(path)
+    tmp = _tmp_path(path)
+    try:
+        with open(tmp, "wb") as fh:
+            for chunk in iter_csv_bytes(frames):
+                fh.write(chunk)
+        tmp.replace(path)
+    finally:
+        tmp.unlink(missing_ok=True)
+    return path
+
+
+def write_parquet(frames: Iterable[pd.DataFrame], path: Path) -> Path:
+    """Grava um Parquet com um row group por bloco (pyarrow.ParquetWriter).
+
+    O esquema é fixado pelo primeiro bloco; os seguintes são convertidos a ele.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    path = Path(path)
+    tmp = _tmp_path(path)
+    writer = None
+    try:
+        try:
+            for frame in frames:
+                if frame.empty:
+                    continue
+                if writer is None:
+                    table = pa.Table.from_pandas(frame, preserve_index=False)
+                    writer = pq.ParquetWriter(tmp, table.schema, compression="zstd")
+                else:
+                    table = pa.Table.from_pandas(
+                        frame, schema=writer.schema, preserve_index=False
+                    )
+                writer.write_table(table)
+        finally:
+            if writer is not None:
+                writer.close()
+        if writer is None:
+            raise ValueError("Nenhuma linha para exportar.")
+        tmp.replace(path)
+    finally:
+        tmp.unlink(missing_ok=True)
+    return path
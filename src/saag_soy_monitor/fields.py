@@ -0,0 +1,151 @@
+"""Registro de talhões com índice espacial (shapely STRtree).
+
+As geometrias são lidas uma única vez (GeoJSON ou GPKG) e indexadas; consultas
+do tipo "quais talhões cruzam esta AOI / este tile Sentinel-2" viram uma busca
+na árvore, sem varrer todos os polígonos.
+"""
+
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import Any, Mapping, Sequence
+
+import numpy as np
+import pandas as pd
+import shapely
+from shapely.geometry import box, shape
+
+_ID_CANDIDATES = ("field_id", "id", "talhao", "talhão", "name", "nome")
+
+
+class FieldRegistry:
+    def __init__(
+        self,
+        field_ids: Sequence[Any],
+        geometries: Sequence[Any],
+        attrs: pd.DataFrame | None = None,
+        crs: str = "EPSG:4326",
+    ):
+        if len(field_ids) != len(geometries):
+            raise ValueError("field_ids e geometries devem ter o mesmo tamanho.")
+        self.field_ids = np.asarray([str(f) for f in field_ids], dtype=object)
+        if len(set(self.field_ids)) != len(self.field_ids):
+            raise ValueError("IDs de talhão repetidos.")
+        self.geometries = np.asarray(geometries, dtype=object)
+        self.attrs = (
+            attrs if attrs is not None else pd.DataFrame(index=range(len(self)))
+        )
+        self.crs = crs
+        self.tree = shapely.STRtree(self.geometries)
+        self._pos = {f: i for i, f in enumerate(self.field_ids)}
+
+    def __len__(self) -> int:
+        return len(self.field_ids)
+
+    @property
+    def bounds(self) -> tuple[float, float, float, float]:
+        b = shapely.total_bounds(self.geometries)
+        return float(b[0]), float(b[1]), float(b[2]), float(b[3])
+
+    def geometry(self, field_id: Any):
+        return self.geometries[self._pos[str(field_id)]]
+
+    # ------------------------------------------------------------------
+    # Leitura
+
+    @classmethod
+    def from_geojson(cls, data: Mapping | str | bytes, id_field: str | None = None):
+        """FeatureCollection (dict ou texto) em EPSG:4326."""
+        if isinstance(data, (str, bytes)):
+            data = json.loads(data)
+        feats = (
+            data.get("features", [])
+            if data.get("type") == "FeatureCollection"
+            else [data]
+        )
+        geoms, props = [], []
+        for f in feats:
+            if not f.get("geometry"):
+                continue
+            geoms.append(shape(f["geometry"]))
+            props.append(f.get("properties") or {})
+        attrs = pd.DataFrame(props)
+        return cls(_pick_ids(attrs, id_field), geoms, attrs)
+
+    @classmethod
+    def from_file(cls, path: Path | str, id_field: str | None = None):
+        """GeoJSON (json puro) ou qualquer formato OGR (GPKG, SHP) via pyogrio.
+
+        Usa a API `pyogrio.raw` (WKB + colunas numpy), que não depende do
+        geopandas; outro CRS é reprojetado para EPSG:4326 com pyproj.
+        """
+        path = Path(path)
+        if path.suffix.lower() in (".geojson", ".json"):
+            return cls.from_geojson(path.read_bytes(), id_field)
+        from pyogrio.raw import read
+
+        meta, _, wkb, columns = read(path)
+        attrs = pd.DataFrame(dict(zip(meta["fields"], columns)))
+        geoms = shapely.from_wkb(wkb)
+        keep = ~shapely.is_missing(geoms)
+        geoms, attrs = geoms[keep], attrs[keep].reset_index(drop=True)
+        crs = meta.get("crs")
+        if crs and crs.upper() not in ("EPSG:4326", "OGC:CRS84"):
+            from pyproj import Transformer
+
+            tr = Transformer.from_crs(crs, 4326, always_xy=True)
+            geoms = shapely.transform(
+                geoms, lambda xy: np.column_stack(tr.transform(xy[:, 0], xy[:, 1]))
+            )
+        return cls(_pick_ids(attrs, id_field), geoms, attrs)
+
+    @classmethod
+    def from_upload(cls, name: str, payload: bytes, id_field: str | None = None):
+        """Arquivo enviado pelo st.file_uploader (nome + bytes)."""
+        suffix = Path(name).suffix.lower()
+        if suffix in (".geojson", ".json"):
+            return cls.from_geojson(payload, id_field)
+        import tempfile
+
+        with tempfile.TemporaryDirectory() as tmp:
+            p = Path(tmp) / f"upload{suffix}"
+            p.write_bytes(payload)
+            return cls.from_file(p, id_field)
+
+    # ------------------------------------------------------------------
+    # Consultas
+
+    def query(self, geom, predicate: str = "intersects") -> np.ndarray:
+        """IDs dos talhões que satisfazem `predicate` com a geometria dada."""
+        return self.field_ids[self.tree.query(geom, predicate=predicate)]
+
+    def query_bbox(self, minx: float, miny: float, maxx: float, maxy: float):
+        return self.query(box(minx, miny, maxx, maxy))
+
+    def group_by(self, footprints: Mapping[str, Any]) -> dict[str, np.ndarray]:
+        """Agrupa talhões por pegada (p.ex. tiles MGRS) numa consulta em lote."""
+        keys = list(footprints)
+        geoms = np.asarray([footprints[k] for k in keys], dtype=object)
+        src, dst = self.tree.query(geoms, predicate="intersects")
+        out: dict[str, np.ndarray] = {}
+        for i, key in enumerate(keys):
+            out[key] = self.field_ids[dst[src == i]]
+        return out
+
+    def to_frame(self) -> pd.DataFrame:
+        df = self.attrs.copy()
+        df.insert(0, "field_id", self.field_ids)
+        df["geometry"] = self.geometries
+        return df
+
+
+def _pick_ids(attrs: pd.DataFrame, id_field: str | None) -> list[str]:
+    """Usa a coluna de id informada/reconhecida ou numera os talhões."""
+    cols = {c.lower(): c for c in attrs.columns}
+    col = id_field or next((cols[c] for c in _ID_CANDIDATES if c in cols), None)
+    if col is not None and col in attrs and attrs[col].notna().all():
+        ids = attrs[col].astype(str)
+        if ids.is_unique:
+            return ids.tolist()
+    return [f"T{i + 1:05d}" for i in range(len(attrs))]
@@ -0,0 +1,199 @@
+"""Pré-processamento de geometrias de talhões (validação, UTM, simplificação).
+
+Arquivos enviados costumam vir de trilhas GPS com milhares de vértices e anéis
+inválidos. Antes de indexar os talhões:
+
+1. `make_valid` conserta anéis inválidos (só partes poligonais são mantidas)
+   e geometrias vazias são descartadas;
+2. cada talhão é projetado na zona UTM do seu centroide;
+3. a simplificação usa tolerância em metros ligada ao pixel
+   (`tolerance_px` x resolução), preservando a topologia;
+4. o resultado volta a EPSG:4326 para o `FieldRegistry`.
+
+O resultado fica em cache por hash do arquivo + parâmetros (SAAG_FIELDS_CACHE,
+padrão outputs/cache/fields), então reenviar o mesmo arquivo não refaz nada.
+O cache tem teto (SAAG_FIELDS_CACHE_MB, padrão 512): ao gravar uma entrada,
+as usadas há mais tempo (mtime, renovado a cada acerto) são apagadas.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import pickle
+import time
+import uuid
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import numpy as np
+import shapely
+
+from .fields import FieldRegistry
+
+CACHE_VERSION = 1
+DEFAULT_CACHE_MB = 512
+STALE_PART_S = 3600.0  # .part de gravações que morreram
+
+
+@dataclass
+class PreparedFields:
+    registry: FieldRegistry
+    utm_epsg: np.ndarray  # EPSG UTM de cada talhão
+    geometries_utm: np.ndarray
+    report: dict = field(default_factory=dict)
+
+
+def utm_epsg(lon, lat) -> np.ndarray:
+    """EPSG UTM (WGS84) para cada ponto: 326xx no norte, 327xx no sul."""
+    lon, lat = np.asarray(lon, dtype=float), np.asarray(lat, dtype=float)
+    zone = np.clip(np.floor((lon + 180.0) / 6.0).astype(int) + 1, 1, 60)
+    return np.where(lat >= 0, 32600, 32700) + zone
+
+
+def _polygonal(geom):
+    """Mantém só polígonos (make_valid pode gerar linhas/pontos soltos)."""
+    if geom is None or geom.is_empty:
+        return None
+    if geom.geom_type in ("Polygon", "MultiPolygon"):
+        return geom
+    parts = [
+        g for g in shapely.get_parts(geom) if g.geom_type in ("Polygon", "MultiPolygon")
+    ]
+    return shapely.union_all(parts) if parts else None
+
+
+def _reproject(geoms: np.ndarray, src, dst) -> np.ndarray:
+    from pyproj import Transformer
+
+    tr = Transformer.from_crs(src, dst, always_xy=True)
+    return shapely.transform(
+        geoms, lambda xy: np.column_stack(tr.transform(xy[:, 0], xy[:, 1]))
+    )
+
+
+def prepare(
+    registry: FieldRegistry, resolution_m: float = 10, tolerance_px: float = 0.5
+) -> PreparedFields:
+    geoms = registry.geometries
+    vertices_before = int(shapely.get_num_coordinates(geoms).sum())
+    invalid = ~shapely.is_valid(geoms)
+    fixed = np.asarray([_polygonal(g) for g in shapely.make_valid(geoms)], dtype=object)
+    keep = np.asarray([g is not None for g in fixed])
+    ids, fixed = registry.field_ids[keep], fixed[keep]
+    attrs = registry.attrs.loc[keep].reset_index(drop=True)
+
+    centroids = shapely.centroid(fixed)
+    epsg = utm_epsg(shapely.get_x(centroids), shapely.get_y(centroids))
+    tol = tolerance_px * resolution_m
+    utm = np.empty(len(fixed), dtype=object)
+    wgs = np.empty(len(fixed), dtype=object)
+    for code in np.unique(epsg):
+        sel = epsg == code
+        projected = _reproject(fixed[sel], 4326, int(code))
+        simple = shapely.make_valid(
+            shapely.simplify(projected, tol, preserve_topology=True)
+        )
+        # O segundo make_valid também pode soltar linhas/pontos; se a
+        # simplificação colapsou o talhão, fica a geometria sem simplificar
+        simple = np.asarray(
+            [_polygonal(g) or p for g, p in zip(simple, projected)], dtype=object
+        )
+        utm[sel] = simple
+        wgs[sel] = _reproject(simple, int(code), 4326)
+
+    attrs = attrs.assign(utm_epsg=epsg)
+    report = {
+        "n_input": int(len(geoms)),
+        "n_repaired": int(invalid.sum()),
+        "n_dropped": int((~keep).sum()),
+        "vertices_before": vertices_before,
+        "vertices_after": int(shapely.get_num_coordinates(wgs).sum())
+        if len(wgs)
+        else 0,
+        "tolerance_m": tol,
+        "utm_zones": sorted(int(c) for c in np.unique(epsg)),
+    }
+    return PreparedFields(FieldRegistry(ids, wgs, attrs), epsg, utm, report)
+
+
+def _cache_dir() -> Path:
+    return Path(os.getenv("SAAG_FIELDS_CACHE", Path("outputs") / "cache" / "fields"))
+
+
+def evict(
+    root: Path | None = None, max_mb: float | None = None, keep: tuple[str, ...] = ()
+) -> list[str]:
+    """Remove entradas menos usadas (mtime) até o cache caber no teto.
+
+    Também apaga `.part` antigos de gravações interrompidas. Devolve os nomes
+    removidos.
+    """
+    root = root or _cache_dir()
+    mb = max_mb or float(os.getenv("SAAG_FIELDS_CACHE_MB", DEFAULT_CACHE_MB))
+    limit = mb * 2**20
+    now = time.time()
+    for part in root.glob(".*.part"):
+        try:
+            if now - part.stat().st_mtime > STALE_PART_S:
+                part.unlink()
+        except OSError:
+            pass
+
+    entries = []
+    for p in root.glob("*.pkl"):
+        try:
+            st = p.stat()
+        except FileNotFoundError:  # apagado por outro processo
+            continue
+        entries.append((st.st_mtime, st.st_size, p))
+    total = sum(n for _, n, _ in entries)
+    removed = []
+    for _, n, p in sorted(entries):
+        if total <= limit:
+            break
+        if p.name in keep:
+            continue
+        p.unlink(missing_ok=True)
+        total -= n
+        removed.append(p.name)
+    return removed
+
+
+def prepare_upload(
+    name: str,
+    payload: bytes,
+    resolution_m: float = 10,
+    tolerance_px: float = 0.5,
+    id_field: str | None = None,
+) -> PreparedFields:
+    """Lê, prepara e guarda em cache um arquivo de talhões enviado."""
+    h = hashlib.sha256(payload)
+    h.update(
+        f"|{Path(name).suffix.lower()}|{resolution_m}|{tolerance_px}|{id_field}|"
+        f"{CACHE_VERSION}".encode()
+    )
+    path = _cache_dir() / f"{h.hexdigest()}.pkl"
+    try:
+        with open(path, "rb") as fh:
+            prepared = pickle.load(fh)
+        os.utime(path)  # recência para a limpeza do cache
+        prepared.report["cached"] = True
+        return prepared
+    except FileNotFoundError:  # ausente (ou removido pela limpeza)
+        pass
+
+    raw = FieldRegistry.from_upload(name, payload, id_field)
+    prepared = prepare(raw, resolution_m, tolerance_px)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Nome único: threads do mesmo processo podem gravar a mesma entrada
+    tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex}.part")
+    try:
+        with open(tmp, "wb") as fh:
+            pickle.dump(prepared, fh, protocol=pickle.HIGHEST_PROTOCOL)
+        tmp.replace(path)
+    finally:
+        tmp.unlink(missing_ok=True)
+    evict(path.parent, keep=(path.name,))
+    prepared.report["cached"] = False
+    return prepared
@@ -0,0 +1,273 @@
+"""Escrita direta de GeoPackage (sqlite3) para talhões + estatísticas por data.
+
+Grava milhares de polígonos numa única transação (executemany), cria o índice
+espacial R-tree (extensão gpkg_rtree_index) em lote e guarda as estatísticas
+numa tabela de atributos separada, ligada pelo id do talhão — as geometrias não
+são repetidas para cada data.
+"""
+
+from __future__ import annotations
+
+import sqlite3
+import struct
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Mapping, Sequence
+
+import numpy as np
+import pandas as pd
+
+_WGS84_WKT = (
+    'GEOGCS["WGS 84",DATUM["WGS_1984",SPHEROID["WGS 84",6378137,298.257223563,'
+    'AUTHORITY["EPSG","7030"]],AUTHORITY["EPSG","6326"]],PRIMEM["Greenwich",0,'
+    'AUTHORITY["EPSG","8901"]],UNIT["degree",0.0174532925199433,'
+    'AUTHORITY["EPSG","9122"]],AXIS["Latitude",NORTH],AXIS["Longitude",EAST],'
+    'AUTHORITY["EPSG","4326"]]'
+)
+
+_RTREE_EXT = "http://www.geopackage.org/spec120/#extension_rtree"
+
+
+def _srs_wkt(srs_id: int) -> str:
+    if srs_id == 4326:
+        return _WGS84_WKT
+    from pyproj import CRS
+
+    return CRS.from_epsg(srs_id).to_wkt("WKT1_GDAL")
+
+
+def _sqlite_type(dtype) -> str:
+    if pd.api.types.is_bool_dtype(dtype) or pd.api.types.is_integer_dtype(dtype):
+        return "INTEGER"
+    if pd.api.types.is_float_dtype(dtype):
+        return "DOUBLE"
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return "DATE"
+    return "TEXT"
+
+
+def _column_values(series: pd.Series) -> list:
+    """Converte a coluna em valores nativos do sqlite (datas em ISO, NaN -> NULL)."""
+    if pd.api.types.is_datetime64_any_dtype(series.dtype):
+        out = series.dt.strftime("%Y-%m-%d")
+    else:
+        out = series
+    return out.astype(object).where(out.notna(), None).tolist()
+
+
+def _gpkg_blobs(geometries, srs_id: int) -> tuple[list[bytes], np.ndarray]:
+    """Geometrias -> blobs GPKG (cabeçalho + envelope XY + WKB) e bounds (N, 4)."""
+    import shapely
+
+    geoms = np.asarray(geometries, dtype=object)
+    wkb = shapely.to_wkb(geoms, byte_order=1)
+    bounds = shapely.bounds(geoms)
+    head = struct.Struct("<2sBBi4d")
+    blobs = [
+        head.pack(b"GP", 0, 0x03, srs_id, b[0], b[2], b[1], b[3]) + w
+        for w, b in zip(wkb, bounds)
+    ]
+    return blobs, bounds
+
+
+def _geometry_type(geometries) -> str:
+    import shapely
+
+    names = {shapely.get_type_id(g) for g in geometries}
+    types = {3: "POLYGON", 6: "MULTIPOLYGON", 0: "POINT", 1: "LINESTRING"}
+    return types.get(names.pop(), "GEOMETRY") if len(names) == 1 else "GEOMETRY"
+
+
+def _init_gpkg(con: sqlite3.Connection, srs_id: int) -> None:
+    con.execute("PRAGMA application_id = 1196444487")  # 'GPKG'
+    con.execute("PRAGMA user_version = 10300")
+    con.executescript(
+        """
+        CREATE TABLE gpkg_spatial_ref_sys (
+            srs_name TEXT NOT NULL, srs_id INTEGER PRIMARY KEY,
+            organization TEXT NOT NULL, organization_coordsys_id INTEGER NOT NULL,
+            definition TEXT NOT NULL, description TEXT);
+        CREATE TABLE gpkg_contents (
+            table_name TEXT NOT NULL PRIMARY KEY, data_type TEXT NOT NULL,
+            identifier TEXT UNIQUE, description TEXT DEFAULT '',
+            last_change DATETIME NOT NULL, min_x DOUBLE, min_y DOUBLE,
+            max_x DOUBLE, max_y DOUBLE, srs_id INTEGER,
+            FOREIGN KEY (srs_id) REFERENCES gpkg_spatial_ref_sys(srs_id));
+        CREATE TABLE gpkg_geometry_columns (
+            table_name TEXT NOT NULL, column_name TEXT NOT NULL,
+            geometry_type_name TEXT NOT NULL, srs_id INTEGER NOT NULL,
+            z TINYINT NOT NULL, m TINYINT NOT NULL,
+            PRIMARY KEY (table_name, column_name));
+        CREATE TABLE gpkg_extensions (
+            table_name TEXT, column_name TEXT, extension_name TEXT NOT NULL,
+            definition TEXT NOT NULL, scope TEXT NOT NULL,
+            UNIQUE (table_name, column_name, extension_name));
+        """
+    )
+    rows = [
+        ("Undefined cartesian SRS", -1, "NONE", -1, "undefined", None),
+        ("Undefined geographic SRS", 0, "NONE", 0, "undefined", None),
+        ("WGS 84 geodetic", 4326, "EPSG", 4326, _WGS84_WKT, None),
+    ]
+    if srs_id not in (-1, 0, 4326):
+        rows.append((f"EPSG:{srs_id}", srs_id, "EPSG", srs_id, _srs_wkt(srs_id), None))
+    con.executemany("INSERT INTO gpkg_spatial_ref_sys VALUES (?,?,?,?,?,?)", rows)
+
+
+def _create_rtree(con: sqlite3.Connection, table: str, col: str, bounds) -> None:
+    """R-tree preenchido em lote + gatilhos do padrão (usados por QGIS/GDAL)."""
+    rt = f"rtree_{table}_{col}"
+    con.execute(f'CREATE VIRTUAL TABLE "{rt}" USING rtree(id, minx, maxx, miny, maxy)')
+    con.executemany(
+        f'INSERT INTO "{rt}" VALUES (?,?,?,?,?)',
+        (
+            (i + 1, float(b[0]), float(b[2]), float(b[1]), float(b[3]))
+            for i, b in enumerate(bounds)
+        ),
+    )
+    con.execute(
+        "INSERT INTO gpkg_extensions VALUES (?,?,?,?,?)",
+        (table, col, "gpkg_rtree_index", _RTREE_EXT, "write-only"),
+    )
+    env = (
+        f'ST_MinX(NEW."{col}"), ST_MaxX(NEW."{col}"), '
+        f'ST_MinY(NEW."{col}"), ST_MaxY(NEW."{col}")'
+    )
+    con.executescript(
+        f"""
+        CREATE TRIGGER "{rt}_insert" AFTER INSERT ON "{table}"
+        WHEN (NEW."{col}" NOT NULL AND NOT ST_IsEmpty(NEW."{col}"))
+        BEGIN
+          INSERT OR REPLACE INTO "{rt}" VALUES (NEW.fid, {env});
+        END;
+        CREATE TRIGGER "{rt}_update1" AFTER UPDATE OF "{col}" ON "{table}"
+        WHEN (NEW."{col}" NOT NULL AND NOT ST_IsEmpty(NEW."{col}"))
+        BEGIN
+          INSERT OR REPLACE INTO "{rt}" VALUES (NEW.fid, {env});
+        END;
+        CREATE TRIGGER "{rt}_update2" AFTER UPDATE OF "{col}" ON "{table}"
+        WHEN (NEW."{col}" IS NULL OR ST_IsEmpty(NEW."{col}"))
+        BEGIN
+          DELETE FROM "{rt}" WHERE id = OLD.fid;
+        END;
+        CREATE TRIGGER "{rt}_delete" AFTER DELETE ON "{table}"
+        WHEN OLD."{col}" NOT NULL
+        BEGIN
+          DELETE FROM "{rt}" WHERE id = OLD.fid;
+        END;
+        """
+    )
+
+
+def write_fields_gpkg(
+    path: Path,
+    field_ids: Sequence[Any],
+    geometries: Sequence[Any],
+    stats: pd.DataFrame | None = None,
+    attrs: Mapping[str, Sequence[Any]] | None = None,
+    srs_id: int = 4326,
+    layer: str = "talhoes",
+    stats_table: str = "ndvi_stats",
+    id_col: str = "field_id",
+) -> Path:
+    """Grava talhões (geometrias shapely) e, opcionalmente, estatísticas por data.
+
+    `stats` é um DataFrame longo com a coluna `id_col` (+ date, NDVI, ...); vira a
+    tabela de atributos `stats_table`, indexada por (id_col, date). O arquivo é
+    recriado do zero.
+    """
+    path = Path(path)
+    if len(field_ids) != len(geometries):
+        raise ValueError("field_ids e geometries devem ter o mesmo tamanho.")
+    blobs, bounds = _gpkg_blobs(geometries, srs_id)
+    attrs = dict(attrs or {})
+    now = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+    # Temporário único (duas sessões podem exportar o mesmo arquivo), apagado
+    # se a gravação falhar; o destino só é trocado com o arquivo completo
+    tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex}.part")
+    con = sqlite3.connect(tmp)
+    try:
+        con.execute("PRAGMA journal_mode = MEMORY")
+        con.execute("PRAGMA synchronous = OFF")
+        with con:
+            _init_gpkg(con, srs_id)
+
+            # Camada de feições (uma linha por talhão)
+            extra = pd.DataFrame(attrs)
+            cols_sql = "".join(
+                f', "{c}" {_sqlite_type(extra[c].dtype)}' for c in extra.columns
+            )
+            gtype = _geometry_type(geometries)
+            con.execute(
+                f'CREATE TABLE "{layer}" (fid INTEGER PRIMARY KEY AUTOINCREMENT, '
+                f'geom {gtype}, "{id_col}" TEXT NOT NULL UNIQUE{cols_sql})'
+            )
+            names = ["geom", id_col, *extra.columns]
+            placeholders = ",".join("?" * len(names))
+            quoted = ",".join(f'"{n}"' for n in names)
+            columns = [blobs, [str(f) for f in field_ids]]
+            columns += [_column_values(extra[c]) for c in extra.columns]
+            con.executemany(
+                f'INSERT INTO "{layer}" ({quoted}) VALUES ({placeholders})',
+                zip(*columns),
+            )
+            if len(bounds):
+                ext = (
+                    float(np.nanmin(bounds[:, 0])),
+                    float(np.nanmin(bounds[:, 1])),
+                    float(np.nanmax(bounds[:, 2])),
+                    float(np.nanmax(bounds[:, 3])),
+                )
+            else:
+                ext = (None, None, None, None)
+            con.execute(
+                "INSERT INTO gpkg_contents VALUES (?,?,?,?,?,?,?,?,?,?)",
+                (layer, "features", layer, "", now, *ext, srs_id),
+            )
+            con.execute(
+                "INSERT INTO gpkg_geometry_columns VALUES (?,?,?,?,?,?)",
+                (layer, "geom", gtype, srs_id, 0, 0),
+            )
+            _create_rtree(con, layer, "geom", bounds)
+
+            # Tabela de atributos: estatísticas por (talhão, data)
+            if stats is not None and not stats.empty:
+                if id_col not in stats.columns:
+                    raise ValueError(f"stats precisa da coluna '{id_col}'.")
+                st_cols = [c for c in stats.columns if c != id_col]
+                cols_sql = "".join(
+                    f', "{c}" {_sqlite_type(stats[c].dtype)}' for c in st_cols
+                )
+                con.execute(
+                    f'CREATE TABLE "{stats_table}" (fid INTEGER PRIMARY KEY '
+                    f'AUTOINCREMENT, "{id_col}" TEXT NOT NULL REFERENCES '
+                    f'"{layer}"("{id_col}"){cols_sql})'
+                )
+                names = [id_col, *st_cols]
+                quoted = ",".join(f'"{n}"' for n in names)
+                placeholders = ",".join("?" * len(names))
+                columns = [[str(v) for v in stats[id_col].tolist()]]
+                columns += [_column_values(stats[c]) for c in st_cols]
+                con.executemany(
+                    f'INSERT INTO "{stats_table}" ({quoted}) VALUES ({placeholders})',
+                    zip(*columns),
+                )
+                order = '"date"' if "date" in st_cols else "fid"
+                con.execute(
+                    f'CREATE INDEX "idx_{stats_table}_{id_col}" ON '
+                    f'"{stats_table}" ("{id_col}", {order})'
+                )
+                con.execute(
+                    "INSERT INTO gpkg_contents (table_name, data_type, identifier, "
+                    "last_change) VALUES (?,?,?,?)",
+                    (stats_table, "attributes", stats_table, now),
+                )
+    except BaseException:
+        con.close()
+        tmp.unlink(missing_ok=True)
+        raise
+    con.close()
+    tmp.replace(path)
+    return path
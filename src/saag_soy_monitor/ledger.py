@@ -0,0 +1,194 @@
+"""Registro durável de unidades de trabalho (talhão x data) em SQLite.
+
+Lotes grandes (muitos talhões x safra inteira) falhavam por inteiro ou
+transformavam erros em linhas NaN sem aviso. Aqui cada unidade tem uma linha
+no ledger, gravada assim que termina:
+
+- unidades `done` são puladas ao reiniciar (o resultado fica guardado);
+- unidades com erro ficam `failed`, com a mensagem e o nº de tentativas, e
+  são tentadas de novo (na mesma execução, com espera exponencial, e nas
+  seguintes) até `RetryPolicy.max_attempts` no total;
+- o banco usa WAL e um commit por unidade, então um reinício do nó no meio
+  da noite perde no máximo a unidade em andamento.
+
+`job` separa execuções com parâmetros diferentes (coleção, resolução, ...)
+no mesmo arquivo.
+"""
+
+from __future__ import annotations
+
+import json
+import sqlite3
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Iterable
+
+import pandas as pd
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS units (
+    job TEXT NOT NULL,
+    field_id TEXT NOT NULL,
+    date TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    error TEXT,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (job, field_id, date)
+)
+"""
+
+
+@dataclass
+class RetryPolicy:
+    max_attempts: int = 3  # total por unidade, somando execuções anteriores
+    backoff_s: float = 1.0
+    max_backoff_s: float = 30.0
+    # Decide se a exceção merece nova tentativa (p.ex. rede/5xx sim, 4xx não);
+    # None: qualquer Exception
+    retryable: Callable[[BaseException], bool] | None = None
+
+    def should_retry(self, exc: BaseException) -> bool:
+        return self.retryable is None or bool(self.retryable(exc))
+
+    def delay(self, attempt: int) -> float:
+        return min(self.backoff_s * 2 ** max(attempt - 1, 0), self.max_backoff_s)
+
+
+@dataclass
+class BatchReport:
+    done: int = 0
+    skipped: int = 0  # já concluídas ou com tentativas esgotadas
+    failed: int = 0
+    attempts: int = 0
+
+    def __str__(self) -> str:
+        return (
+            f"{self.done} concluídas, {self.skipped} puladas, "
+            f"{self.failed} com falha ({self.attempts} tentativas)"
+        )
+
+
+class WorkLedger:
+    def __init__(self, path: Path | str):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._con = sqlite3.connect(self.path, timeout=30.0)
+        self._con.execute("PRAGMA journal_mode=WAL")
+        self._con.execute("PRAGMA synchronous=NORMAL")
+        with self._con:
+            self._con.execute(_SCHEMA)
+
+    def close(self) -> None:
+        self._con.close()
+
+    def __enter__(self) -> "WorkLedger":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def state(self, job: str) -> dict[tuple[str, str], tuple[str, int]]:
+        """{(talhão, data): (status, tentativas)} do job."""
+        rows = self._con.execute(
+            "SELECT field_id, date, status, attempts FROM units WHERE job = ?", (job,)
+        )
+        return {(f, d): (s, a) for f, d, s, a in rows}
+
+    def mark_done(self, job: str, field_id: str, date: str, result: Any) -> None:
+        with self._con:
+            self._con.execute(
+                "INSERT INTO units VALUES (?, ?, ?, 'done', 1, ?, NULL, ?) "
+                "ON CONFLICT(job, field_id, date) DO UPDATE SET status = 'done', "
+                "attempts = attempts + 1, result = excluded.result, error = NULL, "
+                "updated_at = excluded.updated_at",
+                (job, field_id, date, json.dumps(result), time.time()),
+            )
+
+    def mark_failed(self, job: str, field_id: str, date: str, error: str) -> int:
+        """Registra a falha; devolve o total de tentativas da unidade."""
+        with self._con:
+            self._con.execute(
+                "INSERT INTO units VALUES (?, ?, ?, 'failed', 1, NULL, ?, ?) "
+                "ON CONFLICT(job, field_id, date) DO UPDATE SET status = 'failed', "
+                "attempts = attempts + 1, error = excluded.error, "
+                "updated_at = excluded.updated_at",
+                (job, field_id, date, error, time.time()),
+            )
+            (n,) = self._con.execute(
+                "SELECT attempts FROM units WHERE job = ? AND field_id = ? "
+                "AND date = ?",
+                (job, field_id, date),
+            ).fetchone()
+        return int(n)
+
+    def reset(self, job: str, status: str | None = "failed") -> int:
+        """Apaga unidades do job (só as com falha, por padrão)."""
+        sql, args = "DELETE FROM units WHERE job = ?", [job]
+        if status is not None:
+            sql += " AND status = ?"
+            args.append(status)
+        with self._con:
+            return self._con.execute(sql, args).rowcount
+
+    def frame(self, job: str) -> pd.DataFrame:
+        """Uma linha por unidade: field_id, date, status, attempts, error e os
+        campos do resultado (dict) como colunas."""
+        rows = self._con.execute(
+            "SELECT field_id, date, status, attempts, error, result FROM units "
+            "WHERE job = ? ORDER BY field_id, date",
+            (job,),
+        ).fetchall()
+        base = pd.DataFrame(
+            [r[:5] for r in rows],
+            columns=["field_id", "date", "status", "attempts", "error"],
+        )
+        results = pd.DataFrame(
+            [json.loads(r[5]) if r[5] else {} for r in rows], index=base.index
+        )
+        out = pd.concat([base, results], axis=1)
+        out["date"] = pd.to_datetime(out["date"])
+        return out
+
+
+def run_batch(
+    ledger: WorkLedger,
+    job: str,
+    units: Iterable[tuple[str, str]],
+    work: Callable[[str, str], Any],
+    policy: RetryPolicy | None = None,
+    sleep: Callable[[float], None] = time.sleep,
+) -> BatchReport:
+    """Executa `work(talhão, data)` para cada unidade ainda pendente.
+
+    O retorno de `work` precisa ser serializável em JSON (p.ex. um dict de
+    estatísticas). Exceções que `policy.should_retry` recusa falham de
+    imediato nesta execução (sem espera); uma execução seguinte ainda tenta
+    de novo enquanto houver tentativas.
+    """
+    policy = policy or RetryPolicy()
+    state = ledger.state(job)
+    report = BatchReport()
+    for field_id, day in units:
+        field_id, day = str(field_id), str(day)
+        status, attempts = state.get((field_id, day), ("pending", 0))
+        if status == "done" or attempts >= policy.max_attempts:
+            report.skipped += 1
+            continue
+        while True:
+            report.attempts += 1
+            try:
+                result = work(field_id, day)
+            except Exception as exc:
+                attempts = ledger.mark_failed(job, field_id, day, repr(exc))
+                if attempts >= policy.max_attempts or not policy.should_retry(exc):
+                    report.failed += 1
+                    break
+                sleep(policy.delay(attempts))
+            else:
+                ledger.mark_done(job, field_id, day, result)
+                report.done += 1
+                break
+    return report
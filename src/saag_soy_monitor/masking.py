@@ -0,0 +1,109 @@
+"""Máscara exata do polígono da AOI no grid do cubo.
+
+A BBOX (envelope) continua sendo usada para a busca STAC e o `stac_load`,
+mas as estatísticas passam a considerar só os pixels dentro do polígono
+desenhado/enviado. A geometria é rasterizada uma vez no grid de destino e
+aplicada às bandas antes do NDVI:
+
+- chunks totalmente fora do polígono viram constantes (nodata) e a tarefa
+  de leitura correspondente sai do grafo — esses pixels nem são lidos;
+- chunks parcialmente cobertos recebem `where(mask)`;
+- chunks totalmente dentro seguem intactos.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Mapping
+
+import numpy as np
+import shapely
+from shapely.geometry import shape
+
+
+def aoi_geometry(geojson: Mapping | None):
+    """União das geometrias (Feature, FeatureCollection ou lista) em EPSG:4326."""
+    if not geojson:
+        return None
+    if isinstance(geojson, Mapping) and geojson.get("type") == "FeatureCollection":
+        feats = geojson.get("features") or []
+    elif isinstance(geojson, Mapping):
+        feats = [geojson]
+    else:
+        feats = list(geojson)
+    geoms = [
+        shape(f.get("geometry", f)) for f in feats if f and (f.get("geometry") or f)
+    ]
+    geoms = [shapely.make_valid(g) for g in geoms if not g.is_empty]
+    if not geoms:
+        return None
+    return shapely.union_all(geoms)
+
+
+def _cube_crs(cube: Any) -> str:
+    odc = getattr(cube, "odc", None)
+    crs = odc.crs if odc is not None else None
+    return str(crs) if crs is not None else "EPSG:4326"
+
+
+def polygon_mask(
+    geom_wgs84, crs: str, transform, out_shape: tuple[int, int]
+) -> np.ndarray:
+    """Máscara booleana (linhas, colunas) de um grid `transform` no `crs` —
+    True dentro do polígono (centro do pixel)."""
+    from pyproj import Transformer
+    from rasterio.features import geometry_mask
+
+    if str(crs).upper() not in ("EPSG:4326", "OGC:CRS84"):
+        tr = Transformer.from_crs(4326, crs, always_xy=True)
+        geom = shapely.transform(
+            geom_wgs84, lambda xy: np.column_stack(tr.transform(xy[:, 0], xy[:, 1]))
+        )
+    else:
+        geom = geom_wgs84
+    return geometry_mask(
+        [shapely.geometry.mapping(geom)],
+        out_shape=out_shape,
+        transform=transform,
+        invert=True,
+    )
+
+
+def rasterize_mask(geom_wgs84, cube: Any) -> np.ndarray:
+    """Máscara booleana (y, x) — True dentro do polígono (centro do pixel)."""
+    from rasterio.transform import Affine
+
+    xs, ys = cube["x"].values, cube["y"].values
+    rx = float(xs[1] - xs[0]) if xs.size > 1 else 1.0
+    ry = float(ys[1] - ys[0]) if ys.size > 1 else -1.0
+    transform = Affine(rx, 0.0, xs[0] - rx / 2, 0.0, ry, ys[0] - ry / 2)
+    return polygon_mask(geom_wgs84, _cube_crs(cube), transform, (ys.size, xs.size))
+
+
+def mask_array(arr, mask: np.ndarray, fill=0):
+    """Aplica a máscara (y, x) a um DataArray dask (time, y, x) por chunk."""
+    import dask.array as da
+
+    arr = arr.transpose("time", "y", "x")
+    data = arr.data
+    if not isinstance(data, da.Array):
+        return arr.where(mask, fill)
+    ty, tx = data.chunks[1], data.chunks[2]
+    yoff = np.concatenate([[0], np.cumsum(ty)])
+    xoff = np.concatenate([[0], np.cumsum(tx)])
+    planes = []
+    for ti, tc in enumerate(data.chunks[0]):
+        rows = []
+        for yi, yc in enumerate(ty):
+            row = []
+            for xi, xc in enumerate(tx):
+                m = mask[yoff[yi] : yoff[yi + 1], xoff[xi] : xoff[xi + 1]]
+                if not m.any():
+                    blk = da.full((tc, yc, xc), fill, dtype=data.dtype)
+                else:
+                    blk = data.blocks[ti, yi, xi]
+                    if not m.all():
+                        blk = da.where(m[None], blk, np.asarray(fill, data.dtype))
+                row.append(blk)
+            rows.append(row)
+        planes.append(rows)
+    return arr.copy(data=da.block(planes))
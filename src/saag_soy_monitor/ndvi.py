@@ -0,0 +1,266 @@
+"""Cubo e série NDVI de uma AOI (Sentinel-2 L2A), comum às páginas.
+
+Séries Temporais e Exportações rodavam a mesma cadeia, copiada em cada
+página: busca -> zonas UTM/seleção de cenas -> `stac_load` -> máscara do
+polígono -> cubo compartilhado (compacto) -> mediana e fração de válidos
+por data. Aqui ela existe uma vez; as páginas só tratam a interface.
+
+Dependências pesadas (odc-stac, planetary-computer) são importadas dentro
+das funções, como no resto do pacote.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Any, Sequence
+
+import numpy as np
+import pandas as pd
+
+MAX_CLOUD = 60
+BAND_CANDIDATES = [("B04", "B08"), ("B04_10m", "B08_10m"), ("red", "nir")]
+
+
+@dataclass
+class AoiNdvi:
+    df: pd.DataFrame  # date, NDVI (mediana), valid_frac
+    ndvi: Any  # DataArray (time, y, x) float32 com NaN, lazy ou mmap
+    bands: tuple[str, str]
+    items: list  # cenas do cubo único (mapas/miniaturas)
+    mask: np.ndarray | None = None  # polígono no grid do cubo (None: BBOX)
+    parts: list = field(default_factory=list)  # ZonePart por zona UTM
+
+    @property
+    def multi_zone(self) -> bool:
+        return len(self.parts) > 1
+
+
+def search_scenes(
+    bbox: Sequence[float], start: str, end: str, max_cloud: float = MAX_CLOUD
+) -> list:
+    """Itens STAC (pystac) da AOI: em disco (SAAG_LOCAL_DATA) ou no Planetary
+    Computer, com busca paginada em paralelo e itens já assinados."""
+    from .local import local_backend
+
+    local = local_backend()
+    if local is not None:
+        return local.search(list(bbox), start, end, max_cloud=max_cloud, as_pystac=True)
+
+    import planetary_computer as pc
+
+    from .stac import search_items
+
+    # Sem prefetch_assets: ele aquece o cache de `cog.RangeReader`, mas o
+    # `stac_load` lê pelo GDAL (/vsicurl) e não consulta esse cache — ligar
+    # aqui só somaria GETs de cabeçalho por item. Vale para leitores que usam
+    # `cog.open_cog` (p.ex. `planner.rasterio_block_reader`).
+    return search_items(
+        list(bbox),
+        start,
+        end,
+        collections=["sentinel-2-l2a"],
+        query={"eo:cloud_cover": {"lt": max_cloud}},
+        sign=pc.sign,
+    )
+
+
+def pick_bands(items: Sequence) -> tuple[str, str]:
+    """Nomes dos assets RED/NIR da coleção (B04/B08, B04_10m/B08_10m, ...)."""
+    asset_keys = set(items[0].assets.keys())
+    for red, nir in BAND_CANDIDATES:
+        if red in asset_keys and nir in asset_keys:
+            return red, nir
+    raise RuntimeError(f"Não encontrei bandas RED/NIR nos assets: {sorted(asset_keys)}")
+
+
+def aoi_ndvi(
+    items: Sequence,
+    bbox: Sequence[float],
+    start: str,
+    end: str,
+    resolution_m: int,
+    aoi=None,
+    session: str | None = None,
+) -> AoiNdvi:
+    """Cubo NDVI e série (mediana por data) da AOI a partir da busca.
+
+    `items` vem de `search_scenes`, ainda sem deduplicação; `aoi` é o
+    polígono desenhado (EPSG:4326) ou None para usar a BBOX. `session`
+    identifica a sessão do Streamlit nas reduções dask (cancelamento).
+    """
+    from odc.stac import stac_load
+    from shapely.geometry import box
+
+    from .chunks import chunks_for_aoi
+    from .compact import compact_mode, decode, ndvi_compact
+    from .compute import compute as _compute
+    from .masking import mask_array, rasterize_mask
+    from .scenes import select_scenes, solar_day
+    from .shared import attach, cube_key, share
+    from .zones import plan_zones, zone_series
+
+    def compute(*objs):
+        return _compute(*objs, session=session)
+
+    minx, miny, maxx, maxy = (float(v) for v in bbox)
+    bbox_geom = box(minx, miny, maxx, maxy)
+
+    # AOI na divisa de zonas UTM: uma parte por zona, reduzida no CRS nativo
+    # (sem warp). A seleção (um item por trecho e dia solar, do menos nublado
+    # para o mais) roda em cada parte, com os itens da zona nativa na frente
+    parts = plan_zones(items, aoi if aoi is not None else bbox_geom)
+    if not parts:
+        raise RuntimeError("Nenhuma cena cobre a AOI.")
+    multi = len(parts) > 1
+    # Cubo único (mapas/miniaturas): multi-zona deduplica sobre a BBOX inteira
+    items = select_scenes(list(items), bbox_geom).items if multi else parts[0].items
+    bands = pick_bands(items)
+
+    # Carrega em UTM nativo, resolução em metros
+    ds = stac_load(
+        items,
+        assets=list(bands),
+        bbox=(minx, miny, maxx, maxy),
+        crs=None,
+        resolution=resolution_m,
+        chunks=chunks_for_aoi(
+            (minx, miny, maxx, maxy),
+            resolution_m,
+            len({solar_day(it) for it in items}),
+            masked=aoi is not None,
+        ),
+        groupby="solar_day",
+        # Sem isso o odc reordena cada dia por (hora, id) e o mosaico deixa de
+        # usar a cena menos nublada primeiro (ordem de `select_scenes`)
+        preserve_original_order=True,
+    )
+    # Só pixels dentro do polígono; chunks totalmente fora nem são lidos
+    mask = rasterize_mask(aoi, ds) if aoi is not None else None
+    if mask is not None:
+        ds = ds.assign({b: mask_array(ds[b], mask) for b in bands})
+
+    # Cubo NDVI decodificado uma vez por AOI/período e anexado (mmap, somente
+    # leitura) pelas outras sessões e processos
+    mode = compact_mode()
+    key = cube_key(
+        minx,
+        miny,
+        maxx,
+        maxy,
+        start,
+        end,
+        resolution_m,
+        bands,
+        sorted(it.id for it in items),
+        mode,
+        aoi.wkb_hex if aoi is not None else None,
+    )
+
+    def publish(cube):
+        # Multi-zona: o cubo reamostrado não é materializado (só mapas/miniaturas)
+        return cube if multi else share(key, cube, compute=compute)
+
+    ndvi = attach(key)
+    if ndvi is None and mode != "off":
+        # Modo compacto: NDVI direto das bandas uint16, guardado em int16/float16
+        ndvi = publish(ndvi_compact(ds[bands[0]], ds[bands[1]], mode))
+    elif ndvi is None:
+        red = ds[bands[0]].astype("float32")
+        nir = ds[bands[1]].astype("float32")
+        # Escala 0..1, se necessário
+        try:
+            mx = 1.0 if multi else float(max(compute(red.max(), nir.max())))
+        except Exception:
+            mx = 1.0
+        if mx > 1.5:
+            red = red / 10000.0
+            nir = nir / 10000.0
+        ndvi = (nir - red) / (nir + red + 1e-6)
+        # Nodata (0) vira NaN: fica fora da mediana e da fração de válidos
+        ndvi = ndvi.where((ds[bands[0]] > 0) & (ds[bands[1]] > 0)).rename("ndvi")
+        ndvi = publish(ndvi)
+    # float32 com NaN, por bloco (o cubo guardado segue compacto)
+    ndvi = decode(ndvi)
+
+    if multi:
+        # Estatísticas parciais (contagem, soma, histograma) somadas entre zonas
+        df = zone_series(
+            parts,
+            bands,
+            resolution_m,
+            stac_load,
+            # cada parte é mascarada pela sua faixa da AOI
+            chunks=lambda b, r, n: chunks_for_aoi(b, r, n, masked=True),
+            compute=compute,
+        )[["date", "NDVI", "valid_frac"]]
+    else:
+        # Mediana e fração de pixels válidos (peso da suavização) numa só passada
+        n_px = (
+            int(mask.sum()) if mask is not None else ndvi.sizes["y"] * ndvi.sizes["x"]
+        )
+        valid = ndvi.notnull().sum(dim=("y", "x")) / max(n_px, 1)
+        ndvi_t, valid_t = compute(ndvi.median(dim=("y", "x")), valid)
+        df = ndvi_t.to_series().reset_index()
+        df.columns = ["date", "NDVI"]
+        df["valid_frac"] = valid_t.values
+    df = df.sort_values("date").reset_index(drop=True)
+    return AoiNdvi(df, ndvi, bands, items, mask, parts)
+
+
+def field_stats(
+    res: AoiNdvi,
+    field_ids: Sequence[Any],
+    geometries: Sequence[Any],
+    session: str | None = None,
+) -> pd.DataFrame:
+    """Série por talhão no grid do cubo: field_id, date, NDVI (mediana),
+    NDVI_mean e valid_frac.
+
+    Cada talhão (EPSG:4326) vira uma máscara, recortada na janela que ele
+    ocupa; as reduções de todos saem num só compute. Talhões sem nenhum
+    pixel no cubo ficam de fora.
+    """
+    import xarray as xr
+
+    from .compute import compute
+    from .masking import rasterize_mask
+
+    lazy, kept = [], []
+    for fid, geom in zip(field_ids, geometries):
+        mask = rasterize_mask(geom, res.ndvi)
+        if res.mask is not None:
+            mask &= res.mask
+        n_px = int(mask.sum())
+        if not n_px:
+            continue
+        rows, cols = np.nonzero(mask)
+        ys, xs = slice(rows.min(), rows.max() + 1), slice(cols.min(), cols.max() + 1)
+        sub = res.ndvi.isel(y=ys, x=xs)
+        sub = sub.where(xr.DataArray(mask[ys, xs], dims=("y", "x")))
+        lazy += [
+            sub.median(dim=("y", "x")),
+            sub.mean(dim=("y", "x")),
+            sub.notnull().sum(dim=("y", "x")),
+        ]
+        kept.append((str(fid), n_px))
+    columns = ["field_id", "date", "NDVI", "NDVI_mean", "valid_frac"]
+    if not kept:
+        return pd.DataFrame(columns=columns)
+
+    out = compute(*lazy, session=session)
+    dates = pd.DatetimeIndex(res.ndvi["time"].values)
+    frames = []
+    for i, (fid, n_px) in enumerate(kept):
+        median, mean, count = out[3 * i : 3 * i + 3]
+        frames.append(
+            pd.DataFrame(
+                {
+                    "field_id": fid,
+                    "date": dates,
+                    "NDVI": median.values,
+                    "NDVI_mean": mean.values,
+                    "valid_frac": count.values / n_px,
+                }
+            )
+        )
+    return pd.concat(frames, ignore_index=True)[columns]
@@ -0,0 +1,165 @@
+"""Métricas fenológicas (SOS, pico, EOS, NDVI integrado) em lote por talhão.
+
+Opera sobre séries já suavizadas numa grade regular (ver `smoothing`), matriz
+(talhões x datas). Usa o método de limiar de amplitude: o início (SOS) é quando
+a curva cruza `base + sos_frac·amplitude` subindo até o pico, e o fim (EOS)
+quando cruza o limiar equivalente descendo após o pico. Tudo vetorizado.
+
+As métricas ficam em `outputs/phenology.parquet` (uma linha por talhão e
+safra), gravadas pelo lote por talhão; o calendário agrícola de um município
+sai de uma leitura desse arquivo (`crop_calendar`). As curvas de AOI da
+página de séries vão para uma tabela própria (`phenology_aoi.parquet`, com a
+chave da AOI em `field_id`), para não entrarem nas estatísticas de talhões.
+"""
+
+from __future__ import annotations
+
+import uuid
+from pathlib import Path
+from typing import Sequence
+
+import numpy as np
+import pandas as pd
+
+from .shared import file_lock
+
+PHENOLOGY_FILE = "phenology.parquet"
+AOI_PHENOLOGY_FILE = "phenology_aoi.parquet"  # curvas de AOI (página de séries)
+# Mês (1-12) em que começa a safra de verão (soja: semeadura a partir de set.)
+SEASON_START_MONTH = 7
+
+
+def season_of(day) -> str:
+    """Safra ("2024/25") a que pertence uma data."""
+    ts = pd.Timestamp(day)
+    y = ts.year if ts.month >= SEASON_START_MONTH else ts.year - 1
+    return f"{y}/{(y + 1) % 100:02d}"
+
+
+def extract(
+    dates: Sequence,
+    values: np.ndarray,
+    sos_frac: float = 0.2,
+    eos_frac: float = 0.2,
+    min_amplitude: float = 0.1,
+) -> dict[str, np.ndarray]:
+    """Extrai as métricas de cada linha de `values` (F, G) na grade `dates`.
+
+    Linhas sem amplitude mínima (ou sem dados) recebem NaN/NaT.
+    """
+    v = np.atleast_2d(np.asarray(values, dtype=np.float64))
+    f, g = v.shape
+    days = pd.DatetimeIndex(dates).values.astype("datetime64[D]").astype(np.float64)
+    col = np.arange(g)[None, :]
+    rows = np.arange(f)
+
+    finite = np.isfinite(v)
+    has_data = finite.any(axis=1)
+    peak = np.argmax(np.where(finite, v, -np.inf), axis=1)
+    peak_val = v[rows, peak]
+    base_l = np.where(finite & (col <= peak[:, None]), v, np.inf).min(axis=1)
+    base_r = np.where(finite & (col >= peak[:, None]), v, np.inf).min(axis=1)
+    thr_l = base_l + sos_frac * (peak_val - base_l)
+    thr_r = base_r + eos_frac * (peak_val - base_r)
+
+    # SOS: última data antes do pico abaixo do limiar; cruza entre ela e a seguinte
+    below_l = (v < thr_l[:, None]) & (col < peak[:, None])
+    lb = np.where(below_l, col, -1).max(axis=1)
+    lb0 = np.clip(lb, 0, g - 2)
+    v0, v1 = v[rows, lb0], v[rows, lb0 + 1]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        frac = np.clip((thr_l - v0) / (v1 - v0), 0.0, 1.0)
+    sos_idx = np.where(lb >= 0, lb0 + frac, 0.0)
+
+    # EOS: primeira data após o pico abaixo do limiar; cruza entre ela e a anterior
+    below_r = (v < thr_r[:, None]) & (col > peak[:, None])
+    fb = np.where(below_r, col, g).min(axis=1)
+    fb0 = np.clip(fb, 1, g - 1)
+    v0, v1 = v[rows, fb0 - 1], v[rows, fb0]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        frac = np.clip((v0 - thr_r) / (v0 - v1), 0.0, 1.0)
+    eos_idx = np.where(fb < g, fb0 - 1 + frac, g - 1.0)
+
+    # NDVI integrado (NDVI·dia) entre SOS e EOS via trapézios acumulados
+    vv = np.nan_to_num(v)
+    seg = (vv[:, 1:] + vv[:, :-1]) / 2 * np.diff(days)[None, :]
+    cum = np.concatenate([np.zeros((f, 1)), np.cumsum(seg, axis=1)], axis=1)
+    i0 = np.clip(np.ceil(sos_idx).astype(int), 0, g - 1)
+    i1 = np.clip(np.floor(eos_idx).astype(int), 0, g - 1)
+    integral = np.where(i1 > i0, cum[rows, i1] - cum[rows, i0], 0.0)
+
+    amplitude = peak_val - np.maximum(base_l, base_r)
+    ok = has_data & (np.minimum(peak_val - base_l, peak_val - base_r) >= min_amplitude)
+    grid_idx = np.arange(g, dtype=np.float64)
+    sos_day = np.interp(sos_idx, grid_idx, days)
+    eos_day = np.interp(eos_idx, grid_idx, days)
+
+    def _to_date(d: np.ndarray) -> np.ndarray:
+        out = np.round(d).astype("int64").astype("datetime64[D]")
+        return np.where(ok, out, np.datetime64("NaT"))
+
+    nan = np.nan
+    return {
+        "sos_date": _to_date(sos_day),
+        "peak_date": _to_date(days[peak]),
+        "peak_value": np.where(ok, peak_val, nan),
+        "eos_date": _to_date(eos_day),
+        "season_length_days": np.where(ok, eos_day - sos_day, nan),
+        "amplitude": np.where(ok, amplitude, nan),
+        "integrated_ndvi": np.where(ok, integral, nan),
+    }
+
+
+def to_frame(
+    field_ids: Sequence, metrics: dict[str, np.ndarray], season: str = ""
+) -> pd.DataFrame:
+    """Métricas -> tabela (uma linha por talhão e safra)."""
+    df = pd.DataFrame({"field_id": np.asarray(field_ids), **metrics})
+    df.insert(1, "season", season)
+    return df
+
+
+def save(
+    df: pd.DataFrame, out_dir: Path = Path("outputs"), name: str = PHENOLOGY_FILE
+) -> Path:
+    """Grava/atualiza a tabela `name` (upsert por talhão e safra)."""
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    path = out_dir / name
+    # Sessões do Streamlit (threads) e o lote por talhão (outro processo) leem
+    # e regravam sob o mesmo lock de arquivo; a tabela só é trocada inteira
+    # (temporário único + rename atômico)
+    with file_lock(path.with_name(f".{path.name}.lock")):
+        if path.exists():
+            df = pd.concat([pd.read_parquet(path), df], ignore_index=True)
+            df = df.drop_duplicates(subset=["field_id", "season"], keep="last")
+        tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex}.part")
+        try:
+            df.to_parquet(tmp, index=False)
+            tmp.replace(path)
+        finally:
+            tmp.unlink(missing_ok=True)
+    return path
+
+
+def load(
+    out_dir: Path = Path("outputs"),
+    season: str | None = None,
+    name: str = PHENOLOGY_FILE,
+) -> pd.DataFrame:
+    """Métricas gravadas (opcionalmente só de uma safra)."""
+    path = Path(out_dir) / name
+    if not path.exists():
+        return pd.DataFrame()
+    df = pd.read_parquet(path)
+    return df[df["season"] == season] if season is not None else df
+
+
+def crop_calendar(df: pd.DataFrame, by: str = "season") -> pd.DataFrame:
+    """Resumo do calendário (p10 / mediana / p90 das datas-chave) por grupo."""
+    cols = ["sos_date", "peak_date", "eos_date"]
+    grouped = df.groupby(by)
+    q = grouped[cols].quantile([0.1, 0.5, 0.9]).unstack()
+    q.columns = [f"{c}_p{int(round(p * 100))}" for c, p in q.columns]
+    q["n_fields"] = grouped["sos_date"].count()
+    return q.reset_index()
@@ -9,12 +9,15 @@ from typing import Iterable, Tuple
 import numpy as np
 import pandas as pd
 
+from .acquisitions import sentinelhub_calendar, synthetic_calendar
+
 # Sentinel Hub é opcional; o pipeline funciona em modo "demo" se faltar
 try:
     from sentinelhub import (
         BBox,
         CRS,
         DataCollection,
+        Geometry,
         MimeType,
         SentinelHubRequest,
         bbox_to_dimensions,
@@ -33,6 +36,7 @@ class RunParams:
     end: date
     resolution: int = 10
     collection: str = "SENTINEL2_L2A"
+    max_cloud: float | None = None  # descarta aquisições mais nubladas (%)
 
 
 def _parse_bbox(bbox_str: str) -> Tuple[float, float, float, float]:
@@ -50,28 +54,13 @@ def _ensure_outputs() -> Path:
 
 def _demo_timeseries(params: RunParams) -> pd.DataFrame:
     """Gera uma série NDVI fictícia (para funcionar sem credenciais)."""
-    idx = pd.date_range(params.start, params.end, freq="7D")
+    cal = synthetic_calendar(params.start, params.end, params.max_cloud)
+    idx = pd.DatetimeIndex(cal["date"])
     vals = np.clip(np.sin(np.linspace(0, 3, len(idx))) * 0.3 + 0.6, 0, 1)
     return pd.DataFrame({"date": idx, "NDVI": vals})
 
 
-def _real_timeseries_with_sentinelhub(params: RunParams) -> pd.DataFrame:
-    """Exemplo minimalista usando Sentinel Hub. Requer variáveis de ambiente:
-    SH_CLIENT_ID e SH_CLIENT_SECRET.
-    """
-    client_id = os.getenv("SH_CLIENT_ID", "")
-    client_secret = os.getenv("SH_CLIENT_SECRET", "")
-    if not client_id or not client_secret:
-        raise RuntimeError("Credenciais Sentinel Hub ausentes (defina SH_CLIENT_ID e SH_CLIENT_SECRET).")
-
-    cfg = SHConfig()
-    cfg.sh_client_id = client_id
-    cfg.sh_client_secret = client_secret
-
-    bbox = BBox(list(params.bbox_xyxy), crs=CRS.WGS84)
-    size = bbox_to_dimensions(bbox, resolution=params.resolution)
-
-    evalscript = """
+_EVALSCRIPT = """
 //VERSION=3
 function setup() {
   return {
@@ -85,39 +74,134 @@ function evaluatePixel(s) {
 }
 """
 
-    # Para série temporal, montamos uma requisição por data (simples e robusto)
-    dates = list(pd.date_range(params.start, params.end, freq="7D"))
-    rows = []
-    for d in dates:
-        req = SentinelHubRequest(
-            evalscript=evalscript,
-            input_data=[
-                SentinelHubRequest.input_data(
-                    data_collection=getattr(DataCollection, params.collection),
-                    time_interval=(d.date().isoformat(), d.date().isoformat()),
-                    mosaicking_order="mostRecent",
-                )
-            ],
-            responses=[SentinelHubRequest.output_response("default", MimeType.TIFF)],
-            bbox=bbox,
-            size=size,
-            config=cfg,
-        )
+
+def _sh_config() -> "SHConfig":
+    client_id = os.getenv("SH_CLIENT_ID", "")
+    client_secret = os.getenv("SH_CLIENT_SECRET", "")
+    if not client_id or not client_secret:
+        raise RuntimeError("Credenciais Sentinel Hub ausentes (defina SH_CLIENT_ID e SH_CLIENT_SECRET).")
+
+    cfg = SHConfig()
+    cfg.sh_client_id = client_id
+    cfg.sh_client_secret = client_secret
+    return cfg
+
+
+def _sh_mean_ndvi(
+    bbox_xyxy: Tuple[float, float, float, float],
+    day: pd.Timestamp,
+    resolution: int,
+    collection: str,
+    cfg: "SHConfig",
+    geometry=None,
+) -> float:
+    """NDVI médio dos pixels válidos numa data (NaN se nenhum for válido).
+
+    Com `geometry` (shapely, EPSG:4326), o Sentinel Hub recorta pelo polígono:
+    pixels da BBOX fora dele vêm com dataMask 0 e ficam fora da média.
+    """
+    bbox = BBox(list(bbox_xyxy), crs=CRS.WGS84)
+    req = SentinelHubRequest(
+        evalscript=_EVALSCRIPT,
+        input_data=[
+            SentinelHubRequest.input_data(
+                data_collection=getattr(DataCollection, collection),
+                time_interval=(day.date().isoformat(), day.date().isoformat()),
+                mosaicking_order="leastCC",
+            )
+        ],
+        responses=[SentinelHubRequest.output_response("default", MimeType.TIFF)],
+        bbox=bbox,
+        geometry=Geometry(geometry, CRS.WGS84) if geometry is not None else None,
+        size=bbox_to_dimensions(bbox, resolution=resolution),
+        config=cfg,
+    )
+    data = req.get_data()[0]  # (H,W,2) -> NDVI, mask
+    ndvi = data[:, :, 0]
+    valid = data[:, :, 1] > 0
+    return float(np.nanmean(ndvi[valid])) if valid.any() else np.nan
+
+
+def _is_retryable(exc: BaseException) -> bool:
+    """Rede/servidor (timeout, conexão, 429, 5xx) é retentável; 4xx não."""
+    resp = getattr(exc, "response", None)
+    if resp is None:
+        resp = getattr(getattr(exc, "request_exception", None), "response", None)
+    status = getattr(resp, "status_code", None)
+    if status is not None:
+        return status == 429 or status >= 500
+    return isinstance(exc, (OSError, TimeoutError)) or (
+        type(exc).__name__ == "DownloadFailedException"
+    )
+
+
+def _sh_ndvi_cached(
+    bbox_xyxy: Tuple[float, float, float, float],
+    day: pd.Timestamp,
+    resolution: int,
+    collection: str,
+    cfg: "SHConfig",
+    empty,
+    attempts: int = 3,
+) -> Tuple[float, str]:
+    """(NDVI, status) com o cache negativo: "ok", "empty" ou "error".
+
+    Datas sem pixel válido entram em `empty` (`emptycache.EmptyCache`) e não
+    são pedidas de novo até vencer; erros retentáveis são tentados
+    `attempts` vezes e não são cacheados; os demais sobem.
+    """
+    import time
+
+    if empty.is_empty(bbox_xyxy, day, collection):
+        return np.nan, "empty"
+    for i in range(attempts):
         try:
-            data = req.get_data()[0]  # (H,W,2) -> NDVI, mask
-            ndvi = data[:, :, 0]
-            mask = data[:, :, 1]
-            valid = mask > 0
-            if valid.any():
-                mean_ndvi = float(np.nanmean(ndvi[valid]))
-            else:
-                mean_ndvi = np.nan
-        except Exception:
-            # Falha pontual (sem cena na data, etc.): mantemos NaN
-            mean_ndvi = np.nan
-        rows.append({"date": d, "NDVI": mean_ndvi})
-
-    df = pd.DataFrame(rows).drop_duplicates(subset=["date"]).sort_values("date")
+            value = _sh_mean_ndvi(bbox_xyxy, day, resolution, collection, cfg)
+        except Exception as exc:
+            if not _is_retryable(exc):
+                raise
+            if i + 1 < attempts:
+                time.sleep(min(2.0**i, 10.0))
+            continue
+        if np.isnan(value):
+            empty.add(bbox_xyxy, day, collection)
+            return value, "empty"
+        return value, "ok"
+    return np.nan, "error"
+
+
+def _real_timeseries_with_sentinelhub(params: RunParams) -> pd.DataFrame:
+    """Exemplo minimalista usando Sentinel Hub. Requer variáveis de ambiente:
+    SH_CLIENT_ID e SH_CLIENT_SECRET.
+
+    A coluna `status` separa datas sem dado ("empty", cacheadas) de falhas
+    retentáveis ("error"), que serão pedidas de novo na próxima execução.
+    """
+    from .emptycache import EmptyCache
+
+    cfg = _sh_config()
+
+    # Para série temporal, montamos uma requisição por data (simples e robusto),
+    # só nas datas em que o catálogo tem aquisição sobre a AOI
+    cal = sentinelhub_calendar(
+        params.bbox_xyxy,
+        params.start,
+        params.end,
+        config=cfg,
+        collection=params.collection,
+        max_cloud=params.max_cloud,
+    )
+    dates = list(cal["date"])
+    rows = []
+    with EmptyCache() as empty:
+        for d in dates:
+            mean_ndvi, status = _sh_ndvi_cached(
+                params.bbox_xyxy, d, params.resolution, params.collection, cfg, empty
+            )
+            rows.append({"date": d, "NDVI": mean_ndvi, "status": status})
+
+    df = pd.DataFrame(rows, columns=["date", "NDVI", "status"])
+    df = df.drop_duplicates(subset=["date"]).sort_values("date")
     return df
 
 
@@ -127,13 +211,22 @@ def run_example_ndvi(
     end: date,
     resolution: int = 10,
     prefer_demo_when_no_creds: bool = True,
+    max_cloud: float | None = None,
+    local_dir: str | Path | None = None,
 ) -> Path:
     """Executa a pipeline exemplo e salva CSV em outputs/ts_ndvi.csv.
     Retorna o caminho do CSV.
+
+    Com `local_dir` (ou SAAG_LOCAL_DATA) as cenas vêm do disco, sem rede.
     """
-    params = RunParams(_parse_bbox(bbox), start, end, resolution)
+    from .local import local_backend
 
-    if _HAS_SH:
+    params = RunParams(_parse_bbox(bbox), start, end, resolution, max_cloud=max_cloud)
+
+    local = local_backend(local_dir)
+    if local is not None:
+        df = local.timeseries(params)
+    elif _HAS_SH:
         try:
             df = _real_timeseries_with_sentinelhub(params)
         except Exception as exc:
@@ -150,3 +243,157 @@ def run_example_ndvi(
     out_csv = out_dir / "ts_ndvi.csv"
     df.to_csv(out_csv, index=False)
     return out_csv
+
+
+def _ledger_path() -> Path:
+    return Path(os.getenv("SAAG_LEDGER", Path("outputs") / "ledger.sqlite"))
+
+
+def _climatology_path() -> Path:
+    return Path(os.getenv("SAAG_CLIMATOLOGY", Path("outputs") / "climatology"))
+
+
+def run_fields_ndvi(
+    registry,
+    start: date,
+    end: date,
+    resolution: int = 10,
+    max_cloud: float | None = None,
+    collection: str = "SENTINEL2_L2A",
+    local_dir: str | Path | None = None,
+    ledger_path: str | Path | None = None,
+    policy=None,
+    season: str | None = None,
+    climatology_root: str | Path | None = None,
+) -> Path:
+    """Série NDVI por talhão em lote retomável (outputs/ts_ndvi_fields.csv).
+
+    Cada (talhão, data) é uma unidade no ledger SQLite (SAAG_LEDGER, padrão
+    outputs/ledger.sqlite): ao rodar de novo, as concluídas são puladas e as
+    com falha são retentadas até o limite de `policy` (`ledger.RetryPolicy`).
+    Erros não retentáveis (4xx, dados inválidos; ver `_is_retryable`) falham
+    sem espera. Unidades que esgotam as tentativas saem com NDVI vazio,
+    status "failed" e o erro no CSV.
+
+    A chave de cada unidade inclui o hash da geometria do talhão: outro
+    arquivo que reusa IDs ("1", "2", ...) ou um polígono editado gera
+    unidades novas em vez de herdar resultados antigos.
+
+    Com `season` (p.ex. "2024/25"), a série entra na climatologia por talhão
+    (SAAG_CLIMATOLOGY, padrão outputs/climatology) e as métricas fenológicas
+    da curva suavizada vão para outputs/phenology.parquet; rodar o lote de
+    novo substitui a safra nos dois em vez de somá-la duas vezes.
+    """
+    import dataclasses
+    import hashlib
+    import json
+
+    import shapely
+
+    from .ledger import RetryPolicy, WorkLedger, run_batch
+    from .local import local_backend
+
+    local = local_backend(local_dir)
+    empty = None
+    if local is not None:
+        source = f"local:{local.root.resolve()}"
+        items = local.search(registry.bounds, start, end, max_cloud=max_cloud)
+        dates = sorted(
+            {
+                pd.Timestamp(it["properties"]["datetime"]).tz_localize(None).normalize()
+                for it in items
+            }
+        )
+
+        # Uma leitura planejada por data para todos os talhões (cada bloco do
+        # COG lido uma vez); as unidades seguintes da mesma data usam o cache
+        by_day: dict[pd.Timestamp, dict[str, float]] = {}
+
+        def mean_ndvi(fid, day):
+            if day not in by_day:
+                by_day.clear()
+                by_day[day] = local.fields_ndvi(registry, day, max_cloud=max_cloud)
+            return by_day[day].get(str(fid), np.nan)
+
+    elif _HAS_SH:
+        from .emptycache import EmptyCache
+
+        cfg = _sh_config()
+        source = "sentinelhub"
+        cal = sentinelhub_calendar(
+            registry.bounds, start, end, cfg, collection, max_cloud
+        )
+        dates = list(cal["date"])
+        empty = EmptyCache()
+
+        def mean_ndvi(fid, day):
+            geom = registry.geometry(fid)
+            bbox = geom.bounds
+            # Retentativas ficam com o ledger; datas vazias vão para o cache
+            if empty.is_empty(bbox, day, collection):
+                return np.nan
+            # Média só dentro do polígono (a BBOX pega talhões vizinhos)
+            value = _sh_mean_ndvi(bbox, day, resolution, collection, cfg, geom)
+            if np.isnan(value):
+                empty.add(bbox, day, collection)
+            return value
+
+    else:
+        raise RuntimeError(
+            "Sem fonte de dados para o lote: defina SAAG_LOCAL_DATA "
+            "ou instale sentinelhub."
+        )
+
+    job = hashlib.sha1(
+        json.dumps([source, collection, resolution, max_cloud]).encode()
+    ).hexdigest()[:16]
+    # Unidade = talhão@hash(geometria) x data
+    unit_field = {}
+    for fid in registry.field_ids:
+        wkb = shapely.to_wkb(shapely.normalize(registry.geometry(fid)))
+        unit_field[f"{fid}@{hashlib.sha1(wkb).hexdigest()[:12]}"] = fid
+    # Data a data: todos os talhões de uma data em sequência
+    units = [(u, d.strftime("%Y-%m-%d")) for d in dates for u in unit_field]
+
+    def work(unit: str, day: str) -> dict:
+        return {"NDVI": mean_ndvi(unit_field[unit], pd.Timestamp(day))}
+
+    policy = policy or RetryPolicy()
+    if policy.retryable is None:
+        policy = dataclasses.replace(policy, retryable=_is_retryable)
+    try:
+        with WorkLedger(ledger_path or _ledger_path()) as ledger:
+            report = run_batch(ledger, job, units, work, policy)
+            df = ledger.frame(job)
+    finally:
+        if empty is not None:
+            empty.close()
+
+    keys = pd.MultiIndex.from_tuples(
+        [(u, d) for u in unit_field for d in dates], names=["field_id", "date"]
+    )
+    df = df.set_index(["field_id", "date"]).reindex(keys).reset_index()
+    df["field_id"] = df["field_id"].map(unit_field)
+    if "NDVI" not in df:
+        df["NDVI"] = np.nan
+    df = df[["field_id", "date", "NDVI", "status", "attempts", "error"]]
+    df["note"] = f"lote {job}: {report}"
+
+    out_csv = _ensure_outputs() / "ts_ndvi_fields.csv"
+    df.to_csv(out_csv, index=False)
+
+    if season:
+        from .climatology import ClimatologyIndex
+
+        wide = df.pivot(index="field_id", columns="date", values="NDVI")
+        index = ClimatologyIndex.open_or_create(climatology_root or _climatology_path())
+        index.add_season(
+            season, wide.index, wide.columns, wide.to_numpy(dtype=float), replace=True
+        )
+
+        from .phenology import extract, save, to_frame
+        from .smoothing import smooth_series
+
+        grid, smooth = smooth_series(wide.columns, wide.to_numpy(dtype=float))
+        save(to_frame(wide.index, extract(grid, smooth), season), _ensure_outputs())
+    return out_csv
@@ -0,0 +1,247 @@
+"""Planejamento de leituras por tile MGRS / órbita / bloco interno do COG.
+
+Rodar cada talhão isoladamente faz vizinhos lerem os mesmos blocos do COG
+várias vezes. O planejador agrupa os itens STAC por (tile MGRS, órbita
+relativa, data), descobre quais blocos internos (p.ex. 1024x1024) cada talhão
+precisa e monta um mapa bloco -> talhões: cada bloco é lido uma vez e os
+pixels são espalhados para todos os talhões que o usam.
+"""
+
+from __future__ import annotations
+
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterable, Mapping
+
+import numpy as np
+import shapely
+from shapely.geometry import shape
+
+from .fields import FieldRegistry
+
+DEFAULT_BLOCK = 1024
+
+
+@dataclass(frozen=True)
+class BlockKey:
+    item_id: str
+    asset: str
+    row: int  # índice do bloco (linha)
+    col: int  # índice do bloco (coluna)
+
+
+@dataclass
+class ItemGrid:
+    item_id: str
+    href: str
+    epsg: int
+    transform: tuple[float, ...]  # affine (a, b, c, d, e, f)
+    shape: tuple[int, int]  # (linhas, colunas)
+    mgrs_tile: str
+    orbit: int | None
+    date: str
+
+
+@dataclass
+class ReadPlan:
+    asset: str
+    block_size: int
+    items: dict[str, ItemGrid] = field(default_factory=dict)
+    # (tile, órbita) -> [item_id, ...] ordenado por data
+    groups: dict[tuple[str, Any], list[str]] = field(default_factory=dict)
+    # bloco -> talhões que precisam dele
+    blocks: dict[BlockKey, list[str]] = field(default_factory=dict)
+    # (item_id, talhão) -> janela de pixels (row0, row1, col0, col1)
+    windows: dict[tuple[str, str], tuple[int, int, int, int]] = field(
+        default_factory=dict
+    )
+
+    @property
+    def block_reads(self) -> int:
+        """Blocos lidos com o plano (cada bloco uma vez)."""
+        return len(self.blocks)
+
+    @property
+    def per_field_block_reads(self) -> int:
+        """Blocos lidos se cada talhão fosse carregado isoladamente."""
+        return sum(len(f) for f in self.blocks.values())
+
+    def bytes_estimate(self, bytes_per_block: int | None = None) -> dict[str, int]:
+        """Estimativa de bytes (plano vs. por talhão); padrão: bloco uint16 cru."""
+        b = bytes_per_block or self.block_size * self.block_size * 2
+        return {
+            "planned": self.block_reads * b,
+            "per_field": self.per_field_block_reads * b,
+        }
+
+
+def _get(item: Any, key: str, default=None):
+    if isinstance(item, Mapping):
+        return item.get(key, default)
+    return getattr(item, key, default)
+
+
+def _item_grid(item: Any, asset: str) -> ItemGrid:
+    props = _get(item, "properties") or {}
+    assets = _get(item, "assets") or {}
+    a = assets[asset]
+    a_dict = a if isinstance(a, Mapping) else a.to_dict()
+    epsg = a_dict.get("proj:epsg") or props.get("proj:epsg")
+    if epsg is None and props.get("proj:code"):
+        epsg = int(str(props["proj:code"]).split(":")[-1])
+    transform = a_dict.get("proj:transform") or props.get("proj:transform")
+    shp = a_dict.get("proj:shape") or props.get("proj:shape")
+    if epsg is None or transform is None or shp is None:
+        raise ValueError(
+            f"Item {_get(item, 'id')} sem metadados proj:* no asset {asset}"
+        )
+    dt = str(props.get("datetime") or _get(item, "datetime") or "")[:10]
+    return ItemGrid(
+        item_id=str(_get(item, "id")),
+        href=a_dict["href"],
+        epsg=int(epsg),
+        transform=tuple(float(v) for v in transform[:6]),
+        shape=(int(shp[0]), int(shp[1])),
+        mgrs_tile=str(props.get("s2:mgrs_tile") or props.get("mgrs:tile") or ""),
+        orbit=props.get("sat:relative_orbit"),
+        date=dt,
+    )
+
+
+def _pixel_windows(grid: ItemGrid, geoms: np.ndarray) -> np.ndarray:
+    """Janelas (N, 4) = row0, row1, col0, col1 das geometrias (EPSG:4326) no grid."""
+    from pyproj import Transformer
+
+    tr = Transformer.from_crs(4326, grid.epsg, always_xy=True)
+    projected = shapely.transform(
+        geoms, lambda xy: np.column_stack(tr.transform(xy[:, 0], xy[:, 1]))
+    )
+    b = shapely.bounds(projected)  # minx, miny, maxx, maxy
+    a, _, c, _, e, f = grid.transform
+    col0 = np.floor((b[:, 0] - c) / a)
+    col1 = np.ceil((b[:, 2] - c) / a)
+    row0 = np.floor((b[:, 3] - f) / e)  # e < 0: topo = maxy
+    row1 = np.ceil((b[:, 1] - f) / e)
+    h, w = grid.shape
+    win = np.column_stack(
+        [
+            np.clip(row0, 0, h),
+            np.clip(row1, 0, h),
+            np.clip(col0, 0, w),
+            np.clip(col1, 0, w),
+        ]
+    ).astype(np.int64)
+    return win
+
+
+def window_mask(grid: ItemGrid, geom, window: tuple[int, int, int, int]) -> np.ndarray:
+    """Polígono (EPSG:4326) rasterizado na janela (row0, row1, col0, col1)."""
+    from rasterio.transform import Affine
+
+    from .masking import polygon_mask
+
+    r0, r1, c0, c1 = window
+    transform = Affine(*grid.transform) * Affine.translation(c0, r0)
+    return polygon_mask(geom, f"EPSG:{grid.epsg}", transform, (r1 - r0, c1 - c0))
+
+
+def plan_reads(
+    registry: FieldRegistry,
+    items: list,
+    asset: str = "B04",
+    block_size: int = DEFAULT_BLOCK,
+) -> ReadPlan:
+    """Monta o plano de leitura para todos os talhões x itens STAC."""
+    plan = ReadPlan(asset=asset, block_size=block_size)
+    groups: dict[tuple[str, Any], list[tuple[str, str]]] = defaultdict(list)
+    for item in items:
+        grid = _item_grid(item, asset)
+        plan.items[grid.item_id] = grid
+        groups[(grid.mgrs_tile, grid.orbit)].append((grid.date, grid.item_id))
+
+        footprint = _get(item, "geometry")
+        if footprint is None:
+            continue
+        ids = registry.query(shape(footprint))
+        if not len(ids):
+            continue
+        geoms = np.asarray([registry.geometry(f) for f in ids], dtype=object)
+        for fid, (r0, r1, c0, c1) in zip(ids, _pixel_windows(grid, geoms)):
+            if r1 <= r0 or c1 <= c0:
+                continue
+            plan.windows[(grid.item_id, fid)] = (int(r0), int(r1), int(c0), int(c1))
+            for br in range(r0 // block_size, (r1 - 1) // block_size + 1):
+                for bc in range(c0 // block_size, (c1 - 1) // block_size + 1):
+                    key = BlockKey(grid.item_id, asset, br, bc)
+                    plan.blocks.setdefault(key, []).append(fid)
+
+    plan.groups = {k: [i for _, i in sorted(v)] for k, v in groups.items()}
+    return plan
+
+
+def execute(
+    plan: ReadPlan,
+    read_blocks: Callable[[ItemGrid, list[BlockKey], int], Iterable[np.ndarray]],
+) -> dict[tuple[str, str], np.ndarray]:
+    """Lê cada bloco uma vez e espalha os pixels nas janelas dos talhões.
+
+    `read_blocks(grid, keys, block_size)` recebe todos os blocos de um item
+    (o grupo abre o COG uma vez) e devolve os blocos 2D na mesma ordem
+    (menores na borda). Retorna {(item_id, talhão): janela de pixels}.
+    """
+    out: dict[tuple[str, str], np.ndarray] = {}
+    bs = plan.block_size
+    by_item: dict[str, list[BlockKey]] = defaultdict(list)
+    for key in sorted(plan.blocks, key=lambda k: (k.item_id, k.row, k.col)):
+        by_item[key.item_id].append(key)
+    for item_id, keys in by_item.items():
+        grid = plan.items[item_id]
+        for key, block in zip(keys, read_blocks(grid, keys, bs)):
+            br0, bc0 = key.row * bs, key.col * bs
+            br1, bc1 = br0 + block.shape[0], bc0 + block.shape[1]
+            for fid in plan.blocks[key]:
+                r0, r1, c0, c1 = plan.windows[(key.item_id, fid)]
+                dst = out.get((key.item_id, fid))
+                if dst is None:
+                    dst = np.zeros((r1 - r0, c1 - c0), dtype=block.dtype)
+                    out[(key.item_id, fid)] = dst
+                rr0, rr1 = max(r0, br0), min(r1, br1)
+                cc0, cc1 = max(c0, bc0), min(c1, bc1)
+                if rr1 > rr0 and cc1 > cc0:
+                    dst[rr0 - r0 : rr1 - r0, cc0 - c0 : cc1 - c0] = block[
+                        rr0 - br0 : rr1 - br0, cc0 - bc0 : cc1 - bc0
+                    ]
+    return out
+
+
+_range_reader = None
+
+
+def rasterio_block_reader(
+    grid: ItemGrid, keys: list[BlockKey], block_size: int = DEFAULT_BLOCK
+) -> list[np.ndarray]:
+    """Leitor de blocos padrão: abre o COG uma vez e lê uma janela por bloco.
+
+    URLs HTTP(S) são abertas por `cog.open_cog`: o GDAL lê em faixas só os
+    tiles das janelas, com o cache de blocos de `cog.RangeReader`.
+    """
+    import rasterio
+    from rasterio.windows import Window
+
+    from .cog import RangeReader, open_cog
+
+    global _range_reader
+    if grid.href.startswith(("http://", "https://")):
+        if _range_reader is None:
+            _range_reader = RangeReader()
+        src = open_cog(grid.href, _range_reader)
+    else:
+        src = rasterio.open(grid.href)
+    out = []
+    with src:
+        for key in keys:
+            r0, c0 = key.row * block_size, key.col * block_size
+            h = min(block_size, grid.shape[0] - r0)
+            w = min(block_size, grid.shape[1] - c0)
+            out.append(src.read(1, window=Window(c0, r0, w, h)))
+    return out
@@ -0,0 +1,123 @@
+"""Renderização leve de NDVI (colormap RdYlGn) direto para PNG/WebP.
+
+Substitui figuras matplotlib no caminho da requisição: a paleta é uma tabela
+de consulta (LUT) pré-calculada e a aplicação é só indexação NumPy.
+"""
+
+from __future__ import annotations
+
+from functools import lru_cache
+from io import BytesIO
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+# Âncoras da paleta RdYlGn (ColorBrewer, 11 classes) — mesma base do matplotlib
+_RDYLGN_ANCHORS = (
+    "#a50026",
+    "#d73027",
+    "#f46d43",
+    "#fdae61",
+    "#fee08b",
+    "#ffffbf",
+    "#d9ef8b",
+    "#a6d96a",
+    "#66bd63",
+    "#1a9850",
+    "#006837",
+)
+
+LUT_SIZE = 256
+
+
+def _build_lut(
+    anchors: tuple[str, ...] = _RDYLGN_ANCHORS, n: int = LUT_SIZE
+) -> np.ndarray:
+    """Interpola linearmente as âncoras em uma LUT (n, 4) uint8 RGBA."""
+    rgb = np.array(
+        [[int(h[i : i + 2], 16) for i in (1, 3, 5)] for h in anchors], dtype=np.float32
+    )
+    pos = np.linspace(0.0, 1.0, len(anchors))
+    x = np.linspace(0.0, 1.0, n)
+    lut = np.empty((n, 4), dtype=np.uint8)
+    for c in range(3):
+        lut[:, c] = np.round(np.interp(x, pos, rgb[:, c]))
+    lut[:, 3] = 255
+    return lut
+
+
+RDYLGN_LUT = _build_lut()
+
+
+def colorize(arr: np.ndarray, vmin: float = 0.3, vmax: float = 0.9) -> np.ndarray:
+    """Aplica a LUT RdYlGn a uma matriz 2D. NaN/inf ficam transparentes.
+
+    Retorna (H, W, 4) uint8 RGBA.
+    """
+    a = np.asarray(arr, dtype=np.float32)
+    valid = np.isfinite(a)
+    span = float(vmax - vmin) or 1e-6
+    scaled = (np.where(valid, a, vmin) - vmin) * ((LUT_SIZE - 1) / span)
+    idx = np.clip(scaled, 0, LUT_SIZE - 1).astype(np.uint8)
+    rgba = RDYLGN_LUT[idx]
+    rgba[~valid, 3] = 0
+    return rgba
+
+
+def encode_image(rgba: np.ndarray, fmt: str = "PNG") -> bytes:
+    """Codifica RGBA uint8 em PNG (compressão rápida) ou WebP."""
+    img = Image.fromarray(rgba, mode="RGBA")
+    buf = BytesIO()
+    fmt = fmt.upper()
+    if fmt == "PNG":
+        img.save(buf, format="PNG", compress_level=1)
+    elif fmt == "WEBP":
+        img.save(buf, format="WEBP", quality=85, method=0)
+    else:
+        raise ValueError(f"Formato não suportado: {fmt} (use PNG ou WEBP)")
+    return buf.getvalue()
+
+
+def ndvi_thumbnail(
+    arr: np.ndarray,
+    vmin: float = 0.3,
+    vmax: float = 0.9,
+    fmt: str = "PNG",
+    max_size: int | None = 512,
+) -> bytes:
+    """Gera a miniatura NDVI codificada (sem legenda).
+
+    Se `max_size` for informado, reduz por amostragem (stride) antes de colorir,
+    para que AOIs grandes não custem mais que a miniatura exibida.
+    """
+    a = np.asarray(arr)
+    if max_size and max(a.shape[:2]) > max_size:
+        step = int(np.ceil(max(a.shape[:2]) / max_size))
+        a = a[::step, ::step]
+    return encode_image(colorize(a, vmin, vmax), fmt)
+
+
+@lru_cache(maxsize=32)
+def legend_png(
+    vmin: float = 0.3,
+    vmax: float = 0.9,
+    label: str = "NDVI",
+    width: int = 360,
+    height: int = 44,
+) -> bytes:
+    """Barra de cores horizontal com rótulos; renderizada uma vez e reutilizada."""
+    bar_h = 14
+    img = Image.new("RGBA", (width, height), (0, 0, 0, 0))
+    ramp = np.linspace(0, LUT_SIZE - 1, width - 20).astype(np.uint8)
+    bar = np.repeat(RDYLGN_LUT[ramp][None, :, :], bar_h, axis=0)
+    img.paste(Image.fromarray(bar, mode="RGBA"), (10, 4))
+
+    draw = ImageDraw.Draw(img)
+    text = (230, 234, 242, 255)
+    y = 4 + bar_h + 4
+    draw.text((10, y), f"{vmin:.2f}", fill=text)
+    draw.text((width // 2 - 12, y), label, fill=text)
+    draw.text((width - 40, y), f"{vmax:.2f}", fill=text)
+    buf = BytesIO()
+    img.save(buf, format="PNG")
+    return buf.getvalue()
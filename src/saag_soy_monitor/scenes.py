@@ -0,0 +1,103 @@
+"""Seleção de cenas: deduplicação por dia de aquisição e melhor pixel.
+
+Uma AOI na divisa de tiles MGRS recebe vários itens STAC da mesma passagem.
+Os itens são agrupados por dia solar e, dentro de cada dia, ordenados do menos
+para o mais nublado. Um item só é mantido se acrescentar área da AOI ainda não
+coberta pelos anteriores; itens totalmente redundantes nem são carregados.
+
+Com `stac_load(..., groupby="solar_day", preserve_original_order=True)` o
+mosaico de cada dia usa o primeiro pixel válido na ordem dos itens, ou seja,
+o da cena menos nublada. Sem `preserve_original_order` o odc-stac reordena
+cada dia por (hora, id) e essa ordem se perde.
+"""
+
+from __future__ import annotations
+
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from typing import Any, Callable, Mapping
+
+import shapely
+from shapely.geometry import shape
+
+
+@dataclass
+class SceneSelection:
+    items: list = field(default_factory=list)  # na ordem para o stac_load
+    skipped: list = field(default_factory=list)  # redundantes ou fora da AOI
+    # dia solar -> fração da AOI coberta pelas cenas escolhidas
+    coverage: dict[date, float] = field(default_factory=dict)
+
+
+def _get(item: Any, key: str, default=None):
+    if isinstance(item, Mapping):
+        return item.get(key, default)
+    return getattr(item, key, default)
+
+
+def _datetime(item: Any):
+    import pandas as pd
+
+    dt = _get(item, "datetime")
+    if dt is None:
+        dt = (_get(item, "properties") or {}).get("datetime")
+    return pd.Timestamp(dt)
+
+
+def solar_day(item: Any) -> date:
+    """Dia solar local da aquisição (UTC + longitude do centro / 15 h)."""
+    footprint = _get(item, "geometry")
+    lon = shape(footprint).centroid.x if footprint else 0.0
+    return (_datetime(item) + timedelta(hours=lon / 15.0)).date()
+
+
+def cloud_cover(item: Any) -> float:
+    props = _get(item, "properties") or {}
+    value = props.get("eo:cloud_cover")
+    return float(value) if value is not None else 100.0
+
+
+def select_scenes(
+    items: list,
+    aoi,
+    min_gain: float = 0.01,
+    prefer: Callable[[Any], bool] | None = None,
+) -> SceneSelection:
+    """Escolhe, por dia solar, as cenas necessárias para cobrir a AOI.
+
+    `aoi` é uma geometria shapely em EPSG:4326. Uma cena entra se cobrir ao
+    menos `min_gain` (fração da AOI) ainda descoberto naquele dia. Com
+    `prefer`, as cenas para as quais ele devolve True vêm antes das demais
+    (p.ex. as da zona UTM nativa); as outras só completam o que faltar.
+    """
+    aoi_area = aoi.area or 1.0
+    by_day: dict[date, list] = defaultdict(list)
+    for item in items:
+        by_day[solar_day(item)].append(item)
+
+    sel = SceneSelection()
+    for day in sorted(by_day):
+        covered = None
+        ranked = sorted(
+            by_day[day],
+            key=lambda it: (
+                prefer is not None and not prefer(it),
+                cloud_cover(it),
+                str(_get(it, "id")),
+            ),
+        )
+        for item in ranked:
+            footprint = _get(item, "geometry")
+            part = shapely.intersection(shape(footprint), aoi) if footprint else aoi
+            if part.is_empty:
+                sel.skipped.append(item)
+                continue
+            new = part if covered is None else shapely.difference(part, covered)
+            if new.area / aoi_area < min_gain:
+                sel.skipped.append(item)
+                continue
+            sel.items.append(item)
+            covered = part if covered is None else shapely.union(covered, part)
+        sel.coverage[day] = 0.0 if covered is None else covered.area / aoi_area
+    return sel
@@ -0,0 +1,305 @@
+"""Cubos NDVI decodificados compartilhados entre processos via mmap.
+
+Cada cubo é gravado uma única vez num .npy (SAAG_SHARED_DIR; use /dev/shm
+para ficar em memória compartilhada) com um descritor JSON pequeno ao lado
+(forma, dtype, coordenadas). Outros processos/sessões com a mesma chave só
+anexam o arquivo em modo somente leitura: as páginas do sistema operacional
+são compartilhadas, então a RAM cresce com o nº de AOIs distintas e não com
+o nº de sessões.
+
+A gravação é feita bloco a bloco pelas próprias tarefas dask (cada uma abre
+o arquivo pelo caminho), o que funciona com threads, processos ou cluster
+local, sem materializar o cubo inteiro na memória.
+
+Sessões Streamlit são threads do mesmo processo: cada escritor usa arquivos
+temporários próprios (uuid) e a publicação de uma chave é serializada por um
+lock (thread + `flock` entre processos, onde existir); quem chega depois
+espera e só anexa. O diretório tem teto de tamanho (SAAG_SHARED_CACHE_MB):
+ao publicar, os cubos menos usados recentemente são removidos.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Callable, Iterator
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: só o lock entre threads
+    fcntl = None
+
+DEFAULT_MAX_MB = 2048  # maior cubo compartilhado
+DEFAULT_CACHE_MB = 8192  # teto do diretório inteiro
+STALE_PART_S = 3600.0  # .part de escritores que morreram
+
+_locks: dict[str, threading.Lock] = {}
+_locks_guard = threading.Lock()
+
+
+@dataclass
+class CubeDescriptor:
+    key: str
+    path: str
+    shape: tuple[int, ...]
+    dtype: str
+    dims: tuple[str, ...]
+    name: str | None = None
+    attrs: dict | None = None
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self))
+
+    @classmethod
+    def from_json(cls, text: str) -> "CubeDescriptor":
+        d = json.loads(text)
+        d["shape"] = tuple(d["shape"])
+        d["dims"] = tuple(d["dims"])
+        return cls(**d)
+
+
+def shared_dir() -> Path:
+    root = Path(os.getenv("SAAG_SHARED_DIR", Path("outputs") / "cache" / "cubes"))
+    root.mkdir(parents=True, exist_ok=True)
+    return root
+
+
+def cube_key(*parts) -> str:
+    """Chave estável a partir de AOI, período, resolução, itens etc."""
+    raw = json.dumps([str(p) for p in parts])
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def _paths(key: str, root: Path) -> tuple[Path, Path, Path]:
+    return root / f"{key}.npy", root / f"{key}.json", root / f"{key}.coords.npz"
+
+
+def _tmp(path: Path, suffix: str = ".part") -> Path:
+    """Temporário exclusivo deste escritor (uuid), no mesmo diretório."""
+    return path.with_name(f".{path.name}.{uuid.uuid4().hex}{suffix}")
+
+
+@contextmanager
+def file_lock(path: Path) -> Iterator[None]:
+    """Exclusão mútua sobre o arquivo `path` entre threads e (com fcntl)
+    processos. O arquivo de lock é criado se preciso e nunca é apagado."""
+    path = Path(path)
+    with _locks_guard:
+        lock = _locks.setdefault(str(path), threading.Lock())
+    with lock:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "a+b") as fh:
+            if fcntl is not None:
+                fcntl.flock(fh, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+@contextmanager
+def _key_lock(key: str, root: Path) -> Iterator[None]:
+    """Exclusão mútua por chave entre threads e (com fcntl) processos."""
+    with file_lock(root / "locks" / f"{key}.lock"):
+        yield
+
+
+def attach(key: str, root: Path | None = None):
+    """Anexa um cubo publicado (DataArray somente leitura) ou None."""
+    root = root or shared_dir()
+    data_path, meta_path, coords_path = _paths(key, root)
+    try:
+        desc = CubeDescriptor.from_json(meta_path.read_text(encoding="utf-8"))
+        out = _as_dataarray(desc, coords_path)
+    except FileNotFoundError:  # não publicado (ou removido pela limpeza)
+        return None
+    try:
+        os.utime(meta_path)  # marca de uso para a limpeza LRU
+    except OSError:
+        pass
+    return out
+
+
+def _as_dataarray(desc: CubeDescriptor, coords_path: Path):
+    import dask.array as da
+    import xarray as xr
+
+    mm = np.load(desc.path, mmap_mode="r")
+    with np.load(coords_path, allow_pickle=False) as z:
+        coords = {k: z[k] for k in z.files}
+    # dask por cima do mmap: cada tarefa só toca as páginas do seu bloco
+    chunks = (1,) + mm.shape[1:] if mm.ndim == 3 else "auto"
+    data = da.from_array(mm, chunks=chunks, lock=False, asarray=False)
+    attrs = dict(desc.attrs or {})
+    crs = attrs.pop("crs", None)
+    out = xr.DataArray(data, dims=desc.dims, coords=coords, name=desc.name, attrs=attrs)
+    if crs:
+        try:
+            import odc.geo.xr  # noqa: F401
+
+            out = out.odc.assign_crs(crs)
+        except Exception:
+            out.attrs["crs"] = crs
+    return out
+
+
+def _write_block(block: np.ndarray, path: str, block_info=None) -> np.ndarray:
+    loc = block_info[0]["array-location"]
+    out = np.load(path, mmap_mode="r+")
+    out[tuple(slice(a, b) for a, b in loc)] = block
+    out.flush()
+    del out
+    return np.zeros((1,) * block.ndim, dtype=np.int8)
+
+
+def publish(
+    key: str,
+    cube,
+    root: Path | None = None,
+    compute: Callable | None = None,
+):
+    """Grava o DataArray (dask ou numpy) e devolve a versão anexada.
+
+    `compute` executa o grafo de gravação (p.ex. `compute.compute` com a
+    sessão); padrão: `dask.compute`.
+    """
+    import dask
+    import dask.array as da
+
+    root = root or shared_dir()
+    data_path, meta_path, coords_path = _paths(key, root)
+    tmp = _tmp(data_path, ".part.npy")
+    arr = cube.data
+    try:
+        out = np.lib.format.open_memmap(
+            tmp, mode="w+", dtype=arr.dtype, shape=arr.shape
+        )
+        del out
+        if not isinstance(arr, da.Array):
+            arr = da.from_array(arr)
+        marks = arr.map_blocks(
+            _write_block, str(tmp), dtype=np.int8, chunks=(1,) * arr.ndim
+        ).sum()
+        (compute or dask.compute)(marks)
+        tmp.replace(data_path)
+    except BaseException:
+        # Gravação falhou (ou foi cancelada): não deixa o .part ocupando disco
+        tmp.unlink(missing_ok=True)
+        raise
+
+    coords = {
+        str(k): np.asarray(v.values)
+        for k, v in cube.coords.items()
+        if v.dims and v.values.dtype != object
+    }
+    coords_tmp = _tmp(coords_path)
+    with open(coords_tmp, "wb") as fh:
+        np.savez(fh, **coords)
+    coords_tmp.replace(coords_path)
+    attrs = {k: v for k, v in cube.attrs.items() if isinstance(v, (str, int, float))}
+    odc = getattr(cube, "odc", None)
+    if odc is not None and odc.crs is not None:
+        attrs["crs"] = str(odc.crs)
+    desc = CubeDescriptor(
+        key=key,
+        path=str(data_path),
+        shape=tuple(int(n) for n in arr.shape),
+        dtype=str(arr.dtype),
+        dims=tuple(str(d) for d in cube.dims),
+        name=cube.name,
+        attrs=attrs,
+    )
+    meta_tmp = _tmp(meta_path)
+    meta_tmp.write_text(desc.to_json(), encoding="utf-8")
+    meta_tmp.replace(meta_path)  # descritor por último: só aparece completo
+    return _as_dataarray(desc, coords_path)
+
+
+def _cube_bytes(key: str, root: Path) -> int:
+    total = 0
+    for p in _paths(key, root):
+        try:
+            total += p.stat().st_size
+        except FileNotFoundError:
+            pass
+    return total
+
+
+def evict(
+    root: Path | None = None, max_mb: float | None = None, keep: tuple[str, ...] = ()
+) -> list[str]:
+    """Remove cubos menos usados (mtime do descritor) até caber no teto.
+
+    Também apaga `.part` antigos de escritores interrompidos. Devolve as
+    chaves removidas. Processos que já anexaram um cubo removido continuam
+    lendo pelo mmap (o arquivo só some de fato quando o último o fecha).
+    """
+    root = root or shared_dir()
+    mb = max_mb or float(os.getenv("SAAG_SHARED_CACHE_MB", DEFAULT_CACHE_MB))
+    limit = mb * 2**20
+    now = time.time()
+    for part in root.glob(".*.part*"):
+        try:
+            if now - part.stat().st_mtime > STALE_PART_S:
+                part.unlink()
+        except OSError:
+            pass
+
+    cubes = []
+    for meta in root.glob("*.json"):
+        try:
+            cubes.append((meta.stat().st_mtime, meta.stem))
+        except FileNotFoundError:
+            pass
+    total = sum(_cube_bytes(k, root) for _, k in cubes)
+    removed = []
+    for _, key in sorted(cubes):
+        if total <= limit:
+            break
+        if key in keep:
+            continue
+        size = _cube_bytes(key, root)
+        data_path, meta_path, coords_path = _paths(key, root)
+        try:
+            # Descritor primeiro: novos attach já não encontram o cubo
+            for p in (meta_path, data_path, coords_path):
+                p.unlink(missing_ok=True)
+        except OSError:  # p.ex. Windows com o arquivo mapeado: fica p/ depois
+            continue
+        total -= size
+        removed.append(key)
+    return removed
+
+
+def share(key: str, cube, max_mb: int | None = None, **kwargs):
+    """Anexa se já publicado; senão publica (se couber no limite) e anexa.
+
+    Cubos maiores que SAAG_SHARED_MAX_MB seguem sem compartilhamento. Duas
+    sessões com a mesma chave não gravam juntas: a segunda espera o lock e
+    anexa o cubo publicado pela primeira.
+    """
+    root = kwargs.get("root") or shared_dir()
+    kwargs["root"] = root
+    found = attach(key, root)
+    if found is not None:
+        return found
+    limit = max_mb or int(os.getenv("SAAG_SHARED_MAX_MB", DEFAULT_MAX_MB))
+    if cube.size * cube.dtype.itemsize > limit * 2**20:
+        return cube
+    with _key_lock(key, root):
+        found = attach(key, root)
+        if found is not None:
+            return found
+        out = publish(key, cube, **kwargs)
+    evict(root, keep=(key,))
+    return out
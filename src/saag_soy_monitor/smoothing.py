@@ -0,0 +1,180 @@
+"""Preenchimento de falhas e suavização de séries NDVI (Whittaker / Savitzky–Golay).
+
+Tudo opera sobre matrizes (séries x datas) de uma vez. O Whittaker resolve
+(W + λ·DᵀD) z = W y com uma fatoração de Cholesky em banda vetorizada sobre
+todas as séries (o laço é só sobre as datas), então pesos diferentes por série
+— p.ex. fração de pixels válidos — não exigem um sistema por série em Python.
+"""
+
+from __future__ import annotations
+
+from typing import Sequence
+
+import numpy as np
+import pandas as pd
+
+
+def regular_grid(dates: Sequence, step_days: int = 5) -> pd.DatetimeIndex:
+    """Grade regular de `step_days` dias cobrindo o intervalo das datas."""
+    d = pd.DatetimeIndex(dates)
+    return pd.date_range(d.min().normalize(), d.max().normalize(), freq=f"{step_days}D")
+
+
+def to_grid(
+    dates: Sequence,
+    values: np.ndarray,
+    grid: pd.DatetimeIndex,
+    weights: np.ndarray | None = None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Projeta observações (F, T) na grade (F, G) pela célula mais próxima.
+
+    Retorna (y, w): média ponderada das observações de cada célula e a soma dos
+    pesos (0 onde não há observação válida).
+    """
+    y = np.atleast_2d(np.asarray(values, dtype=np.float64))
+    w = np.ones_like(y) if weights is None else np.atleast_2d(weights).astype(float)
+    w = np.where(np.isfinite(y), np.nan_to_num(w), 0.0)
+    yv = np.where(w > 0, y, 0.0)
+
+    t = pd.DatetimeIndex(dates).values.astype("datetime64[s]").astype(np.int64)
+    g = grid.values.astype("datetime64[s]").astype(np.int64)
+    pos = np.zeros(len(t), dtype=np.int64)
+    if len(g) > 1:
+        pos = np.clip(np.searchsorted(g, t), 1, len(g) - 1)
+        pos = np.where(np.abs(t - g[pos - 1]) <= np.abs(g[pos] - t), pos - 1, pos)
+
+    # Matriz de atribuição (T, G): a agregação vira dois produtos de matrizes
+    assign = np.zeros((len(t), len(g)))
+    assign[np.arange(len(t)), pos] = 1.0
+    wsum = w @ assign
+    with np.errstate(invalid="ignore", divide="ignore"):
+        ygrid = np.where(wsum > 0, ((yv * w) @ assign) / wsum, np.nan)
+    return ygrid, wsum
+
+
+def fill_gaps(values: np.ndarray, x: Sequence[float] | None = None) -> np.ndarray:
+    """Interpolação linear dos NaN ao longo das datas (bordas: valor mais próximo)."""
+    y = np.atleast_2d(np.asarray(values, dtype=np.float64))
+    n = y.shape[1]
+    xs = np.arange(n, dtype=np.float64) if x is None else np.asarray(x, dtype=float)
+    valid = np.isfinite(y)
+    idx = np.arange(n)
+
+    prev = np.maximum.accumulate(np.where(valid, idx, -1), axis=1)
+    nxt = np.where(valid, idx, n)
+    nxt = np.minimum.accumulate(nxt[:, ::-1], axis=1)[:, ::-1]
+    prev_ok, next_ok = prev >= 0, nxt < n
+    p = np.where(prev_ok, prev, np.where(next_ok, nxt, 0))
+    q = np.where(next_ok, nxt, p)
+
+    yp = np.take_along_axis(y, p, axis=1)
+    yq = np.take_along_axis(y, q, axis=1)
+    span = xs[q] - xs[p]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        frac = np.where(span > 0, (xs[None, :] - xs[p]) / span, 0.0)
+    out = yp + frac * (yq - yp)
+    return np.where(valid, y, out)
+
+
+def _difference_bands(n: int, d: int) -> np.ndarray:
+    """Bandas inferiores de DᵀD (d+1, n): bands[k, i] = (DᵀD)[i+k, i]."""
+    D = np.diff(np.eye(n), n=d, axis=0)
+    DtD = D.T @ D
+    bands = np.zeros((d + 1, n))
+    for k in range(d + 1):
+        bands[k, : n - k] = np.diagonal(DtD, offset=-k)
+    return bands
+
+
+def _banded_cholesky_solve(ab: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Resolve A z = b para A simétrica definida positiva em banda, em lote.
+
+    `ab` (F, p+1, n) com ab[:, k, i] = A[i+k, i]; `b` (F, n).
+    """
+    nb, p1, n = ab.shape
+    p = p1 - 1
+    L = np.zeros_like(ab)  # L[:, m, j] = L[j+m, j]
+    for j in range(n):
+        s = ab[:, 0, j].copy()
+        for k in range(max(0, j - p), j):
+            s -= L[:, j - k, k] ** 2
+        ljj = np.sqrt(np.maximum(s, 1e-12))
+        L[:, 0, j] = ljj
+        for i in range(j + 1, min(j + p, n - 1) + 1):
+            s = ab[:, i - j, j].copy()
+            for k in range(max(0, i - p), j):
+                s -= L[:, i - k, k] * L[:, j - k, k]
+            L[:, i - j, j] = s / ljj
+
+    u = np.zeros_like(b)
+    for i in range(n):
+        s = b[:, i].copy()
+        for k in range(max(0, i - p), i):
+            s -= L[:, i - k, k] * u[:, k]
+        u[:, i] = s / L[:, 0, i]
+    z = np.zeros_like(b)
+    for i in range(n - 1, -1, -1):
+        s = u[:, i].copy()
+        for k in range(i + 1, min(i + p, n - 1) + 1):
+            s -= L[:, k - i, i] * z[:, k]
+        z[:, i] = s / L[:, 0, i]
+    return z
+
+
+def whittaker(
+    values: np.ndarray,
+    weights: np.ndarray | None = None,
+    lam: float = 10.0,
+    d: int = 2,
+) -> np.ndarray:
+    """Suavizador de Whittaker ponderado (séries com NaN recebem peso 0).
+
+    Séries com menos de d+1 observações válidas retornam NaN.
+    """
+    y = np.atleast_2d(np.asarray(values, dtype=np.float64))
+    w = np.ones_like(y) if weights is None else np.atleast_2d(weights).astype(float)
+    w = np.where(np.isfinite(y), np.nan_to_num(w), 0.0)
+    n = y.shape[1]
+    if n <= d:
+        return np.where(w > 0, y, np.nan)
+
+    ab = np.broadcast_to(lam * _difference_bands(n, d), (y.shape[0], d + 1, n)).copy()
+    ab[:, 0, :] += w
+    z = _banded_cholesky_solve(ab, w * np.where(w > 0, y, 0.0))
+    z[(w > 0).sum(axis=1) <= d] = np.nan
+    return z
+
+
+def savgol(
+    values: np.ndarray,
+    window: int = 7,
+    polyorder: int = 2,
+    x: Sequence[float] | None = None,
+) -> np.ndarray:
+    """Savitzky–Golay (scipy) sobre as séries com falhas já interpoladas."""
+    from scipy.signal import savgol_filter
+
+    y = fill_gaps(values, x)
+    n = y.shape[1]
+    window = min(window, n if n % 2 else n - 1)
+    if window <= polyorder:
+        return y
+    return savgol_filter(y, window, polyorder, axis=1, mode="interp")
+
+
+def smooth_series(
+    dates: Sequence,
+    values: np.ndarray,
+    weights: np.ndarray | None = None,
+    method: str = "whittaker",
+    step_days: int = 5,
+    lam: float = 10.0,
+) -> tuple[pd.DatetimeIndex, np.ndarray]:
+    """Reamostra para grade regular e suaviza: retorna (grade, matriz F x G)."""
+    grid = regular_grid(dates, step_days)
+    y, w = to_grid(dates, values, grid, weights)
+    if method == "whittaker":
+        return grid, whittaker(y, w, lam=lam)
+    if method == "savgol":
+        return grid, savgol(y)
+    raise ValueError(f"Método desconhecido: {method} (use whittaker ou savgol)")
@@ -0,0 +1,142 @@
+"""Busca STAC assíncrona com paginação concorrente e prefetch de assets.
+
+A paginação STAC é sequencial (cada página traz o token da próxima), então a
+concorrência vem de dividir o período em janelas e paginar cada janela em
+paralelo. Os itens chegam numa fila assim que cada página é lida — sem o corte
+silencioso de `max_items` — e o prefetch dos cabeçalhos/overviews dos
+primeiros itens começa enquanto as páginas seguintes ainda estão carregando.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from typing import Any, AsyncIterator, Callable, Sequence
+
+import pandas as pd
+
+PC_STAC_URL = "https://planetarycomputer.microsoft.com/api/stac/v1"
+HEADER_BYTES = 64 * 1024
+
+
+def split_interval(start: str, end: str, days: int = 31) -> list[tuple[str, str]]:
+    """Divide [start, end] em janelas de até `days` dias (datas ISO)."""
+    s, e = pd.Timestamp(start), pd.Timestamp(end)
+    out = []
+    while s <= e:
+        stop = min(s + pd.Timedelta(days=days - 1), e)
+        out.append((s.strftime("%Y-%m-%d"), stop.strftime("%Y-%m-%d")))
+        s = stop + pd.Timedelta(days=1)
+    return out
+
+
+async def iter_items(
+    bbox: Sequence[float],
+    start: str,
+    end: str,
+    collections: Sequence[str] = ("sentinel-2-l2a",),
+    query: dict | None = None,
+    url: str = PC_STAC_URL,
+    window_days: int = 31,
+    concurrency: int = 4,
+    page_size: int = 100,
+) -> AsyncIterator[Any]:
+    """Gera itens STAC à medida que as páginas chegam (sem duplicatas)."""
+    from pystac_client import Client
+
+    client = await asyncio.to_thread(Client.open, url)
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    sem = asyncio.Semaphore(concurrency)
+
+    def _paginate(dt: str) -> None:
+        search = client.search(
+            collections=list(collections),
+            bbox=list(bbox),
+            datetime=dt,
+            query=query,
+            limit=page_size,
+        )
+        for page in search.pages():
+            loop.call_soon_threadsafe(queue.put_nowait, list(page))
+
+    async def _window(s: str, e: str) -> None:
+        async with sem:
+            await asyncio.to_thread(_paginate, f"{s}/{e}")
+
+    tasks = [
+        asyncio.create_task(_window(s, e))
+        for s, e in split_interval(start, end, window_days)
+    ]
+    done = asyncio.gather(*tasks)
+    done.add_done_callback(lambda _: queue.put_nowait(None))
+
+    seen: set[str] = set()
+    while True:
+        page = await queue.get()
+        if page is None:
+            break
+        for item in page:
+            if item.id not in seen:
+                seen.add(item.id)
+                yield item
+    await done  # propaga erros das janelas
+
+
+def prefetch_headers(
+    item: Any, assets: Sequence[str], reader: Any = None, nbytes: int = HEADER_BYTES
+) -> None:
+    """Lê os primeiros bytes (cabeçalho IFD + overviews pequenas) dos assets.
+
+    Os bytes ficam no cache de blocos de `cog.RangeReader`: só adiantam para
+    quem lê por `cog.open_cog`, não para o GDAL do `stac_load`.
+    """
+    from .cog import RangeReader
+
+    reader = reader or RangeReader()
+    for key in assets:
+        asset = item.assets.get(key)
+        if asset is not None and asset.href.startswith(("http://", "https://")):
+            reader.read(asset.href, 0, nbytes)
+
+
+async def collect_items(
+    bbox: Sequence[float],
+    start: str,
+    end: str,
+    sign: Callable[[Any], Any] | None = None,
+    prefetch_assets: Sequence[str] = (),
+    prefetch_concurrency: int = 8,
+    **kwargs,
+) -> list:
+    """Coleta todos os itens (ordenados por data), assinando e iniciando o
+    prefetch de cada item assim que ele chega."""
+    sem = asyncio.Semaphore(prefetch_concurrency)
+    reader = None
+    if prefetch_assets:
+        from .cog import RangeReader
+
+        reader = RangeReader()
+
+    async def _prefetch(item) -> None:
+        async with sem:
+            try:
+                await asyncio.to_thread(prefetch_headers, item, prefetch_assets, reader)
+            except Exception:
+                pass  # prefetch é só otimização
+
+    items, pending = [], []
+    async for item in iter_items(bbox, start, end, **kwargs):
+        if sign is not None:
+            item = sign(item)
+        items.append(item)
+        if prefetch_assets:
+            pending.append(asyncio.create_task(_prefetch(item)))
+    if pending:
+        await asyncio.gather(*pending)
+    items.sort(key=lambda it: (str(it.datetime), it.id))
+    return items
+
+
+def search_items(bbox: Sequence[float], start: str, end: str, **kwargs) -> list:
+    """Versão síncrona de `collect_items` (para as páginas Streamlit)."""
+    return asyncio.run(collect_items(bbox, start, end, **kwargs))
@@ -0,0 +1,337 @@
+"""Servidor local de tiles XYZ (NDVI/EVI) para sobrepor no mapa folium.
+
+Cada tile é renderizado sob demanda a partir de um cubo em cache (numpy/dask)
+ou de um COG: só a janela de pixels que cobre o tile é lida, nunca o raster
+inteiro. Tiles prontos ficam num cache LRU e são servidos com ETag, de modo
+que o navegador revalida com 304 sem custo de renderização.
+
+O mesmo servidor entrega arquivos exportados grandes (/files/<token>/<nome>)
+em fluxo, sem passar o conteúdo pela memória do Streamlit.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import math
+import os
+import shutil
+import threading
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Protocol, Sequence
+
+import numpy as np
+
+from .render import colorize, encode_image
+
+TILE_SIZE = 256
+MAX_ZOOM = 24
+FILE_CHUNK = 1 << 20  # bytes por escrita ao servir arquivos
+_ORIGIN = 20037508.342789244  # meia circunferência em EPSG:3857 (m)
+
+
+def tile_bounds_3857(z: int, x: int, y: int) -> tuple[float, float, float, float]:
+    """Limites (minx, miny, maxx, maxy) do tile em Web Mercator."""
+    size = 2 * _ORIGIN / (1 << z)
+    minx = -_ORIGIN + x * size
+    maxy = _ORIGIN - y * size
+    return minx, maxy - size, minx + size, maxy
+
+
+def tile_lonlat(z: int, x: int, y: int, size: int = TILE_SIZE):
+    """Longitudes (colunas) e latitudes (linhas) dos centros de pixel do tile.
+
+    Em Web Mercator o tile é separável: lon depende só da coluna e lat só da linha.
+    """
+    minx, miny, maxx, maxy = tile_bounds_3857(z, x, y)
+    step = (maxx - minx) / size
+    mx = minx + (np.arange(size) + 0.5) * step
+    my = maxy - (np.arange(size) + 0.5) * step
+    lon = np.degrees(mx / 6378137.0)
+    lat = np.degrees(2 * np.arctan(np.exp(my / 6378137.0)) - math.pi / 2)
+    return lon, lat
+
+
+class TileSource(Protocol):
+    vmin: float
+    vmax: float
+    version: str
+
+    def read_tile(self, z: int, x: int, y: int) -> np.ndarray: ...
+
+
+def _materialize(arr: Any) -> np.ndarray:
+    if hasattr(arr, "compute"):
+        arr = arr.compute()
+    return np.asarray(arr, dtype=np.float32)
+
+
+@dataclass
+class ArraySource:
+    """Raster 2D regular (numpy, dask ou xarray) com centros de pixel `xs`/`ys`.
+
+    Para dask, só os chunks que cruzam a janela do tile são calculados.
+    """
+
+    data: Any
+    xs: Sequence[float]
+    ys: Sequence[float]
+    crs: str = "EPSG:4326"
+    vmin: float = 0.3
+    vmax: float = 0.9
+    version: str = ""
+    _transformer: Any = field(default=None, init=False, repr=False)
+
+    @classmethod
+    def from_dataarray(cls, da, crs: str | None = None, **kwargs) -> "ArraySource":
+        """Cria a fonte a partir de um DataArray 2D (dims y, x)."""
+        if crs is None:
+            odc = getattr(da, "odc", None)
+            crs = (
+                str(odc.crs) if odc is not None and odc.crs is not None else "EPSG:4326"
+            )
+        return cls(da.data, da["x"].values, da["y"].values, crs=crs, **kwargs)
+
+    def __post_init__(self) -> None:
+        xs = np.asarray(self.xs, dtype=np.float64)
+        ys = np.asarray(self.ys, dtype=np.float64)
+        self._x0, self._dx = xs[0], (xs[1] - xs[0]) if xs.size > 1 else 1.0
+        self._y0, self._dy = ys[0], (ys[1] - ys[0]) if ys.size > 1 else -1.0
+        self._shape = (ys.size, xs.size)
+        if self.crs.upper() not in ("EPSG:4326", "OGC:CRS84"):
+            from pyproj import Transformer
+
+            self._transformer = Transformer.from_crs(
+                "EPSG:4326", self.crs, always_xy=True
+            )
+
+    def _pixel_index(self, lon: np.ndarray, lat: np.ndarray):
+        if self._transformer is None:
+            cols = np.floor((lon - self._x0) / self._dx + 0.5).astype(np.int64)
+            rows = np.floor((lat - self._y0) / self._dy + 0.5).astype(np.int64)
+            return rows[:, None], cols[None, :]
+        lon2, lat2 = np.meshgrid(lon, lat)
+        px, py = self._transformer.transform(lon2, lat2)
+        cols = np.floor((px - self._x0) / self._dx + 0.5).astype(np.int64)
+        rows = np.floor((py - self._y0) / self._dy + 0.5).astype(np.int64)
+        return rows, cols
+
+    def read_tile(self, z: int, x: int, y: int) -> np.ndarray:
+        lon, lat = tile_lonlat(z, x, y)
+        rows, cols = self._pixel_index(lon, lat)
+        rows, cols = np.broadcast_arrays(rows, cols)
+        h, w = self._shape
+        inside = (rows >= 0) & (rows < h) & (cols >= 0) & (cols < w)
+        out = np.full((TILE_SIZE, TILE_SIZE), np.nan, dtype=np.float32)
+        if not inside.any():
+            return out
+        r0, r1 = int(rows[inside].min()), int(rows[inside].max()) + 1
+        c0, c1 = int(cols[inside].min()), int(cols[inside].max()) + 1
+        # Em zoom baixo o tile cobre muitos pixels: lê a janela com passo
+        step = max(1, min(r1 - r0, c1 - c0) // TILE_SIZE)
+        window = _materialize(self.data[r0:r1:step, c0:c1:step])
+        out[inside] = window[(rows[inside] - r0) // step, (cols[inside] - c0) // step]
+        return out
+
+
+@dataclass
+class CogSource:
+    """COG local ou remoto lido via rasterio; usa overviews em zoom baixo."""
+
+    path: str
+    band: int = 1
+    vmin: float = 0.3
+    vmax: float = 0.9
+    version: str = ""
+
+    def read_tile(self, z: int, x: int, y: int) -> np.ndarray:
+        import rasterio
+        from rasterio.enums import Resampling
+        from rasterio.transform import from_bounds
+        from rasterio.vrt import WarpedVRT
+
+        bounds = tile_bounds_3857(z, x, y)
+        with rasterio.open(self.path) as src:
+            with WarpedVRT(
+                src,
+                crs="EPSG:3857",
+                transform=from_bounds(*bounds, TILE_SIZE, TILE_SIZE),
+                width=TILE_SIZE,
+                height=TILE_SIZE,
+                resampling=Resampling.nearest,
+                src_nodata=src.nodata,
+                nodata=np.nan,
+                dtype="float32",
+            ) as vrt:
+                return vrt.read(self.band)
+
+
+class _LRU:
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._data:
+                return None
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def put(self, key, value) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+
+class TileServer:
+    """Servidor HTTP em thread daemon: /tiles/<camada>/<z>/<x>/<y>.png e
+    /files/<token>/<nome> (arquivos publicados com `publish_file`)."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, cache_size: int = 2048):
+        self.layers: dict[str, TileSource] = {}
+        self.files: dict[str, Path] = {}
+        self._files_lock = threading.Lock()
+        self.cache = _LRU(cache_size)
+        self._httpd = ThreadingHTTPServer((host, port), self._handler())
+        self._httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+
+    @property
+    def base_url(self) -> str:
+        public = os.getenv("SAAG_TILE_URL", "")
+        if public:
+            return public.rstrip("/")
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def register(self, name: str, source: TileSource) -> str:
+        """Registra (ou substitui) uma camada e retorna o template de URL XYZ."""
+        self.layers[name] = source
+        return f"{self.base_url}/tiles/{name}/{{z}}/{{x}}/{{y}}.png"
+
+    def publish_file(self, path: Path) -> str:
+        """Publica `path` para download e retorna a URL (token por arquivo).
+
+        Só arquivos publicados são servidos; o token aleatório evita que a URL
+        de uma sessão seja adivinhada por outra.
+        """
+        path = Path(path).resolve()
+        with self._files_lock:
+            token = next((t for t, p in self.files.items() if p == path), None)
+            if token is None:
+                token = uuid.uuid4().hex
+                self.files[token] = path
+        return f"{self.base_url}/files/{token}/{path.name}"
+
+    def etag(self, name: str, z: int, x: int, y: int) -> str:
+        src = self.layers[name]
+        key = f"{name}:{src.version}:{src.vmin}:{src.vmax}:{z}/{x}/{y}"
+        return '"' + hashlib.sha1(key.encode("utf-8")).hexdigest()[:20] + '"'
+
+    def render(self, name: str, z: int, x: int, y: int) -> tuple[str, bytes]:
+        etag = self.etag(name, z, x, y)
+        hit = self.cache.get(etag)
+        if hit is not None:
+            return etag, hit
+        src = self.layers[name]
+        png = encode_image(colorize(src.read_tile(z, x, y), src.vmin, src.vmax))
+        self.cache.put(etag, png)
+        return etag, png
+
+    def shutdown(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args) -> None:  # silencia o log padrão
+                pass
+
+            def send_file(self, token: str) -> None:
+                path = server.files.get(token)
+                try:
+                    fh = open(path, "rb") if path is not None else None
+                except OSError:
+                    fh = None
+                if fh is None:
+                    self.send_error(404)
+                    return
+                with fh:
+                    size = os.fstat(fh.fileno()).st_size
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/octet-stream")
+                    self.send_header("Content-Length", str(size))
+                    self.send_header(
+                        "Content-Disposition", f'attachment; filename="{path.name}"'
+                    )
+                    self.end_headers()
+                    shutil.copyfileobj(fh, self.wfile, FILE_CHUNK)
+
+            def do_GET(self) -> None:
+                parts = self.path.split("?", 1)[0].strip("/").split("/")
+                if len(parts) == 3 and parts[0] == "files":
+                    self.send_file(parts[1])
+                    return
+                try:
+                    kind, name, z, x, y = parts
+                    if kind != "tiles":
+                        raise KeyError(kind)
+                    z, x, y = int(z), int(x), int(y.split(".")[0])
+                    if name not in server.layers:
+                        raise KeyError(name)
+                    # Fora da pirâmide XYZ: não existe tile (nem renderização)
+                    if not 0 <= z <= MAX_ZOOM:
+                        raise ValueError(z)
+                    if not (0 <= x < 1 << z and 0 <= y < 1 << z):
+                        raise ValueError((x, y))
+                except (ValueError, KeyError):
+                    self.send_error(404)
+                    return
+
+                etag = server.etag(name, z, x, y)
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                    return
+                try:
+                    etag, body = server.render(name, z, x, y)
+                except Exception as exc:
+                    self.send_error(500, str(exc))
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "image/png")
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("ETag", etag)
+                self.send_header("Cache-Control", "no-cache")
+                self.send_header("Access-Control-Allow-Origin", "*")
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+
+_server: TileServer | None = None
+_server_lock = threading.Lock()
+
+
+def get_tile_server() -> TileServer:
+    """Servidor único por processo (compartilhado entre sessões do Streamlit).
+
+    Porta fixa via SAAG_TILE_PORT; URL pública (proxy) via SAAG_TILE_URL.
+    """
+    global _server
+    with _server_lock:
+        if _server is None:
+            _server = TileServer(port=int(os.getenv("SAAG_TILE_PORT", "0")))
+        return _server
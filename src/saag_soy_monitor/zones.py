@@ -0,0 +1,212 @@
+"""Planejamento por zona UTM para AOIs que atravessam a divisa de zonas.
+
+Com `crs=None` o `stac_load` usa o CRS do primeiro item, e os itens da outra
+zona (p.ex. 19/20 em Rondônia) são reamostrados. Aqui a AOI é cortada nas
+faixas de 6° das zonas UTM; cada parte é carregada no CRS nativo dos seus
+itens, sem warp, e reduzida a estatísticas parciais somáveis (contagem, soma
+e histograma por data). As partes são combinadas depois: contagem e média
+saem exatas, e a mediana sai do histograma na resolução do NDVI int16
+(1e-4).
+"""
+
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass
+from typing import Any, Callable, Mapping, Sequence
+
+import numpy as np
+import pandas as pd
+import shapely
+from shapely.geometry import box
+
+HIST_MIN = -1.0
+HIST_STEP = 1e-4
+HIST_BINS = int(round(2.0 / HIST_STEP)) + 1
+
+
+@dataclass
+class ZonePart:
+    epsg: int
+    geometry: Any  # parte da AOI (EPSG:4326)
+    items: list
+
+
+def _get(item: Any, key: str, default=None):
+    if isinstance(item, Mapping):
+        return item.get(key, default)
+    return getattr(item, key, default)
+
+
+def item_epsg(item: Any) -> int | None:
+    props = _get(item, "properties") or {}
+    if props.get("proj:epsg"):
+        return int(props["proj:epsg"])
+    if props.get("proj:code"):
+        return int(str(props["proj:code"]).split(":")[-1])
+    return None
+
+
+def zone_strips(aoi) -> dict[int, Any]:
+    """Partes da AOI por zona UTM (faixa de 6° x hemisfério)."""
+    minx, miny, maxx, maxy = aoi.bounds
+    out = {}
+    z0 = int(math.floor((minx + 180.0) / 6.0)) + 1
+    z1 = int(math.floor((maxx + 180.0) / 6.0)) + 1
+    for zone in range(max(z0, 1), min(z1, 60) + 1):
+        west = -180.0 + (zone - 1) * 6.0
+        for base, lat0, lat1 in ((32600, 0.0, 90.0), (32700, -90.0, 0.0)):
+            part = shapely.intersection(aoi, box(west, lat0, west + 6.0, lat1))
+            if not part.is_empty and part.area > 0:
+                out[base + zone] = part
+    return out
+
+
+def plan_zones(items: Sequence, aoi, min_gain: float = 0.01) -> list[ZonePart]:
+    """Uma parte por zona, com as cenas escolhidas para ela dia a dia.
+
+    Recebe os itens da busca ainda sem deduplicação: a seleção por dia solar
+    (`select_scenes`) roda em cada parte, com os itens da zona nativa na
+    frente. Itens de outra zona só entram nas datas/trechos que os nativos
+    não cobrem (só então há reamostragem).
+    """
+    from .scenes import select_scenes
+
+    parts = []
+    for epsg, geom in zone_strips(aoi).items():
+        sel = select_scenes(
+            list(items), geom, min_gain, prefer=lambda it, e=epsg: item_epsg(it) == e
+        )
+        if sel.items:
+            parts.append(ZonePart(epsg, geom, sel.items))
+    return parts
+
+
+def _block_hist(block: np.ndarray) -> np.ndarray:
+    """(t, y, x) -> (t, 1, 1, bins+2): contagem, soma e histograma por data."""
+    t = block.shape[0]
+    flat = block.reshape(t, -1).astype(np.float32)
+    ok = np.isfinite(flat)
+    out = np.zeros((t, 1, 1, HIST_BINS + 2), dtype=np.float64)
+    out[:, 0, 0, 0] = ok.sum(axis=1)
+    out[:, 0, 0, 1] = np.where(ok, flat, 0.0).sum(axis=1, dtype=np.float64)
+    idx = np.clip(np.rint((flat - HIST_MIN) / HIST_STEP), 0, HIST_BINS - 1)
+    for i in range(t):
+        out[i, 0, 0, 2:] = np.bincount(
+            idx[i][ok[i]].astype(np.int64), minlength=HIST_BINS
+        )
+    return out
+
+
+@dataclass
+class PartialStats:
+    dates: pd.DatetimeIndex
+    count: np.ndarray  # (T,) pixels válidos
+    total: np.ndarray  # (T,) soma do NDVI
+    hist: np.ndarray  # (T, HIST_BINS)
+    n_pixels: int  # pixels dentro da parte (válidos ou não)
+
+    def merge(self, other: "PartialStats") -> "PartialStats":
+        """Soma duas partes, alinhando pelas datas (união)."""
+        dates = self.dates.union(other.dates)
+        a = pd.Index(self.dates).get_indexer(dates)
+        b = pd.Index(other.dates).get_indexer(dates)
+
+        def take(x, pos):
+            out = np.zeros((len(dates),) + x.shape[1:], dtype=x.dtype)
+            out[pos >= 0] = x[pos[pos >= 0]]
+            return out
+
+        return PartialStats(
+            dates,
+            take(self.count, a) + take(other.count, b),
+            take(self.total, a) + take(other.total, b),
+            take(self.hist, a) + take(other.hist, b),
+            self.n_pixels + other.n_pixels,
+        )
+
+    def mean(self) -> np.ndarray:
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(self.count > 0, self.total / self.count, np.nan)
+
+    def median(self) -> np.ndarray:
+        cum = np.cumsum(self.hist, axis=1)
+        half = cum[:, -1:] / 2.0
+        pos = np.minimum((cum < half).sum(axis=1), HIST_BINS - 1)
+        return np.where(self.count > 0, HIST_MIN + pos * HIST_STEP, np.nan)
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame(
+            {
+                "date": self.dates,
+                "NDVI": self.median(),
+                "NDVI_mean": self.mean(),
+                "valid_frac": self.count / max(self.n_pixels, 1),
+            }
+        )
+
+
+def partial_stats(ndvi, n_pixels: int, compute: Callable | None = None) -> PartialStats:
+    """Estatísticas parciais de um cubo NDVI (time, y, x) float com NaN."""
+    import dask.array as da
+
+    data = ndvi.transpose("time", "y", "x").data
+    if not isinstance(data, da.Array):
+        data = da.from_array(data, chunks=(1,) + data.shape[1:])
+    blocks = data.map_blocks(
+        _block_hist,
+        new_axis=3,
+        chunks=(data.chunks[0], (1,) * len(data.chunks[1]), (1,) * len(data.chunks[2]))
+        + ((HIST_BINS + 2,),),
+        dtype=np.float64,
+    ).sum(axis=(1, 2))
+    if compute is None:
+        import dask
+
+        compute = dask.compute
+    (res,) = compute(blocks)
+    return PartialStats(
+        pd.DatetimeIndex(ndvi["time"].values),
+        res[:, 0].astype(np.int64),
+        res[:, 1],
+        res[:, 2:].astype(np.int64),
+        int(n_pixels),
+    )
+
+
+def zone_series(
+    parts: Sequence[ZonePart],
+    bands: Sequence[str],
+    resolution_m: float,
+    load: Callable,
+    chunks: Callable | None = None,
+    compute: Callable | None = None,
+) -> pd.DataFrame:
+    """Série NDVI de uma AOI multi-zona: cada parte no seu CRS nativo.
+
+    `load` é o `stac_load`; `chunks(bbox, res, n_datas)` escolhe os chunks.
+    """
+    from .compact import decode, ndvi_compact
+    from .masking import mask_array, rasterize_mask
+
+    stats = None
+    for part in parts:
+        n_times = len({str(_get(it, "datetime"))[:10] for it in part.items})
+        ds = load(
+            part.items,
+            assets=list(bands),
+            bbox=part.geometry.bounds,
+            crs=f"EPSG:{part.epsg}",
+            resolution=resolution_m,
+            chunks=chunks(part.geometry.bounds, resolution_m, n_times)
+            if chunks
+            else {"time": 1, "x": 1024, "y": 1024},
+            groupby="solar_day",
+            preserve_original_order=True,  # menos nublada primeiro no mosaico
+        )
+        mask = rasterize_mask(part.geometry, ds)
+        red, nir = (mask_array(ds[b], mask) for b in bands)
+        ndvi = decode(ndvi_compact(red, nir, "int16"))
+        s = partial_stats(ndvi, int(mask.sum()), compute)
+        stats = s if stats is None else stats.merge(s)
+    return stats.to_frame() if stats is not None else pd.DataFrame()
@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+
+from saag_soy_monitor import anomaly
+
+
+def _series(seed: int = 0, n_fields: int = 4, n_dates: int = 30) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    x = 0.6 + 0.1 * rng.standard_normal((n_fields, n_dates))
+    x[rng.random(x.shape) < 0.15] = np.nan  # datas sem observação
+    x[1, 20:23] -= 0.5  # queda persistente
+    return x
+
+
+def _rolling_reference(x, window, min_periods):
+    """Média/desvio das `window` datas anteriores via pandas (ddof=1)."""
+    df = pd.DataFrame(x.T).shift(1)
+    roll = df.rolling(window, min_periods=max(min_periods, 2))
+    return roll.mean().to_numpy().T, roll.std().to_numpy().T
+
+
+def test_zscores_match_a_rolling_reference():
+    x = _series()
+    res = anomaly.zscores(x, window=6, min_periods=3)
+    mean, std = _rolling_reference(x, 6, 3)
+    np.testing.assert_allclose(res.baseline, mean, rtol=1e-9, equal_nan=True)
+    np.testing.assert_allclose(res.spread, std, rtol=1e-7, equal_nan=True)
+    np.testing.assert_allclose(res.zscore, (x - mean) / std, rtol=1e-7, equal_nan=True)
+
+
+def test_incremental_update_equals_full_recompute():
+    x = _series(1)
+    kw = dict(window=6, min_periods=3, threshold=-1.5, persistence=2)
+    full = anomaly.zscores(x, **kw)
+
+    _, state = anomaly.init_state(np.arange(4), x[:, :18], **kw)
+    for a, b in [(18, 19), (19, 25), (25, 30)]:  # lotes de 1, 6 e 5 datas
+        part, state = anomaly.update(state, x[:, a:b])
+        np.testing.assert_allclose(part.baseline, full.baseline[:, a:b], equal_nan=True)
+        np.testing.assert_allclose(part.zscore, full.zscore[:, a:b], equal_nan=True)
+        np.testing.assert_array_equal(part.breaks, full.breaks[:, a:b])
+    assert full.breaks[1].any()
+
+
+def test_too_few_previous_dates_give_no_score():
+    x = np.array([[0.5, 0.7, 0.1, 0.6, np.nan, np.nan, np.nan, 0.2]])
+    res = anomaly.zscores(x, window=4, min_periods=3)
+    # t < 3: menos de 3 datas anteriores; t=7: só 1 válida na janela (3..6)
+    assert np.isnan(res.zscore[0, [0, 1, 2, 7]]).all()
+    assert np.isfinite(res.zscore[0, 3])
+    assert not res.breaks[0, [0, 1, 2, 7]].any()
+
+    # Histórico mais curto que a janela: o update também não pontua
+    _, state = anomaly.init_state(["a"], x[:, :2], window=4, min_periods=3)
+    part, _ = anomaly.update(state, np.array([0.1]))
+    assert np.isnan(part.zscore).all() and not part.breaks.any()
+
+
+def test_zero_variance_window_is_not_a_break():
+    rng = np.random.default_rng(2)
+    x = np.concatenate([rng.uniform(0.2, 0.9, (50, 40)), np.ones((50, 8))], axis=1)
+    x *= rng.uniform(0.3, 0.9, (50, 1))  # janela final constante, valor arbitrário
+    x[:, -1] -= 0.2
+    res = anomaly.zscores(x, window=6, min_periods=3)
+    # Somas acumuladas deixam resíduo de arredondamento: não pode virar desvio
+    np.testing.assert_array_equal(res.spread[:, -1], 0.0)
+    assert np.isnan(res.zscore[:, -1]).all()
+    assert not res.breaks[:, -1].any()
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from saag_soy_monitor.chunks import COG_BLOCK, plan_chunks
+
+BUDGET = dict(budget_mb=1024, workers=4)
+
+
+def test_small_aoi_is_one_spatial_chunk():
+    c = plan_chunks(1200, 900, 40, **BUDGET)
+    assert (c["y"], c["x"]) == (900, 1200) and c["time"] > 1
+
+
+def test_mask_keeps_a_tile_aligned_split():
+    c = plan_chunks(1200, 900, 40, masked=True, **BUDGET)
+    assert (c["y"], c["x"]) == (COG_BLOCK, COG_BLOCK)
+    assert 1 < c["time"] <= 40
+    # AOI menor que um bloco: nada a descartar, continua inteira
+    assert plan_chunks(300, 200, 40, masked=True, **BUDGET)["x"] == 300
+
+
+def test_large_aoi_split_does_not_depend_on_mask():
+    big = dict(width=20_000, height=20_000, n_times=10, **BUDGET)
+    assert plan_chunks(**big) == plan_chunks(masked=True, **big)
+
+
+def test_masked_chunks_outside_the_polygon_are_not_read():
+    da = pytest.importorskip("dask.array")
+    xr = pytest.importorskip("xarray")
+    from saag_soy_monitor.masking import mask_array
+
+    t, h, w = 3, 1200, 1200
+    c = plan_chunks(w, h, t, masked=True, **BUDGET)
+    read = []
+
+    def load(block, block_info=None):
+        read.append(tuple(block_info[None]["chunk-location"]))
+        return np.ones(block.shape, dtype="uint16")
+
+    src = da.zeros((t, h, w), chunks=(c["time"], c["y"], c["x"]), dtype="uint16")
+    arr = xr.DataArray(src.map_blocks(load, dtype="uint16"), dims=("time", "y", "x"))
+    mask = np.zeros((h, w), dtype=bool)
+    mask[:300, :300] = True  # polígono no canto: só o primeiro bloco espacial
+
+    out = mask_array(arr, mask).sum().compute()
+    assert int(out) == t * 300 * 300
+    assert {loc[1:] for loc in read} == {(0, 0)}
@@ -0,0 +1,129 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from saag_soy_monitor.climatology import ClimatologyIndex
+
+DATES = pd.date_range("2024-10-01", periods=12, freq="5D")
+
+
+def _values(level: float, n_fields: int = 2) -> np.ndarray:
+    return np.full((n_fields, len(DATES)), level) + np.linspace(0, 0.1, len(DATES))
+
+
+def test_seasons_accumulate_and_persist(tmp_path):
+    idx = ClimatologyIndex(tmp_path)
+    idx.add_season("2022/23", ["a", "b"], DATES, _values(0.3))
+    idx.add_season("2023/24", ["a", "b"], DATES, _values(0.7))
+
+    back = ClimatologyIndex.open(tmp_path)
+    assert back.seasons == ["2022/23", "2023/24"]
+    p = back.percentiles(["a"], DATES[:1], q=(10, 90))
+    assert 0.28 <= p[0, 0, 0] <= 0.32 and 0.68 <= p[0, 0, 1] <= 0.72
+    assert back.rank(["b"], DATES[:1], np.array([[0.5]]))[0, 0] == pytest.approx(50.0)
+
+
+def test_re_adding_a_season_requires_replace(tmp_path):
+    idx = ClimatologyIndex(tmp_path)
+    idx.add_season("2024/25", ["a", "b"], DATES, _values(0.3))
+    with pytest.raises(ValueError, match="replace=True"):
+        idx.add_season("2024/25", ["a", "b"], DATES, _values(0.6))
+
+
+def test_replace_swaps_the_season_counts(tmp_path):
+    ref = ClimatologyIndex(tmp_path / "ref")
+    ref.add_season("2023/24", ["a", "b"], DATES, _values(0.3))
+    ref.add_season("2024/25", ["a", "b", "c"], DATES, _values(0.6, 3))
+
+    idx = ClimatologyIndex(tmp_path / "idx")
+    idx.add_season("2023/24", ["a", "b"], DATES, _values(0.3))
+    partial = _values(0.5)
+    partial[:, 6:] = np.nan  # lote interrompido no meio da safra
+    idx.add_season("2024/25", ["a", "b"], DATES, partial)
+    idx = ClimatologyIndex.open(tmp_path / "idx")
+    idx.add_season("2024/25", ["a", "b", "c"], DATES, _values(0.6, 3), replace=True)
+
+    assert idx.seasons == ["2023/24", "2024/25"]
+    assert idx.field_ids == ["a", "b", "c"]
+    np.testing.assert_array_equal(
+        ClimatologyIndex.open(tmp_path / "idx")._counts, ref._counts
+    )
+
+
+def test_missing_values_are_skipped_without_warnings(tmp_path):
+    import warnings
+
+    values = _values(0.4)
+    values[0, ::2] = np.nan
+    idx = ClimatologyIndex(tmp_path)
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        idx.add_season("2024/25", ["a", "b"], DATES, values)
+    counts = np.asarray(idx._counts)
+    assert counts[0].sum() == np.isfinite(values[0]).sum() == len(DATES) // 2
+    assert counts[1].sum() == len(DATES)
+
+
+def test_counts_above_uint16_survive_replace(tmp_path):
+    many = pd.DatetimeIndex(["2024-11-01"] * 70_000)
+    idx = ClimatologyIndex(tmp_path)
+    idx.add_season("2023/24", ["a"], many, np.full((1, len(many)), 0.5))
+    idx.add_season("2024/25", ["a"], DATES, _values(0.3, 1))
+    cell = (0, idx._doy_bin(many[:1])[0], int((0.5 - idx.ndvi_min) / idx.ndvi_step))
+    assert ClimatologyIndex.open(tmp_path)._counts[cell] == 70_000
+
+    idx.add_season("2023/24", ["a"], many[:10], np.full((1, 10), 0.5), replace=True)
+    back = ClimatologyIndex.open(tmp_path)
+    assert back._counts.dtype == np.uint32
+    assert back._counts[cell] == 10
+    assert back._counts.sum() == 10 + len(DATES)
+    assert not list(tmp_path.glob(".*.part"))  # temporário publicado, não largado
+
+
+def test_replace_refuses_saturated_legacy_counts(tmp_path):
+    idx = ClimatologyIndex(tmp_path)
+    idx.add_season("2024/25", ["a"], DATES, _values(0.3, 1))
+    legacy = np.asarray(idx._counts).astype(np.uint16)
+    legacy[0, 0, 0] = np.iinfo(np.uint16).max
+    np.save(tmp_path / "counts.npy", legacy)
+
+    idx = ClimatologyIndex.open(tmp_path)
+    with pytest.raises(ValueError, match="saturadas"):
+        idx.add_season("2024/25", ["a"], DATES, _values(0.4, 1), replace=True)
+
+
+def test_failed_update_leaves_the_index_untouched(tmp_path):
+    idx = ClimatologyIndex(tmp_path)
+    idx.add_season("2024/25", ["a"], DATES, _values(0.3, 1))
+    before = np.array(idx._counts)
+    # Contagens que não batem com a safra guardada: a subtração ficaria negativa
+    np.save(tmp_path / "counts.npy", np.zeros_like(before))
+
+    idx = ClimatologyIndex.open(tmp_path)
+    with pytest.raises(ValueError, match="não batem"):
+        idx.add_season("2024/25", ["a", "b"], DATES, _values(0.4), replace=True)
+    assert idx.field_ids == ["a"]
+    assert not list(tmp_path.glob(".*.part"))
+
+
+def test_concurrent_writers_keep_every_season(tmp_path):
+    from concurrent.futures import ThreadPoolExecutor
+
+    ClimatologyIndex(tmp_path).add_season("base", ["a", "b"], DATES, _values(0.3))
+    # Cada escritor abriu o índice antes dos outros gravarem (estado velho)
+    writers = [ClimatologyIndex.open(tmp_path) for _ in range(6)]
+    with ThreadPoolExecutor(6) as pool:
+        list(
+            pool.map(
+                lambda i: writers[i].add_season(
+                    f"s{i}", ["a", f"n{i}"], DATES, _values(0.5)
+                ),
+                range(6),
+            )
+        )
+
+    idx = ClimatologyIndex.open(tmp_path)
+    assert sorted(idx.seasons) == ["base"] + [f"s{i}" for i in range(6)]
+    assert sorted(idx.field_ids) == ["a", "b"] + [f"n{i}" for i in range(6)]
+    assert idx._counts.sum() == 7 * 2 * len(DATES)
+    assert idx._counts[idx._row_index(["a"])].sum() == 7 * len(DATES)
@@ -0,0 +1,143 @@
+import threading
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pytest
+
+from saag_soy_monitor.cog import BlockCache, RangeReader
+
+
+class _RangeHandler(SimpleHTTPRequestHandler):
+    """http.server com suporte a `Range: bytes=a-b` e contagem de GETs."""
+
+    requests: list = []
+    honour_range = True
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        path = self.translate_path(self.path.split("?")[0])
+        with open(path, "rb") as fh:
+            body = fh.read()
+        rng = self.headers.get("Range")
+        type(self).requests.append(rng)
+        if rng and self.honour_range:
+            a, b = (int(v) for v in rng.split("=")[1].split("-"))
+            b = min(b, len(body) - 1)
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {a}-{b}/{len(body)}")
+            body = body[a : b + 1]
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def server(tmp_path):
+    root = tmp_path / "www"
+    root.mkdir()
+    handler = type("Handler", (_RangeHandler,), {"requests": []})
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), partial(handler, directory=root))
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield root, f"http://127.0.0.1:{httpd.server_port}", handler
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def _reader(tmp_path, **kw):
+    return RangeReader(BlockCache(tmp_path / "cache", **kw), block_size=1024)
+
+
+def test_reads_coalesce_and_hit_cache(server, tmp_path):
+    root, base, handler = server
+    payload = np.random.default_rng(0).bytes(20_000)
+    (root / "a.bin").write_bytes(payload)
+    reader = _reader(tmp_path)
+
+    url = f"{base}/a.bin?sig=token1"
+    got = reader.read_many(url, [(100, 50), (1500, 3000), (19_990, 10)])
+    assert got == [payload[100:150], payload[1500:4500], payload[19_990:]]
+    # blocos 0..4 contíguos num só GET; o 19 em outro
+    assert sorted(handler.requests) == ["bytes=0-5119", "bytes=19456-20479"]
+
+    handler.requests.clear()
+    # Outro token SAS, mesma URL: tudo do cache (memória e disco)
+    assert reader.read(f"{base}/a.bin?sig=token2", 2000, 500) == payload[2000:2500]
+    fresh = _reader(tmp_path)
+    assert fresh.read(f"{base}/a.bin", 1500, 3000) == payload[1500:4500]
+    assert handler.requests == []
+
+
+def test_server_without_range_support(server, tmp_path):
+    root, base, handler = server
+    handler.honour_range = False
+    payload = bytes(range(256)) * 20
+    (root / "b.bin").write_bytes(payload)
+    reader = _reader(tmp_path)
+    assert reader.size(f"{base}/b.bin") == len(payload)
+    assert reader.read(f"{base}/b.bin", 3000, 100) == payload[3000:3100]
+
+
+def test_disk_cache_evicts_least_recently_used(tmp_path):
+    cache = BlockCache(tmp_path / "c", memory_bytes=0, disk_bytes=10 * 1024)
+    keys = [cache.key("http://x/a.tif", i, i) for i in range(12)]
+    cache.put(keys[0], b"0" * 1024)
+    for i, key in enumerate(keys[1:], start=1):
+        cache.get(keys[0])  # mantém o bloco 0 como o mais recente
+        cache.put(key, bytes([i]) * 1024)
+    sizes = [p.stat().st_size for p in (tmp_path / "c").glob("??/*")]
+    assert sum(sizes) <= 10 * 1024
+    assert cache.get(keys[0]) == b"0" * 1024
+    assert cache.get(keys[1]) is None  # o mais antigo saiu
+    assert cache.get(keys[-1]) is not None
+
+
+def test_open_cog_range_reads_only_the_window(server, tmp_path):
+    rasterio = pytest.importorskip("rasterio")
+    from rasterio.transform import from_origin
+    from rasterio.windows import Window
+
+    from saag_soy_monitor.cog import open_cog
+
+    root, base, handler = server
+    # Ruído não comprime: cada tile de 512² ocupa ~512 KB num COG de ~32 MB
+    data = np.random.default_rng(1).integers(1, 60_000, (4096, 4096), np.uint16)
+    with rasterio.open(
+        root / "c.tif",
+        "w",
+        driver="COG",
+        width=4096,
+        height=4096,
+        count=1,
+        dtype="uint16",
+        crs="EPSG:32720",
+        transform=from_origin(400_000, 9_000_000, 10, 10),
+        blocksize=512,
+    ) as dst:
+        dst.write(data, 1)
+    file_size = (root / "c.tif").stat().st_size
+
+    reader = RangeReader(BlockCache(tmp_path / "cache"), block_size=16 * 1024)
+    with open_cog(f"{base}/c.tif?sig=x", reader) as src:
+        assert src.shape == (4096, 4096)
+        win = src.read(1, window=Window(512, 1024, 512, 512))
+    np.testing.assert_array_equal(win, data[1024:1536, 512:1024])
+
+    def length(rng):
+        a, b = (int(v) for v in rng.split("=")[1].split("-"))
+        return b - a + 1
+
+    fetched = sum(length(r) for r in handler.requests)
+    assert fetched < file_size / 20  # um tile + cabeçalho, não o arquivo
+
+    # Mesma janela de novo (outro token): só cache, nenhum GET
+    handler.requests.clear()
+    with open_cog(f"{base}/c.tif?sig=y", reader) as src:
+        again = src.read(1, window=Window(512, 1024, 512, 512))
+    np.testing.assert_array_equal(again, win)
+    assert handler.requests == []
@@ -0,0 +1,88 @@
+import dask.array as da
+import numpy as np
+import pytest
+import xarray as xr
+
+from saag_soy_monitor.compact import (
+    NODATA_I16,
+    compact_mode,
+    decode,
+    ndvi_compact,
+)
+
+
+@pytest.fixture
+def bands():
+    rng = np.random.default_rng(0)
+    red = rng.integers(1, 4000, size=(4, 64, 64)).astype(np.uint16)
+    nir = rng.integers(1, 9000, size=(4, 64, 64)).astype(np.uint16)
+    red[0, :8, :8] = 0  # nodata em uma banda
+    nir[1, 10:12, :] = 0
+    return red, nir
+
+
+def _reference(red, nir):
+    r, n = red.astype(np.float32), nir.astype(np.float32)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        ref = (n - r) / (n + r)
+    ref[(red == 0) | (nir == 0)] = np.nan
+    return ref
+
+
+def test_int16_round_trip(bands):
+    red, nir = bands
+    ref = _reference(red, nir)
+    enc = ndvi_compact(red, nir, "int16")
+    assert enc.dtype == np.int16
+    assert (enc[np.isnan(ref)] == NODATA_I16).all()
+
+    out = decode(enc)
+    assert out.dtype == np.float32
+    np.testing.assert_array_equal(np.isnan(out), np.isnan(ref))
+    diff = out - ref
+    assert np.nanmax(np.abs(diff)) <= 5e-5 + 1e-7
+    assert abs(np.nanmean(diff)) <= 5e-5
+
+
+def test_float16_round_trip(bands):
+    red, nir = bands
+    ref = _reference(red, nir)
+    out = decode(ndvi_compact(red, nir, "float16"))
+    assert out.dtype == np.float32
+    np.testing.assert_array_equal(np.isnan(out), np.isnan(ref))
+    diff = out - ref
+    assert np.nanmax(np.abs(diff) / np.maximum(np.abs(ref), 1e-3)) <= 4.9e-4
+    assert abs(np.nanmean(diff)) <= 5e-5
+
+
+@pytest.mark.parametrize("mode", ["int16", "float16"])
+def test_dataarray_stays_lazy(bands, mode):
+    red, nir = bands
+    dims = ("time", "y", "x")
+    r = xr.DataArray(da.from_array(red, chunks=(1, 32, 32)), dims=dims)
+    n = xr.DataArray(da.from_array(nir, chunks=(1, 32, 32)), dims=dims)
+
+    enc = ndvi_compact(r, n, mode)
+    assert isinstance(enc.data, da.Array)
+    assert enc.attrs["compact"] == mode
+    out = decode(enc)
+    assert isinstance(out.data, da.Array)
+    assert "compact" not in out.attrs
+    np.testing.assert_array_equal(
+        out.values, decode(ndvi_compact(red, nir, mode)), strict=True
+    )
+
+
+def test_decode_passes_float32_through():
+    arr = np.array([0.1, np.nan], dtype=np.float32)
+    assert decode(arr) is arr
+
+
+def test_invalid_modes(monkeypatch):
+    with pytest.raises(ValueError):
+        ndvi_compact(np.ones(2, np.uint16), np.ones(2, np.uint16), "off")
+    monkeypatch.setenv("SAAG_COMPACT_MODE", "int8")
+    with pytest.raises(ValueError):
+        compact_mode()
+    monkeypatch.setenv("SAAG_COMPACT_MODE", " Float16 ")
+    assert compact_mode() == "float16"
@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+xr = pytest.importorskip("xarray")
+pytest.importorskip("dask")
+
+
+def _cube():
+    import dask.array as da
+
+    data = np.random.default_rng(0).uniform(-1, 1, (3, 64, 48)).astype("float32")
+    data[0, :4, :4] = np.nan
+    return xr.DataArray(
+        da.from_array(data, chunks=(1, 32, 32)),
+        dims=("time", "y", "x"),
+        coords={
+            "time": pd.date_range("2024-10-01", periods=3, freq="5D"),
+            "y": 9_000_000 - 10 * np.arange(64) - 5.0,
+            "x": 400_000 + 10 * np.arange(48) + 5.0,
+        },
+        name="ndvi",
+    )
+
+
+@pytest.fixture
+def computes(monkeypatch):
+    from saag_soy_monitor import compute
+
+    calls, real = [], compute.compute
+
+    def counting(*objs, session=None, priority=None):
+        calls.append(session)
+        return real(*objs, session=session, priority=priority)
+
+    monkeypatch.setattr(compute, "compute", counting)
+    return calls
+
+
+def test_write_zarr_runs_through_the_managed_compute(tmp_path, computes):
+    pytest.importorskip("zarr")
+    from saag_soy_monitor.cube_export import write_zarr
+
+    cube = _cube()
+    path = write_zarr(cube, tmp_path / "c.zarr", xy_chunk=32, session="s1")
+    assert computes == ["s1"]
+    back = xr.open_zarr(path)["ndvi"]
+    np.testing.assert_allclose(back.values, cube.values, equal_nan=True)
+
+    # Regravar troca o store inteiro e não deixa temporários
+    write_zarr(cube * 0.5, path, xy_chunk=32)
+    np.testing.assert_allclose(
+        xr.open_zarr(path)["ndvi"].values, cube.values * 0.5, equal_nan=True
+    )
+    assert [p.name for p in tmp_path.iterdir()] == ["c.zarr"]
+
+
+def test_write_cogs_one_compute_for_all_dates(tmp_path, computes):
+    rasterio = pytest.importorskip("rasterio")
+    pytest.importorskip("rioxarray")
+    from saag_soy_monitor.cube_export import write_cogs
+
+    cube = _cube()
+    paths = write_cogs(cube, tmp_path / "cogs", blocksize=32, crs="EPSG:32720")
+    assert computes == [None]
+    assert [p.name for p in paths] == [
+        "ndvi_2024-10-01.tif",
+        "ndvi_2024-10-06.tif",
+        "ndvi_2024-10-11.tif",
+    ]
+    assert sorted(p.name for p in (tmp_path / "cogs").iterdir()) == [
+        p.name for p in paths
+    ]  # sem .part.tif sobrando
+    with rasterio.open(paths[0]) as src:
+        assert src.crs.to_epsg() == 32720
+        np.testing.assert_allclose(
+            src.read(1), cube.isel(time=0).values, equal_nan=True
+        )
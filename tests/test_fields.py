@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+import shapely
+from shapely.geometry import box
+
+from saag_soy_monitor.fields import FieldRegistry
+
+FIELDS = {
+    "A1": box(-63.90, -8.80, -63.89, -8.79),
+    "B2": box(-63.85, -8.76, -63.84, -8.75),
+}
+
+
+def _write_gpkg(path, crs="EPSG:32720"):
+    pytest.importorskip("pyogrio")
+    from pyogrio.raw import write
+    from pyproj import Transformer
+
+    tr = Transformer.from_crs(4326, crs, always_xy=True)
+    geoms = [
+        shapely.transform(
+            g, lambda xy: np.column_stack(tr.transform(xy[:, 0], xy[:, 1]))
+        )
+        for g in FIELDS.values()
+    ]
+    write(
+        path,
+        shapely.to_wkb(np.asarray(geoms, dtype=object)),
+        field_data=[np.asarray(list(FIELDS), dtype=object), np.array([1.5, 2.5])],
+        fields=["talhao", "area_ha"],
+        driver="GPKG",
+        geometry_type="Polygon",
+        crs=crs,
+    )
+    return path
+
+
+def test_from_file_reprojects_without_geopandas(tmp_path):
+    reg = FieldRegistry.from_file(_write_gpkg(tmp_path / "talhoes.gpkg"))
+    assert list(reg.field_ids) == list(FIELDS)
+    assert list(reg.attrs["area_ha"]) == [1.5, 2.5]
+    for fid, geom in FIELDS.items():
+        np.testing.assert_allclose(reg.geometry(fid).bounds, geom.bounds, atol=1e-7)
+    assert list(reg.query_bbox(-63.91, -8.81, -63.88, -8.78)) == ["A1"]
+
+
+def test_from_upload_gpkg(tmp_path):
+    payload = _write_gpkg(tmp_path / "t.gpkg", crs="EPSG:4326").read_bytes()
+    reg = FieldRegistry.from_upload("talhoes.gpkg", payload, id_field="talhao")
+    assert sorted(reg.field_ids) == sorted(FIELDS)
+    assert reg.geometry("B2").equals(FIELDS["B2"])
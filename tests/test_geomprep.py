@@ -0,0 +1,63 @@
+import json
+
+from shapely.geometry import box, mapping
+
+from saag_soy_monitor import geomprep
+
+
+def _payload(i: int) -> bytes:
+    feats = [
+        {
+            "type": "Feature",
+            "properties": {"id": f"T{i}"},
+            "geometry": mapping(box(-63.90, -8.80, -63.89 + i * 1e-3, -8.79)),
+        }
+    ]
+    return json.dumps({"type": "FeatureCollection", "features": feats}).encode()
+
+
+def test_upload_cache_hits_and_stays_under_the_cap(tmp_path, monkeypatch):
+    monkeypatch.setenv("SAAG_FIELDS_CACHE", str(tmp_path))
+    first = geomprep.prepare_upload("a.geojson", _payload(0))
+    assert first.report["cached"] is False
+    again = geomprep.prepare_upload("a.geojson", _payload(0))
+    assert again.report["cached"] is True
+    assert list(again.registry.field_ids) == ["T0"]
+
+    entry = next(tmp_path.glob("*.pkl"))
+    monkeypatch.setenv("SAAG_FIELDS_CACHE_MB", str(2.5 * entry.stat().st_size / 2**20))
+    for i in range(1, 5):
+        geomprep.prepare_upload(f"{i}.geojson", _payload(i))
+        # "a" continua em uso (o acerto renova a recência): as outras saem antes
+        geomprep.prepare_upload("a.geojson", _payload(0))
+    assert len(list(tmp_path.glob("*.pkl"))) == 2
+    assert entry.exists()
+    assert geomprep.prepare_upload("4.geojson", _payload(4)).report["cached"] is True
+    assert not list(tmp_path.glob(".*.part"))
+
+
+def test_simplified_fields_stay_polygonal(monkeypatch):
+    import numpy as np
+    import shapely
+    from shapely.geometry import GeometryCollection, LineString
+
+    from saag_soy_monitor.fields import FieldRegistry
+
+    reg = FieldRegistry(
+        np.array(["A", "B"]),
+        [box(-63.90, -8.80, -63.89, -8.79), box(-63.85, -8.76, -63.84, -8.75)],
+    )
+    simplify = shapely.simplify
+
+    def messy(geoms, tol, preserve_topology=True):
+        # Simulação: a simplificação deixa uma linha solta em A e colapsa B
+        out = simplify(geoms, tol, preserve_topology=preserve_topology)
+        a = GeometryCollection([out[0], LineString([(0, 0), (1, 1)])])
+        b = LineString(list(out[1].exterior.coords)[:2])
+        return np.asarray([a, b], dtype=object)
+
+    monkeypatch.setattr(shapely, "simplify", messy)
+    prepared = geomprep.prepare(reg)
+    types = shapely.get_type_id(prepared.geometries_utm).tolist()
+    assert types == [3, 3]  # Polygon
+    assert shapely.get_type_id(prepared.registry.geometries).tolist() == [3, 3]
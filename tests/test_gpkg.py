@@ -0,0 +1,33 @@
+import sqlite3
+
+import pandas as pd
+import pytest
+from shapely.geometry import box
+
+from saag_soy_monitor.gpkg import write_fields_gpkg
+
+GEOMS = [box(-63.90, -8.80, -63.89, -8.79), box(-63.85, -8.76, -63.84, -8.75)]
+
+
+def test_writes_fields_and_stats(tmp_path):
+    stats = pd.DataFrame(
+        {
+            "field_id": ["A", "A", "B"],
+            "date": ["2024-11-01", "2024-11-06", "2024-11-01"],
+            "NDVI": [0.3, 0.4, 0.5],
+        }
+    )
+    path = write_fields_gpkg(tmp_path / "aoi.gpkg", ["A", "B"], GEOMS, stats=stats)
+    with sqlite3.connect(path) as con:
+        assert con.execute('SELECT COUNT(*) FROM "talhoes"').fetchone() == (2,)
+        assert con.execute('SELECT COUNT(*) FROM "ndvi_stats"').fetchone() == (3,)
+    assert [p.name for p in tmp_path.iterdir()] == ["aoi.gpkg"]
+
+
+def test_failed_write_keeps_the_previous_file(tmp_path):
+    path = write_fields_gpkg(tmp_path / "aoi.gpkg", ["A", "B"], GEOMS)
+    before = path.read_bytes()
+    with pytest.raises(ValueError, match="field_id"):
+        write_fields_gpkg(path, ["A", "B"], GEOMS, stats=pd.DataFrame({"NDVI": [0.1]}))
+    assert path.read_bytes() == before
+    assert [p.name for p in tmp_path.iterdir()] == ["aoi.gpkg"]  # sem .part
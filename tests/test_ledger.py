@@ -0,0 +1,154 @@
+import numpy as np
+import pandas as pd
+import pytest
+from shapely.geometry import box
+
+from saag_soy_monitor import local, pipeline
+from saag_soy_monitor.fields import FieldRegistry
+from saag_soy_monitor.ledger import RetryPolicy, WorkLedger, run_batch
+
+UNITS = [(f, d) for f in ("a", "b") for d in ("2024-10-01", "2024-10-06")]
+
+
+class HTTPError(Exception):
+    def __init__(self, status):
+        super().__init__(status)
+        self.response = type("Resp", (), {"status_code": status})()
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    with WorkLedger(tmp_path / "ledger.sqlite") as led:
+        yield led
+
+
+def test_completed_units_are_skipped_on_restart(tmp_path):
+    calls = []
+
+    def work(field_id, day):
+        calls.append((field_id, day))
+        return {"NDVI": 0.5}
+
+    with WorkLedger(tmp_path / "l.sqlite") as led:
+        report = run_batch(led, "job", UNITS, work)
+    assert report.done == 4 and calls == UNITS
+
+    calls.clear()
+    with WorkLedger(tmp_path / "l.sqlite") as led:  # "reinício" do processo
+        report = run_batch(led, "job", UNITS, work)
+        frame = led.frame("job")
+    assert calls == [] and report.skipped == 4
+    assert (frame["status"] == "done").all()
+    assert frame["NDVI"].tolist() == [0.5] * 4
+
+
+def test_attempt_cap_spans_runs(ledger):
+    calls = []
+    sleeps = []
+
+    def work(field_id, day):
+        calls.append(field_id)
+        raise ConnectionError("reset")
+
+    policy = RetryPolicy(max_attempts=3, backoff_s=1.0)
+    report = run_batch(ledger, "job", UNITS[:1], work, policy, sleep=sleeps.append)
+    assert len(calls) == 3 and report.failed == 1
+    assert sleeps == [1.0, 2.0]  # espera exponencial entre tentativas
+
+    report = run_batch(ledger, "job", UNITS[:1], work, policy, sleep=sleeps.append)
+    assert len(calls) == 3 and report.skipped == 1  # limite já atingido
+
+    state = ledger.state("job")
+    assert state[UNITS[0]] == ("failed", 3)
+
+    # Limite maior numa execução seguinte: volta a tentar e conclui
+    report = run_batch(
+        ledger, "job", UNITS[:1], lambda f, d: {"NDVI": 0.1}, RetryPolicy(4)
+    )
+    assert report.done == 1 and ledger.state("job")[UNITS[0]] == ("done", 4)
+
+
+def test_non_retryable_errors_fail_fast(ledger):
+    calls = []
+
+    def work(field_id, day):
+        calls.append(day)
+        raise HTTPError(401 if field_id == "a" else 503)
+
+    policy = RetryPolicy(max_attempts=3, backoff_s=0, retryable=pipeline._is_retryable)
+    report = run_batch(ledger, "job", UNITS, work, policy, sleep=lambda s: None)
+    assert report.failed == 4
+    state = ledger.state("job")
+    assert state[("a", "2024-10-01")] == ("failed", 1)  # 401: uma tentativa
+    assert state[("b", "2024-10-01")] == ("failed", 3)  # 503: retentado
+    assert len(calls) == 2 * 1 + 2 * 3
+    assert "401" in ledger.frame("job")["error"].iloc[0]
+
+
+class _FakeBackend:
+    def __init__(self, root):
+        self.root = root
+
+    def search(self, bbox, start, end, max_cloud=None):
+        return [{"properties": {"datetime": "2024-10-02T14:00:00Z"}}]
+
+    def fields_ndvi(self, registry, day, max_cloud=None):
+        # NDVI = minx da BBOX: distingue geometrias diferentes
+        return {f: registry.geometry(f).bounds[0] for f in registry.field_ids}
+
+
+def test_reused_ids_with_new_geometry_are_recomputed(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(local, "local_backend", lambda d: _FakeBackend(tmp_path))
+    db = tmp_path / "ledger.sqlite"
+
+    farm1 = FieldRegistry(
+        ["1", "2"], [box(-60, -10, -59.9, -9.9), box(-59, -10, -58.9, -9.9)]
+    )
+    farm2 = FieldRegistry(
+        ["1", "2"], [box(-50, -10, -49.9, -9.9), box(-59, -10, -58.9, -9.9)]
+    )
+
+    out1 = pd.read_csv(
+        pipeline.run_fields_ndvi(
+            farm1, "2024-10-01", "2024-10-31", local_dir="x", ledger_path=db
+        )
+    )
+    out2 = pd.read_csv(
+        pipeline.run_fields_ndvi(
+            farm2, "2024-10-01", "2024-10-31", local_dir="x", ledger_path=db
+        )
+    )
+
+    assert out1["NDVI"].tolist() == [-60, -59]
+    assert out2["NDVI"].tolist() == [-50, -59]
+    assert out2["field_id"].astype(str).tolist() == ["1", "2"]
+    assert "1 concluídas, 1 puladas" in out2["note"].iloc[0]
+
+
+def test_batch_season_is_upserted_into_climatology(tmp_path, monkeypatch):
+    from saag_soy_monitor.climatology import ClimatologyIndex
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(local, "local_backend", lambda d: _FakeBackend(tmp_path))
+    farm = FieldRegistry(["1", "2"], [box(0.2, 0, 0.3, 1), box(0.6, 0, 0.7, 1)])
+    clim = tmp_path / "clim"
+    for db in ("a.sqlite", "b.sqlite"):  # segunda execução: lote refeito do zero
+        pipeline.run_fields_ndvi(
+            farm,
+            "2024-10-01",
+            "2024-10-31",
+            local_dir="x",
+            ledger_path=tmp_path / db,
+            season="2024/25",
+            climatology_root=clim,
+        )
+
+    index = ClimatologyIndex.open(clim)
+    assert index.seasons == ["2024/25"]
+    assert int(np.asarray(index._counts).sum()) == 2  # 2 talhões x 1 data
+    p50 = index.percentiles(["1", "2"], [pd.Timestamp("2024-10-02")], q=(50,))
+    np.testing.assert_allclose(p50[:, 0, 0], [0.2, 0.6], atol=0.02)
+    pheno = pd.read_parquet(tmp_path / "outputs" / "phenology.parquet")
+    assert sorted(pheno["field_id"]) == ["1", "2"]
+    assert set(pheno["season"]) == {"2024/25"}
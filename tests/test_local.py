@@ -0,0 +1,213 @@
+import json
+import shutil
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("rasterio")
+
+from saag_soy_monitor.examples import make_fixtures as cli  # noqa: E402
+from saag_soy_monitor.local import LocalBackend, _double_logistic  # noqa: E402
+from saag_soy_monitor.pipeline import RunParams  # noqa: E402
+
+BBOX = "-63.90,-8.80,-63.88,-8.78"
+START, END = "2024-09-15", "2025-03-15"
+
+
+@pytest.fixture(scope="module")
+def fixtures(tmp_path_factory):
+    out = tmp_path_factory.mktemp("fixtures")
+    argv = ["make_fixtures", "--out", str(out), f"--bbox={BBOX}", "--fields", "1"]
+    argv += ["--start", START, "--end", END]
+    old, sys.argv = sys.argv, argv
+    try:
+        cli.main()
+    finally:
+        sys.argv = old
+    return out
+
+
+def _field(root):
+    truth = json.loads((root / "fields.json").read_text(encoding="utf-8"))
+    (field,) = truth["fields"]
+    x0, y0, x1, y1 = field["bbox_wgs84"]
+    dx, dy = (x1 - x0) * 0.2, (y1 - y0) * 0.2  # longe da borda do talhão
+    return field, (x0 + dx, y0 + dy, x1 - dx, y1 - dy), pd.Timestamp(truth["start"])
+
+
+def test_search_filters_period_bbox_and_clouds(fixtures):
+    backend = LocalBackend(fixtures)
+    bbox = tuple(float(v) for v in BBOX.split(","))
+    items = backend.search(bbox, START, END)
+    assert len(items) == len(backend.items) > 30
+    days = [it["properties"]["datetime"] for it in items]
+    assert days == sorted(days)
+
+    clear = backend.search(bbox, START, END, max_cloud=20)
+    assert 0 < len(clear) < len(items)
+    assert all(it["properties"]["eo:cloud_cover"] <= 20 for it in clear)
+    assert backend.search((10.0, 10.0, 10.1, 10.1), START, END) == []
+    assert len(backend.search(bbox, "2024-10-01", "2024-10-31")) == 6
+
+
+def test_timeseries_follows_the_synthetic_curve(fixtures):
+    field, bbox, t0 = _field(fixtures)
+    backend = LocalBackend(fixtures)
+    df = backend.timeseries(RunParams(bbox, START, END))
+    assert df["NDVI"].notna().all()
+    # Só datas sem nenhuma nuvem sobre o talhão (nuvem puxa o NDVI para 0)
+    clear = ~df["date"].dt.strftime("%Y-%m-%d").isin(field["cloud_frac"])
+    df = df[clear]
+    assert len(df) >= 5
+
+    days = (df["date"] - t0).dt.days.to_numpy(dtype=float)
+    expected = _double_logistic(days, field["sos_day"], field["eos_day"])
+    np.testing.assert_allclose(df["NDVI"], expected, atol=0.01)
+
+
+def test_reflectances_stay_physical(fixtures):
+    import rasterio
+
+    for item in LocalBackend(fixtures).items[:5]:
+        for band in ("B04", "B08"):
+            with rasterio.open(item["assets"][band]["href"]) as src:
+                assert src.driver == "GTiff" and src.block_shapes[0] == (256, 256)
+                assert src.overviews(1) or max(src.shape) <= 512
+                dn = src.read(1)
+            assert dn.min() >= 1 and dn.max() <= 6000  # reflectância <= 0,6
+
+
+def test_safe_layout_matches_catalog(fixtures, tmp_path):
+    """Mesmas cenas num layout .SAFE (sem items.json) e num Catalog STAC."""
+    catalog = LocalBackend(fixtures)
+    links = []
+    for item in catalog.items[:4]:
+        day = item["properties"]["datetime"][:10].replace("-", "")
+        r10 = tmp_path / "safe" / f"S2B_MSIL2A_{day}T140051.SAFE"
+        r10 = r10 / "GRANULE" / f"L2A_T20LMR_{day}" / "IMG_DATA" / "R10m"
+        r10.mkdir(parents=True)
+        for band in ("B04", "B08"):
+            src = item["assets"][band]["href"]
+            shutil.copy(src, r10 / f"T20LMR_{day}T140051_{band}_10m.tif")
+        (tmp_path / "stac").mkdir(exist_ok=True)
+        (tmp_path / "stac" / f"{item['id']}.json").write_text(json.dumps(item))
+        links.append({"rel": "item", "href": f"./{item['id']}.json"})
+    (tmp_path / "stac" / "catalog.json").write_text(
+        json.dumps({"type": "Catalog", "id": "fx", "links": links})
+    )
+
+    _, bbox, _ = _field(fixtures)
+    params = RunParams(bbox, START, END)
+    ref = LocalBackend(tmp_path / "stac").timeseries(params)
+    safe = LocalBackend(tmp_path / "safe")
+    assert len(safe.items) == 4
+    assert safe.items[0]["properties"]["s2:mgrs_tile"] == "20LMR"
+    assert safe.items[0]["properties"]["proj:epsg"] == 32720
+    pd.testing.assert_frame_equal(safe.timeseries(params), ref)
+    assert safe.items[0]["stac_extensions"] == catalog.items[0]["stac_extensions"]
+
+
+def test_pystac_items_carry_the_native_grid(fixtures):
+    pytest.importorskip("pystac")
+    from pystac.extensions.projection import ProjectionExtension
+
+    bbox = tuple(float(v) for v in BBOX.split(","))
+    item = LocalBackend(fixtures).search(bbox, START, END, as_pystac=True)[0]
+    proj = ProjectionExtension.ext(item)
+    assert proj.epsg == 32720
+    assert proj.shape and proj.transform
+
+
+def test_fields_batch_reads_each_block_once(fixtures, tmp_path, monkeypatch):
+    from shapely.geometry import box
+
+    from saag_soy_monitor import local, planner
+    from saag_soy_monitor.fields import FieldRegistry
+    from saag_soy_monitor.pipeline import run_fields_ndvi
+
+    field, bbox, _ = _field(fixtures)
+    x0, y0, x1, y1 = bbox
+    xm = (x0 + x1) / 2
+    # Dois talhões vizinhos dividindo os mesmos blocos do COG
+    registry = FieldRegistry(["W", "E"], [box(x0, y0, xm, y1), box(xm, y0, x1, y1)])
+
+    reads, opens, read_blocks = [], [], planner.rasterio_block_reader
+
+    def counting_reader(grid, keys, block_size):
+        opens.append(grid.item_id)
+        reads.extend(keys)
+        return read_blocks(grid, keys, block_size)
+
+    monkeypatch.setattr(planner, "rasterio_block_reader", counting_reader)
+    backend = LocalBackend(fixtures)
+    day = pd.Timestamp(backend.items[0]["properties"]["datetime"]).tz_localize(None)
+    values = backend.fields_ndvi(registry, day.normalize())
+    assert len(reads) == len(set(reads)) == 2  # B04 e B08, um bloco cada
+    # Blocos pequenos: vários blocos por cena, ainda um COG aberto por banda
+    reads.clear(), opens.clear()
+    small = backend.fields_ndvi(registry, day.normalize(), block_size=16)
+    assert len(reads) > 2 and len(opens) == 2
+    assert small == pytest.approx(values)
+    reads.clear()
+    for fid in ("W", "E"):
+        ref = backend.timeseries(RunParams(registry.geometry(fid).bounds, day, day))
+        assert values[fid] == pytest.approx(ref["NDVI"].iloc[0], abs=0.01)
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(local, "local_backend", lambda d: LocalBackend(fixtures))
+    out = pd.read_csv(
+        run_fields_ndvi(
+            registry, START, END, local_dir="x", ledger_path=tmp_path / "l.sqlite"
+        )
+    )
+    assert out["field_id"].tolist()[:2] == ["W", "W"]
+    assert (out["status"] == "done").all()
+    assert out["NDVI"].notna().all()
+    # Uma leitura planejada por data, não uma por talhão x data
+    n_dates = out["date"].nunique()
+    assert len(reads) == 2 * n_dates
+
+
+def test_fields_ndvi_averages_inside_the_polygon(fixtures):
+    import rasterio
+    from pyproj import Transformer
+    from rasterio.features import geometry_mask
+    from shapely import transform as reproject
+    from shapely.geometry import Polygon, box, mapping
+
+    from saag_soy_monitor.fields import FieldRegistry
+
+    field, _, _ = _field(fixtures)
+    x0, y0, x1, y1 = field["bbox_wgs84"]
+    m = (x1 - x0) / 2
+    # Triângulo metade sobre o talhão: a BBOX dele pega muito solo vizinho
+    tri = Polygon([(x0 - m, y0 - m), (x1 + m, y0 - m), (x0 - m, y1 + m)])
+    registry = FieldRegistry(["TRI", "BOX"], [tri, box(*tri.bounds)])
+
+    backend = LocalBackend(fixtures)
+    # Data em que o talhão e o entorno têm NDVI bem diferentes (semente fixa)
+    (item,) = backend.search(tri.bounds, "2024-12-06", "2024-12-06")
+    values = backend.fields_ndvi(registry, pd.Timestamp("2024-12-06"))
+
+    bands = {}
+    for band in ("B04", "B08"):
+        with rasterio.open(item["assets"][band]["href"]) as src:
+            bands[band] = src.read(1).astype(np.float32)
+            tr = Transformer.from_crs(4326, src.crs, always_xy=True)
+            inside = geometry_mask(
+                [
+                    mapping(
+                        reproject(tri, lambda xy: np.column_stack(tr.transform(*xy.T)))
+                    )
+                ],
+                out_shape=src.shape,
+                transform=src.transform,
+                invert=True,
+            )
+    r, n = bands["B04"], bands["B08"]
+    valid = inside & (r > 0) & (n > 0)
+    expected = float(np.mean((n[valid] - r[valid]) / (n[valid] + r[valid])))
+    assert values["TRI"] == pytest.approx(expected, abs=1e-4)
+    assert abs(values["TRI"] - values["BOX"]) > 0.01
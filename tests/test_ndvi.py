@@ -0,0 +1,175 @@
+import json
+import sys
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from saag_soy_monitor.ndvi import aoi_ndvi, field_stats, pick_bands, search_scenes
+
+BBOX = "-63.90,-8.80,-63.88,-8.78"
+START, END = "2024-09-15", "2024-11-15"
+
+
+def test_pick_bands():
+    item = SimpleNamespace(assets={"B04_10m": 0, "B08_10m": 0, "SCL": 0})
+    assert pick_bands([item]) == ("B04_10m", "B08_10m")
+    with pytest.raises(RuntimeError, match="RED/NIR"):
+        pick_bands([SimpleNamespace(assets={"SCL": 0})])
+
+
+def test_aoi_ndvi_on_local_fixtures(tmp_path, monkeypatch):
+    pytest.importorskip("rasterio")
+    pytest.importorskip("odc.stac")
+    from saag_soy_monitor.examples import make_fixtures as cli
+
+    argv = ["make_fixtures", "--out", str(tmp_path / "fx"), f"--bbox={BBOX}"]
+    argv += ["--fields", "1", "--start", START, "--end", END]
+    monkeypatch.setattr(sys, "argv", argv)
+    cli.main()
+    monkeypatch.setenv("SAAG_LOCAL_DATA", str(tmp_path / "fx"))
+    monkeypatch.setenv("SAAG_SHARED_DIR", str(tmp_path / "shared"))
+
+    bbox = tuple(float(v) for v in BBOX.split(","))
+    items = search_scenes(bbox, START, END)
+    assert items
+    res = aoi_ndvi(items, bbox, START, END, 10)
+    assert not res.multi_zone
+    assert list(res.df.columns) == ["date", "NDVI", "valid_frac"]
+    assert len(res.df) == res.ndvi.sizes["time"] > 0
+    assert res.df["NDVI"].dropna().between(-1, 1).all()
+    assert res.df["valid_frac"].between(0, 1).all()
+
+    # Segunda chamada anexa o cubo compartilhado em vez de recalcular
+    again = aoi_ndvi(items, bbox, START, END, 10)
+    np.testing.assert_allclose(again.ndvi.values, res.ndvi.values, equal_nan=True)
+    np.testing.assert_allclose(again.df["NDVI"], res.df["NDVI"], equal_nan=True)
+
+
+def test_aoi_ndvi_polygon_mask(tmp_path, monkeypatch):
+    pytest.importorskip("rasterio")
+    pytest.importorskip("odc.stac")
+    from shapely.geometry import box
+
+    from saag_soy_monitor.local import make_fixtures
+
+    bbox = tuple(float(v) for v in BBOX.split(","))
+    make_fixtures(tmp_path / "fx", bbox, START, END, n_fields=1)
+    monkeypatch.setenv("SAAG_LOCAL_DATA", str(tmp_path / "fx"))
+    monkeypatch.setenv("SAAG_SHARED_DIR", str(tmp_path / "shared"))
+
+    aoi = box(-63.895, -8.795, -63.885, -8.785)
+    items = search_scenes(bbox, START, END)
+    res = aoi_ndvi(items, bbox, START, END, 10, aoi=aoi)
+    assert res.mask is not None and 0 < res.mask.sum() < res.mask.size
+    # Fora do polígono tudo é NaN
+    outside = res.ndvi.values[:, ~res.mask]
+    assert np.isnan(outside).all()
+    assert res.df["valid_frac"].max() <= 1.0
+
+
+def test_field_stats_follow_the_synthetic_curve(tmp_path, monkeypatch):
+    pytest.importorskip("rasterio")
+    pytest.importorskip("odc.stac")
+    from shapely.geometry import box
+
+    from saag_soy_monitor.local import _double_logistic, make_fixtures
+
+    bbox = tuple(float(v) for v in BBOX.split(","))
+    root = make_fixtures(tmp_path / "fx", bbox, START, END, n_fields=2)
+    monkeypatch.setenv("SAAG_LOCAL_DATA", str(root))
+    monkeypatch.setenv("SAAG_SHARED_DIR", str(tmp_path / "shared"))
+    truth = json.loads((root / "fields.json").read_text(encoding="utf-8"))
+
+    res = aoi_ndvi(search_scenes(bbox, START, END), bbox, START, END, 10)
+    ids, geoms = [], []
+    for f in truth["fields"]:
+        x0, y0, x1, y1 = f["bbox_wgs84"]
+        dx, dy = (x1 - x0) * 0.2, (y1 - y0) * 0.2  # longe da borda
+        ids.append(str(f["field"]))
+        geoms.append(box(x0 + dx, y0 + dy, x1 - dx, y1 - dy))
+    outside = box(10.0, 10.0, 10.1, 10.1)
+    stats = field_stats(res, ids + ["fora"], geoms + [outside])
+
+    assert set(stats["field_id"]) == set(ids)
+    assert len(stats) == len(ids) * res.ndvi.sizes["time"]
+    t0 = pd.Timestamp(truth["start"])
+    for f in truth["fields"]:
+        s = stats[stats["field_id"] == str(f["field"])]
+        s = s[~s["date"].dt.strftime("%Y-%m-%d").isin(list(f["cloud_frac"]))]
+        assert len(s) >= 2 and (s["valid_frac"] == 1.0).all()
+        days = (s["date"] - t0).dt.days.to_numpy(dtype="float32")
+        expected = _double_logistic(days, f["sos_day"], f["eos_day"])
+        np.testing.assert_allclose(s["NDVI"], expected, atol=0.03)
+
+
+def test_solar_day_mosaic_keeps_cloud_order(tmp_path, monkeypatch):
+    rasterio = pytest.importorskip("rasterio")
+    pystac = pytest.importorskip("pystac")
+    pytest.importorskip("odc.stac")
+    from rasterio.transform import from_origin
+    from rasterio.warp import transform_bounds
+    from shapely.geometry import box, mapping
+
+    from saag_soy_monitor.local import PROJ_EXT
+
+    monkeypatch.setenv("SAAG_SHARED_DIR", str(tmp_path / "shared"))
+    transform = from_origin(400_000, 9_000_000, 10, 10)
+
+    def item(id_, when, cloud, nir, cols):
+        hrefs = {}
+        for band, value in (("B04", 1000), ("B08", nir)):
+            data = np.zeros((64, 64), np.uint16)
+            data[:, :cols] = value  # 0 = nodata
+            hrefs[band] = str(tmp_path / f"{id_}_{band}.tif")
+            with rasterio.open(
+                hrefs[band],
+                "w",
+                driver="GTiff",
+                width=64,
+                height=64,
+                count=1,
+                dtype="uint16",
+                crs="EPSG:32720",
+                transform=transform,
+                nodata=0,
+            ) as dst:
+                dst.write(data, 1)
+        x0, y1 = 400_000, 9_000_000
+        bounds = transform_bounds(
+            "EPSG:32720", "EPSG:4326", x0, y1 - 640, x0 + cols * 10, y1
+        )
+        return pystac.Item.from_dict(
+            {
+                "type": "Feature",
+                "stac_version": "1.0.0",
+                "stac_extensions": [PROJ_EXT],
+                "id": id_,
+                "bbox": list(bounds),
+                "geometry": mapping(box(*bounds)),
+                "properties": {
+                    "datetime": when,
+                    "eo:cloud_cover": cloud,
+                    "proj:epsg": 32720,
+                    "proj:shape": [64, 64],
+                    "proj:transform": list(transform)[:6],
+                },
+                "assets": {b: {"href": h, "roles": ["data"]} for b, h in hrefs.items()},
+                "links": [],
+            }
+        )
+
+    # Mesma passagem: "a" (mais cedo, nublada) cobre tudo; "b" (limpa), a metade
+    # oeste. A ordem do odc seria (hora, id) -> "a" primeiro em todo o quadro
+    cloudy = item("a", "2024-10-01T14:00:00Z", 50.0, 3000, 64)  # NDVI 0,5
+    clear = item("b", "2024-10-01T14:00:05Z", 5.0, 5000, 32)  # NDVI 0,667
+    bbox = transform_bounds(
+        "EPSG:32720", "EPSG:4326", 400_010, 8_999_370, 400_630, 8_999_990
+    )
+    res = aoi_ndvi([cloudy, clear], bbox, "2024-10-01", "2024-10-01", 10)
+    assert [it.id for it in res.items] == ["b", "a"]
+    plane = res.ndvi.isel(time=0).values
+    west, east = plane[:, :20], plane[:, -20:]
+    np.testing.assert_allclose(west, 4000 / 6000, atol=1e-3)
+    np.testing.assert_allclose(east, 2000 / 4000, atol=1e-3)
@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+
+from saag_soy_monitor import phenology
+from saag_soy_monitor.local import _double_logistic
+
+GRID = pd.date_range("2024-09-15", "2025-03-15", freq="5D")
+
+
+def _curves(sos, eos):
+    days = np.asarray((GRID - GRID[0]).days, dtype=float)
+    return np.stack([_double_logistic(days, s, e) for s, e in zip(sos, eos)])
+
+
+def test_extract_recovers_the_season_in_batch():
+    sos, eos = np.array([25.0, 45.0]), np.array([130.0, 150.0])
+    m = phenology.extract(GRID, _curves(sos, eos))
+    got_sos = (pd.DatetimeIndex(m["sos_date"]) - GRID[0]).days
+    assert np.all(np.abs(got_sos - sos) < 12)
+    assert np.all(m["peak_value"] > 0.8)
+    assert (pd.DatetimeIndex(m["eos_date"]) > pd.DatetimeIndex(m["peak_date"])).all()
+    flat = phenology.extract(GRID, np.full((1, len(GRID)), 0.8))
+    assert np.isnat(flat["sos_date"][0]) and np.isnan(flat["integrated_ndvi"][0])
+
+
+def test_season_of():
+    assert phenology.season_of("2024-10-01") == "2024/25"
+    assert phenology.season_of("2025-02-10") == "2024/25"
+    assert phenology.season_of("1999-09-01") == "1999/00"
+
+
+def test_save_upserts_and_feeds_the_crop_calendar(tmp_path):
+    sos, eos = np.array([25.0, 45.0, 35.0]), np.array([130.0, 150.0, 140.0])
+    metrics = phenology.extract(GRID, _curves(sos, eos))
+    phenology.save(phenology.to_frame(["a", "b", "c"], metrics, "2024/25"), tmp_path)
+    first = phenology.to_frame(["a"], phenology.extract(GRID, _curves([5.0], [90.0])))
+    phenology.save(first.assign(season="2023/24"), tmp_path)
+    # Reprocessar a mesma safra substitui as linhas
+    phenology.save(phenology.to_frame(["a", "b", "c"], metrics, "2024/25"), tmp_path)
+
+    all_rows = phenology.load(tmp_path)
+    assert len(all_rows) == 4
+    assert not list(tmp_path.glob(".*.part"))
+    cal = phenology.crop_calendar(phenology.load(tmp_path, "2024/25"))
+    assert cal["n_fields"].tolist() == [3]
+    assert cal["sos_date_p50"].iloc[0] == pd.Timestamp(metrics["sos_date"][2])
+    assert phenology.load(tmp_path / "vazio").empty
+
+
+def test_aoi_curves_stay_out_of_the_field_calendar(tmp_path):
+    metrics = phenology.extract(GRID, _curves([25.0, 45.0], [130.0, 150.0]))
+    phenology.save(phenology.to_frame(["a", "b"], metrics, "2024/25"), tmp_path)
+    aoi = phenology.extract(GRID, _curves([80.0], [170.0]))
+    phenology.save(
+        phenology.to_frame(["3f2a9c"], aoi, "2024/25"),
+        tmp_path,
+        phenology.AOI_PHENOLOGY_FILE,
+    )
+
+    assert phenology.load(tmp_path)["field_id"].tolist() == ["a", "b"]
+    cal = phenology.crop_calendar(phenology.load(tmp_path, "2024/25"))
+    assert cal["n_fields"].tolist() == [2]
+    aois = phenology.load(tmp_path, name=phenology.AOI_PHENOLOGY_FILE)
+    assert aois["field_id"].tolist() == ["3f2a9c"]
+
+
+def _save_one(args):
+    out_dir, i = args
+    df = pd.DataFrame({"field_id": [f"f{i}"], "season": ["2024/25"], "peak_value": [i]})
+    phenology.save(df, out_dir)
+
+
+def test_concurrent_saves_keep_every_row(tmp_path):
+    from concurrent.futures import ProcessPoolExecutor
+
+    # Processos separados (lote + app): só o lock de arquivo os serializa
+    with ProcessPoolExecutor(4) as pool:
+        list(pool.map(_save_one, [(tmp_path, i) for i in range(16)]))
+
+    df = phenology.load(tmp_path)
+    assert sorted(df["field_id"]) == sorted(f"f{i}" for i in range(16))
+    assert not list(tmp_path.glob(".*.part"))
@@ -0,0 +1,97 @@
+import os
+import threading
+import time
+
+import numpy as np
+import pytest
+import xarray as xr
+
+from saag_soy_monitor import shared
+
+
+def _cube(seed: int, n: int = 64) -> xr.DataArray:
+    rng = np.random.default_rng(seed)
+    data = rng.random((4, n, n), dtype=np.float32)
+    return xr.DataArray(
+        data,
+        dims=("time", "y", "x"),
+        coords={"time": np.arange(4), "y": np.arange(n), "x": np.arange(n)},
+        name="ndvi",
+    )
+
+
+def test_round_trip(tmp_path):
+    cube = _cube(0)
+    out = shared.share("k", cube, root=tmp_path)
+    np.testing.assert_array_equal(out.values, cube.values)
+    np.testing.assert_array_equal(out["y"].values, cube["y"].values)
+    assert shared.attach("k", tmp_path) is not None
+    assert not list(tmp_path.glob(".*.part*"))
+
+
+def test_concurrent_sessions_publish_once(tmp_path, monkeypatch):
+    calls = []
+    original = shared.publish
+
+    def counting(key, cube, **kw):
+        calls.append(key)
+        time.sleep(0.05)  # alarga a janela de corrida
+        return original(key, cube, **kw)
+
+    monkeypatch.setattr(shared, "publish", counting)
+    cube = _cube(1)
+    results = [None] * 6
+
+    def session(i):
+        results[i] = shared.share("same", cube, root=tmp_path)
+
+    threads = [threading.Thread(target=session, args=(i,)) for i in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert calls == ["same"]
+    for r in results:
+        np.testing.assert_array_equal(r.values, cube.values)
+    assert not list(tmp_path.glob(".*.part*"))
+
+
+def test_evicts_least_recently_used(tmp_path, monkeypatch):
+    size_mb = _cube(0).nbytes / 2**20
+    monkeypatch.setenv("SAAG_SHARED_CACHE_MB", str(2.5 * size_mb))
+    for i, key in enumerate(("a", "b")):
+        shared.share(key, _cube(i), root=tmp_path)
+        time.sleep(0.02)
+    shared.attach("a", tmp_path)  # "a" passa a ser o mais recente
+    time.sleep(0.02)
+    shared.share("c", _cube(2), root=tmp_path)
+
+    assert shared.attach("b", tmp_path) is None
+    assert shared.attach("a", tmp_path) is not None
+    assert shared.attach("c", tmp_path) is not None
+
+
+def test_evict_removes_stale_parts(tmp_path):
+    part = tmp_path / ".x.npy.abc.part.npy"
+    part.write_bytes(b"0")
+    old = time.time() - shared.STALE_PART_S - 1
+    os.utime(part, (old, old))
+    shared.evict(tmp_path, max_mb=1)
+    assert not part.exists()
+
+
+def test_too_big_is_not_shared(tmp_path):
+    cube = _cube(3)
+    assert shared.share("big", cube, max_mb=0.001, root=tmp_path) is cube
+    assert shared.attach("big", tmp_path) is None
+
+
+def test_failed_publish_removes_the_part_file(tmp_path):
+    def failing(*objs):
+        raise RuntimeError("worker perdido")
+
+    with pytest.raises(RuntimeError, match="worker perdido"):
+        shared.publish("k", _cube(4), root=tmp_path, compute=failing)
+    assert not list(tmp_path.glob(".*.part*"))
+    assert shared.attach("k", tmp_path) is None
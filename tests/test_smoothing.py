@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from saag_soy_monitor import smoothing
+
+
+def _dense(y, w, lam, d):
+    """Referência: (W + λ·DᵀD) z = W y resolvido com a matriz cheia."""
+    n = len(y)
+    D = np.diff(np.eye(n), n=d, axis=0)
+    A = np.diag(w) + lam * D.T @ D
+    return np.linalg.solve(A, w * np.where(w > 0, y, 0.0))
+
+
+@pytest.mark.parametrize("lam,d", [(10.0, 2), (500.0, 2), (3.0, 3)])
+def test_whittaker_matches_the_dense_solve(lam, d):
+    rng = np.random.default_rng(0)
+    y = np.sin(np.linspace(0, 3, 40))[None, :] + rng.normal(0, 0.1, (5, 40))
+    w = rng.uniform(0.2, 1.0, y.shape)
+    z = smoothing.whittaker(y, w, lam=lam, d=d)
+    expected = np.stack([_dense(y[i], w[i], lam, d) for i in range(len(y))])
+    np.testing.assert_allclose(z, expected, rtol=1e-8, atol=1e-10)
+
+
+def test_whittaker_gives_missing_values_zero_weight():
+    rng = np.random.default_rng(1)
+    y = rng.random((3, 30))
+    w = rng.uniform(0.5, 1.0, y.shape)
+    y[0, 5:12] = np.nan  # falha de nuvem
+    w[1, [2, 20]] = np.nan  # peso ausente
+    w[2, :] = 0.0
+    w[2, [0, 29]] = 1.0  # só 2 observações: menos que d+1
+
+    z = smoothing.whittaker(y, w, lam=20.0)
+    for i in range(2):
+        wi = np.where(np.isfinite(y[i]), np.nan_to_num(w[i]), 0.0)
+        np.testing.assert_allclose(z[i], _dense(y[i], wi, 20.0, 2), atol=1e-10)
+    assert np.isfinite(z[:2]).all()
+    assert np.isnan(z[2]).all()
+
+
+def test_to_grid_averages_by_weight_and_fill_gaps_interpolates():
+    dates = pd.to_datetime(["2024-11-01", "2024-11-02", "2024-11-11"])
+    grid = smoothing.regular_grid(dates)
+    y, w = smoothing.to_grid(dates, np.array([[0.2, 0.6, np.nan]]), grid, [[1, 3, 1]])
+    assert list(grid.day) == [1, 6, 11]
+    np.testing.assert_allclose(y[0, 0], 0.5)
+    assert np.isnan(y[0, 1:]).all() and w[0].tolist() == [4.0, 0.0, 0.0]
+
+    filled = smoothing.fill_gaps(np.array([[np.nan, 1.0, np.nan, 3.0, np.nan]]))
+    np.testing.assert_allclose(filled, [[1.0, 1.0, 2.0, 3.0, 3.0]])
+
+
+def test_savgol_runs_on_series_with_gaps():
+    y = np.linspace(0, 1, 15)[None, :].copy()
+    y[0, 4] = np.nan
+    out = smoothing.savgol(y)
+    np.testing.assert_allclose(out, np.linspace(0, 1, 15)[None, :], atol=1e-12)
@@ -0,0 +1,151 @@
+import io
+import math
+import urllib.error
+import urllib.request
+from dataclasses import dataclass, field
+
+import numpy as np
+import pytest
+
+from saag_soy_monitor.tiles import ArraySource, CogSource, TileServer
+
+# Raster pequeno em Rondônia (EPSG:4326, ~0,0009° por pixel)
+XS = -63.90 + 0.0009 * (np.arange(200) + 0.5)
+YS = -8.70 - 0.0009 * (np.arange(200) + 0.5)
+Z = 12
+
+
+@pytest.fixture
+def tile_server():
+    server = TileServer(port=0, cache_size=4)
+    yield server
+    server.shutdown()
+
+
+def _tile_xy(lon, lat, z=Z):
+    n = 1 << z
+    y = (1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * n
+    return int((lon + 180) / 360 * n), int(y)
+
+
+@dataclass
+class _Counting:
+    """Fonte que conta renderizações (delegando à fonte real)."""
+
+    source: object
+    calls: list = field(default_factory=list)
+
+    def __getattr__(self, name):
+        return getattr(self.source, name)
+
+    def read_tile(self, z, x, y):
+        self.calls.append((z, x, y))
+        return self.source.read_tile(z, x, y)
+
+
+def _array_source():
+    data = np.linspace(0.2, 0.9, XS.size * YS.size, dtype=np.float32)
+    return ArraySource(data.reshape(YS.size, XS.size), XS, YS, version="v1")
+
+
+def _cog_source(tmp_path):
+    rasterio = pytest.importorskip("rasterio")
+    from rasterio.transform import from_origin
+
+    path = tmp_path / "ndvi.tif"
+    data = np.linspace(0.2, 0.9, XS.size * YS.size, dtype=np.float32)
+    with rasterio.open(
+        path,
+        "w",
+        driver="COG",
+        width=XS.size,
+        height=YS.size,
+        count=1,
+        dtype="float32",
+        crs="EPSG:4326",
+        transform=from_origin(-63.90, -8.70, 0.0009, 0.0009),
+        nodata=np.nan,
+    ) as dst:
+        dst.write(data.reshape(YS.size, XS.size), 1)
+    return CogSource(str(path), version=str(path))
+
+
+@pytest.fixture(params=["array", "cog"])
+def layer(request, tile_server, tmp_path):
+    src = _array_source() if request.param == "array" else _cog_source(tmp_path)
+    counting = _Counting(src)
+    template = tile_server.register("ndvi", counting)
+    return tile_server, template, counting
+
+
+def _url(template, z, x, y):
+    return template.format(z=z, x=x, y=y)
+
+
+def _get(url, headers=None):
+    req = urllib.request.Request(url, headers=headers or {})
+    try:
+        with urllib.request.urlopen(req, timeout=10) as resp:
+            return resp.status, dict(resp.headers), resp.read()
+    except urllib.error.HTTPError as err:
+        return err.code, dict(err.headers), b""
+
+
+def test_published_files_are_streamed(tile_server, tmp_path):
+    payload = np.random.default_rng(0).bytes(3 * 2**20 + 17)
+    path = tmp_path / "ts_ndvi_abc.parquet"
+    path.write_bytes(payload)
+
+    url = tile_server.publish_file(path)
+    assert tile_server.publish_file(path) == url  # mesmo token para o mesmo arquivo
+    status, headers, body = _get(url)
+    assert status == 200 and body == payload
+    assert headers["Content-Length"] == str(len(payload))
+    assert 'filename="ts_ndvi_abc.parquet"' in headers["Content-Disposition"]
+
+    # Só arquivos publicados: token desconhecido ou arquivo removido -> 404
+    assert _get(f"{tile_server.base_url}/files/deadbeef/x.csv")[0] == 404
+    path.unlink()
+    assert _get(url)[0] == 404
+
+
+def test_tile_is_rendered_once_and_revalidated_with_etag(layer):
+    _, template, src = layer
+    x, y = _tile_xy(-63.82, -8.79)
+    status, headers, body = _get(_url(template, Z, x, y))
+    assert status == 200 and headers["Content-Type"] == "image/png"
+    from PIL import Image
+
+    alpha = np.asarray(Image.open(io.BytesIO(body)))[..., 3]
+    assert (alpha > 0).all()  # tile dentro do raster: tudo pintado
+    etag = headers["ETag"]
+
+    status, headers, body = _get(_url(template, Z, x, y), {"If-None-Match": etag})
+    assert status == 304 and headers["ETag"] == etag and body == b""
+    # Sem ETag: sai do cache LRU, sem renderizar de novo
+    assert _get(_url(template, Z, x, y))[2].startswith(b"\x89PNG")
+    assert src.calls == [(Z, x, y)]
+
+
+def test_lru_evicts_the_oldest_tile(layer):
+    server, template, src = layer
+    x, y = _tile_xy(-63.82, -8.79)
+    tiles = [(x + i, y) for i in range(5)]  # cache_size=4
+    for tx, ty in tiles:
+        assert _get(_url(template, Z, tx, ty))[0] == 200
+    assert server.cache.get(server.etag("ndvi", Z, *tiles[0])) is None
+    assert server.cache.get(server.etag("ndvi", Z, *tiles[-1])) is not None
+
+    assert _get(_url(template, Z, *tiles[0]))[0] == 200  # renderiza de novo
+    assert src.calls.count((Z, *tiles[0])) == 2
+    assert src.calls.count((Z, *tiles[-1])) == 1
+
+
+@pytest.mark.parametrize(
+    "z,x,y", [(2, 4, 0), (2, 0, 4), (3, -1, 0), (-1, 0, 0), (40, 0, 0)]
+)
+def test_out_of_range_tiles_are_404(layer, z, x, y):
+    server, template, src = layer
+    assert _get(_url(template, z, x, y))[0] == 404
+    assert _get(f"{server.base_url}/tiles/outra/{Z}/0/0.png")[0] == 404
+    assert src.calls == []
@@ -0,0 +1,54 @@
+from shapely.geometry import box, mapping
+
+from saag_soy_monitor.scenes import select_scenes
+from saag_soy_monitor.zones import plan_zones
+
+# AOI na divisa das zonas 20S/21S (-60°)
+AOI = box(-60.2, -10.1, -59.8, -9.9)
+
+
+def _item(id_, epsg, bounds, day, cloud):
+    return {
+        "id": id_,
+        "geometry": mapping(box(*bounds)),
+        "properties": {
+            "datetime": f"2024-10-{day:02d}T14:00:00Z",
+            "proj:epsg": epsg,
+            "eo:cloud_cover": cloud,
+        },
+    }
+
+
+def _ids(part):
+    return sorted(it["id"] for it in part.items)
+
+
+def test_native_items_preferred_per_part():
+    items = [
+        _item("west-20", 32720, (-61, -11, -59, -9), 1, 20.0),
+        _item("east-21", 32721, (-61, -11, -59, -9), 1, 1.0),
+    ]
+    # Deduplicar sobre a AOI inteira antes do planejamento perderia o item nativo
+    assert [it["id"] for it in select_scenes(items, AOI).items] == ["east-21"]
+
+    parts = {p.epsg: p for p in plan_zones(items, AOI)}
+    assert _ids(parts[32720]) == ["west-20"]
+    assert _ids(parts[32721]) == ["east-21"]
+
+
+def test_covering_items_fill_dates_without_native():
+    items = [
+        _item("d1-20", 32720, (-61, -11, -59, -9), 1, 5.0),
+        _item("d1-21", 32721, (-61, -11, -59, -9), 1, 5.0),
+        # Dia 6: só a cena da zona 20 (cobre também a parte leste)
+        _item("d6-20", 32720, (-61, -11, -59, -9), 6, 5.0),
+    ]
+    parts = {p.epsg: p for p in plan_zones(items, AOI)}
+    assert _ids(parts[32720]) == ["d1-20", "d6-20"]
+    assert _ids(parts[32721]) == ["d1-21", "d6-20"]
+
+
+def test_parts_without_items_are_dropped():
+    items = [_item("west", 32720, (-61, -11, -60.05, -9), 1, 5.0)]
+    parts = plan_zones(items, AOI)
+    assert [p.epsg for p in parts] == [32720]